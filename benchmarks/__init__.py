@@ -0,0 +1,51 @@
+"""
+Benchmarks for Marcador.
+
+Every module can be run on its own, e.g. ``python -m benchmarks.jobs``.
+They use a throw-away test database created from the project settings
+and print their results as JSON.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5):
+    """Return the best wall-clock time of `repeat` calls of `func`."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(results, stream=sys.stdout):
+    json.dump(results, stream, indent=2, sort_keys=True)
+    stream.write('\n')
@@ -0,0 +1,51 @@
+"""
+Throughput of the job queue: enqueueing and claiming jobs.
+
+    python -m benchmarks.jobs [--jobs N]
+"""
+import argparse
+
+from . import measure, report, setup, test_database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    setup()
+    from marcador import jobs
+    from marcador.models import Job
+
+    name = 'marcador.tasks.check_links'
+    results = {}
+    with test_database():
+        def enqueue_single():
+            for i in range(args.jobs):
+                jobs.enqueue(name, value=i)
+
+        def enqueue_bulk():
+            jobs.enqueue_many(name, [{'value': i} for i in range(args.jobs)])
+
+        for label, func in [('enqueue', enqueue_single),
+                            ('enqueue_many', enqueue_bulk)]:
+            Job.objects.all().delete()
+            seconds = measure(func, repeat=1)
+            results[f'{label}_per_second'] = round(args.jobs / seconds)
+
+        for batch_size in (1, 10, 100):
+            def claim_all():
+                Job.objects.update(status=Job.QUEUED)
+                while jobs.claim('benchmark', limit=batch_size):
+                    pass
+
+            seconds = measure(claim_all, repeat=1)
+            results[f'claim_batch_{batch_size}_per_second'] = round(
+                args.jobs / seconds
+            )
+
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
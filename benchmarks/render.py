@@ -0,0 +1,56 @@
+"""
+Rendering a page of 100 bookmarks for their authenticated owner.
+
+    python -m benchmarks.render [--bookmarks N] [--repeat N]
+"""
+import argparse
+
+from . import measure, report, setup, test_database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookmarks', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.test import RequestFactory
+    from marcador.models import Bookmark, Tag
+    from marcador.views import UserBookmarkList
+
+    results = {}
+    with test_database():
+        owner = User.objects.create_user('benchmark')
+        tags = [Tag.objects.create(name=f'tag{i}') for i in range(10)]
+        for i in range(args.bookmarks):
+            bookmark = Bookmark.objects.create(
+                bookmark_url=f'http://example.com/{i}',
+                title=f'Bookmark {i}',
+                description='A description\nspanning two lines',
+                owner=owner,
+            )
+            bookmark.tags.set(tags[i % 7:i % 7 + 3])
+        # call the view directly, the middleware is not measured
+        request = RequestFactory().get(f'/user/{owner.username}/')
+        request.user = owner
+        view = UserBookmarkList.as_view()
+
+        def render():
+            view(request, username=owner.username).render()
+
+        def render_cold():
+            cache.clear()
+            render()
+
+        render()
+        results['cold_ms'] = round(measure(render_cold, args.repeat) * 1000, 2)
+        results['warm_ms'] = round(measure(render, args.repeat) * 1000, 2)
+
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Encoding and decoding a page of bookmarks serialized by
+`BookmarkSerializer`, with DRF's JSON renderer and Marcador's.
+
+    python -m benchmarks.renderers [--bookmarks N] [--repeat N]
+"""
+import argparse
+
+from . import measure, report, setup, test_database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bookmarks', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    setup()
+    from io import BytesIO
+    from django.contrib.auth.models import User
+    from rest_framework import parsers, renderers
+    from rest_framework.test import APIRequestFactory
+    from marcador.models import Bookmark, Tag
+    from marcador_api import parsers as fast_parsers
+    from marcador_api import renderers as fast_renderers
+    from marcador_api.serializers import BookmarkSerializer
+
+    candidates = [
+        ('drf_json', renderers.JSONRenderer(), parsers.JSONParser()),
+        ('json', fast_renderers.JSONRenderer(), fast_parsers.JSONParser()),
+        ('msgpack', fast_renderers.MessagePackRenderer(),
+         fast_parsers.MessagePackParser()),
+    ]
+    results = {}
+    with test_database():
+        owner = User.objects.create_user('benchmark')
+        tags = [Tag.objects.create(name=f'tag{i}') for i in range(10)]
+        for i in range(args.bookmarks):
+            bookmark = Bookmark.objects.create(
+                bookmark_url=f'http://example.com/{i}',
+                title=f'Bookmark {i}',
+                description='A description\nspanning two lines',
+                owner=owner,
+            )
+            bookmark.tags.set(tags[i % 7:i % 7 + 3])
+        request = APIRequestFactory().get('/api/bookmarks/')
+        data = BookmarkSerializer(
+            Bookmark.objects.with_related(), many=True,
+            context={'request': request},
+        ).data
+
+        for label, renderer, parser in candidates:
+            def render():
+                renderer.render(data)
+
+            content = renderer.render(data)
+
+            def parse():
+                parser.parse(BytesIO(content))
+
+            results[f'{label}_render_us'] = round(
+                measure(render, args.repeat) * 1e6, 1
+            )
+            results[f'{label}_parse_us'] = round(
+                measure(parse, args.repeat) * 1e6, 1
+            )
+            results[f'{label}_bytes'] = len(content)
+
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Serialization and validation times of the API serializers.
+
+`TagSerializer`, `BookmarkSerializer`, `NestedBookmarkSerializer` and
+`UserSerializer` are timed on pages of several sizes, with several
+numbers of tags per bookmark. Serialization is timed on objects already
+in memory and on querysets, which includes fetching them. Validation is
+timed on input built from the serialized data.
+
+Results are printed as JSON, in milliseconds per page, the best of
+`--repeat` samples (of at most three for pages of 10000). Given a
+`--baseline`, the results of an earlier run with `--output` on the same
+machine, the run fails when a case became slower than `--threshold` times
+its baseline. Small pages vary by about a third between runs on the same
+machine, hence the default threshold. A full run takes about half an hour.
+
+    python -m benchmarks.serializers [--sizes 1,100,10000] [--tags 0,5,20]
+        [--output FILE] [--baseline FILE] [--threshold 1.5]
+"""
+import argparse
+import json
+import sys
+
+from . import measure, report, setup, test_database
+
+
+def _numbers(value):
+    return [int(number) for number in value.split(',')]
+
+
+def populate(size, tag_counts):
+    """
+    Create `size` tags, or as many as a bookmark has at most, and per
+    number of tags `size` users with one bookmark each. Returns the first
+    user and bookmark pk per number of tags.
+    """
+    from django.contrib.auth.models import User
+    from django.utils.timezone import now
+    from marcador.models import Bookmark, Tag
+
+    Tagging = Bookmark.tags.through
+    # bulk_create bypasses the signals, which are not measured here; the
+    # tags of a bookmark must be distinct
+    Tag.objects.bulk_create(
+        [Tag(name=f'tag{i}') for i in range(max([size] + tag_counts))],
+        batch_size=500,
+    )
+    tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+    when = now()
+    groups = {}
+    for count in tag_counts:
+        User.objects.bulk_create(
+            [User(username=f'user{count}-{i}') for i in range(size)],
+            batch_size=500,
+        )
+        users = list(
+            User.objects.filter(username__startswith=f'user{count}-')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        Bookmark.objects.bulk_create([
+            Bookmark(
+                bookmark_url=f'http://example.com/{count}/{i}',
+                title=f'Bookmark {i}',
+                description='A description\nspanning two lines',
+                owner_id=owner, date_created=when, date_updated=when,
+            )
+            for i, owner in enumerate(users)
+        ], batch_size=500)
+        bookmarks = list(
+            Bookmark.objects.filter(owner__in=users[:1])
+            .values_list('pk', flat=True)
+        )
+        first = bookmarks[0]
+        Tagging.objects.bulk_create([
+            Tagging(bookmark_id=first + i, tag_id=tags[(i + j) % len(tags)])
+            for i in range(size) for j in range(count)
+        ], batch_size=500)
+        groups[count] = (users[0], first)
+    return groups
+
+
+def cases(sizes, tag_counts, groups):
+    """Yield the name, serializer class and queryset of every case."""
+    from django.contrib.auth.models import User
+    from django.db.models import Prefetch
+    from marcador.models import Bookmark, Tag
+    from marcador_api.serializers import (
+        BookmarkSerializer, NestedBookmarkSerializer, TagSerializer,
+        UserSerializer,
+    )
+
+    for size in sizes:
+        yield (f'TagSerializer/{size}', TagSerializer,
+               Tag.objects.order_by('pk')[:size])
+        for count in tag_counts:
+            first_user, first_bookmark = groups[count]
+            bookmarks = Bookmark.objects.filter(pk__gte=first_bookmark)
+            users = User.objects.filter(pk__gte=first_user).prefetch_related(
+                Prefetch('bookmarks', Bookmark.objects.with_tags())
+            )
+            yield (f'BookmarkSerializer/{size}x{count}', BookmarkSerializer,
+                   bookmarks.with_related().order_by('pk')[:size])
+            yield (f'NestedBookmarkSerializer/{size}x{count}',
+                   NestedBookmarkSerializer,
+                   bookmarks.with_tags().order_by('pk')[:size])
+            yield (f'UserSerializer/{size}x{count}', UserSerializer,
+                   users.order_by('pk')[:size])
+
+
+def as_input(serializer_class, data):
+    """Turn serialized data into valid input of `serializer_class`."""
+    from marcador_api.serializers import (
+        NestedBookmarkSerializer, TagSerializer, UserSerializer,
+    )
+
+    # names are unique, so create new ones
+    def tag(item):
+        return {'name': item['name'] + '-new'}
+
+    def bookmark(item):
+        return dict(item, tags=[tag(tag_item) for tag_item in item['tags']])
+
+    if serializer_class is TagSerializer:
+        return [tag(item) for item in data]
+    if serializer_class is NestedBookmarkSerializer:
+        return [bookmark(item) for item in data]
+    if serializer_class is UserSerializer:
+        return [
+            {'username': item['username'] + '-new',
+             'bookmarks': [bookmark(nested) for nested in item['bookmarks']]}
+            for item in data
+        ]
+    return list(data)
+
+
+def run(sizes, tag_counts, repeat):
+    from rest_framework.test import APIRequestFactory
+
+    context = {'request': APIRequestFactory().get('/api/')}
+    results = {}
+    with test_database():
+        groups = populate(max(sizes), tag_counts)
+        for name, serializer_class, queryset in cases(sizes, tag_counts, groups):
+            size = len(queryset)
+            # repeat small pages in a loop, so timings are not just noise
+            loops = max(1, 20 // size)
+            objects = list(queryset)
+
+            def serialize_memory():
+                for _ in range(loops):
+                    serializer_class(objects, many=True, context=context).data
+
+            def serialize_db():
+                for _ in range(loops):
+                    serializer_class(
+                        queryset.all(), many=True, context=context
+                    ).data
+
+            data = as_input(
+                serializer_class,
+                serializer_class(objects, many=True, context=context).data,
+            )
+
+            def validate():
+                for _ in range(loops):
+                    serializer = serializer_class(
+                        data=data, many=True, context=context
+                    )
+                    if not serializer.is_valid():
+                        raise AssertionError(f'{name}: {serializer.errors[:1]}')
+
+            # large pages take long, but a single sample is just noise
+            times = repeat if size < 10000 else min(repeat, 3)
+            for mode, func in [('serialize/memory', serialize_memory),
+                               ('serialize/db', serialize_db),
+                               ('validate', validate)]:
+                seconds = measure(func, times) / loops
+                results[f'{name}/{mode}'] = round(seconds * 1000, 3)
+    return results
+
+
+def regressions(results, baseline, threshold, min_delta):
+    """
+    Return the cases that took longer than `threshold` times their
+    baseline and at least `min_delta` milliseconds more.
+    """
+    slower = {}
+    for name, milliseconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if milliseconds > before * threshold and milliseconds - before >= min_delta:
+            slower[name] = {'baseline': before, 'current': milliseconds}
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--sizes', type=_numbers, default=[1, 100, 10000])
+    parser.add_argument('--tags', type=_numbers, default=[0, 5, 20])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Also write the results to this file.')
+    parser.add_argument(
+        '--baseline', help='Results of an earlier run to compare with.',
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=1.5,
+        help='Maximum ratio of a time to its baseline (default: 1.5).',
+    )
+    parser.add_argument(
+        '--min-delta', type=float, default=0.05,
+        help='Ignore slowdowns below these milliseconds (default: 0.05).',
+    )
+    args = parser.parse_args(argv)
+
+    setup()
+    results = run(args.sizes, args.tags, args.repeat)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            report(results, stream)
+    if args.baseline:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+        slower = regressions(results, baseline, args.threshold, args.min_delta)
+        if slower:
+            sys.stderr.write(f'Slower than {args.threshold} times the baseline:\n')
+            report(slower, sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
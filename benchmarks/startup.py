@@ -0,0 +1,113 @@
+"""
+Startup time of a worker: importing the WSGI application, which sets up
+Django, and the first requests it serves, which import the views and
+compile the templates they use.
+
+Every sample starts a fresh interpreter, with the production settings
+(DJANGO_DEBUG=0) and, for comparison, the development ones. The requests
+are served from a test database created after the import. The run
+fails when the best production time exceeds `--import-budget` or
+`--request-budget` milliseconds.
+
+    python -m benchmarks.startup [--repeat N]
+        [--import-budget MS] [--request-budget MS]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from . import report
+
+PATHS = ['/', '/api/bookmarks/']
+
+
+def child():
+    """Measure one startup, printing the times in milliseconds as JSON."""
+    start = time.perf_counter()
+    from mysite.wsgi import application
+    results = {'import_ms': (time.perf_counter() - start) * 1000}
+
+    from wsgiref.util import setup_testing_defaults
+    from . import test_database
+
+    with test_database():
+        from django.core.management import call_command
+        # the production settings default to the database cache
+        call_command('createcachetable', verbosity=0)
+        for path in PATHS:
+            environ = {'PATH_INFO': path, 'HTTP_HOST': 'testserver'}
+            setup_testing_defaults(environ)
+            statuses = []
+            start = time.perf_counter()
+            body = application(environ, lambda status, headers: statuses.append(status))
+            b''.join(body)
+            results[f'first_request_ms:{path}'] = (time.perf_counter() - start) * 1000
+            if not statuses[0].startswith('200'):
+                raise RuntimeError(f'{path}: {statuses[0]}')
+    json.dump(results, sys.stdout)
+
+
+def sample(debug):
+    environ = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='mysite.settings',
+        DJANGO_DEBUG='1' if debug else '0',
+        DJANGO_SECRET_KEY=os.environ.get('DJANGO_SECRET_KEY', 'benchmark'),
+    )
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child'],
+        env=environ, stdout=subprocess.PIPE, check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--import-budget', type=float, default=1000,
+        help='Milliseconds the import may take in production (default: 1000).',
+    )
+    parser.add_argument(
+        '--request-budget', type=float, default=500,
+        help='Milliseconds any first request may take in production '
+             '(default: 500).',
+    )
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    results = {}
+    for label, debug in [('production', False), ('development', True)]:
+        best = {}
+        for _ in range(args.repeat):
+            for name, milliseconds in sample(debug).items():
+                best[name] = min(best.get(name, float('inf')), milliseconds)
+        for name, milliseconds in best.items():
+            results[f'{label}/{name}'] = round(milliseconds, 1)
+    report(results)
+
+    over = {
+        name: milliseconds for name, milliseconds in results.items()
+        if name.startswith('production/') and milliseconds > (
+            args.import_budget if name.endswith('import_ms')
+            else args.request_budget
+        )
+    }
+    if over:
+        sys.stderr.write('Over budget:\n')
+        report(over, sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Overhead of the token-bucket throttle per API request.
+
+Measures taking a token directly and a small API read with and without
+the throttle, on the configured cache.
+
+    python -m benchmarks.throttle [--requests N]
+"""
+import argparse
+
+from . import measure, report, setup, test_database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from marcador.models import Tag
+    from marcador_api.throttling import TokenBucketThrottle, take
+    from marcador_api.views import TagViewSet
+
+    # a budget that is never exhausted, only granted requests are compared
+    rest_framework = dict(settings.REST_FRAMEWORK)
+    rest_framework['DEFAULT_THROTTLE_RATES'] = {'read': f'{10 ** 9}/s'}
+
+    results = {}
+    with test_database(), override_settings(REST_FRAMEWORK=rest_framework):
+        user = User.objects.create_user('benchmark')
+        Tag.objects.create(name='benchmark')
+        cache.clear()
+
+        def take_granted():
+            for _ in range(args.requests):
+                take('benchmark:granted', args.requests * 2, 1)
+
+        def take_rejected():
+            for _ in range(args.requests):
+                take('benchmark:rejected', 1, 10 ** 9)
+
+        seconds = measure(take_granted)
+        results['take_granted_us'] = round(seconds / args.requests * 1e6, 2)
+        seconds = measure(take_rejected)
+        results['take_rejected_us'] = round(seconds / args.requests * 1e6, 2)
+
+        request = APIRequestFactory().get('/api/tags/')
+        force_authenticate(request, user)
+        for label, throttles in [('unthrottled', []),
+                                 ('throttled', [TokenBucketThrottle])]:
+            view = TagViewSet.as_view(
+                {'get': 'list'}, throttle_classes=throttles
+            )
+
+            def list_tags():
+                cache.clear()
+                for _ in range(args.requests):
+                    view(request).render()
+
+            seconds = measure(list_tags)
+            results[f'{label}_request_us'] = round(
+                seconds / args.requests * 1e6, 2
+            )
+
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
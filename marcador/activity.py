@@ -0,0 +1,93 @@
+"""
+Histograms of the bookmarks created per day, week or month.
+
+Dates are truncated and counted by the database, in the time zone the
+histogram is drawn in. Buckets before the current one only change when
+bookmarks are deleted, change their visibility or their owner, which
+bumps the ``history`` version keys (see `marcador.caching`). So closed
+buckets are cached, and only the current bucket is counted again.
+"""
+import hashlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+
+from . import caching
+
+__all__ = ('INTERVALS', 'bucket', 'count_buckets', 'histogram')
+
+INTERVALS = ('day', 'week', 'month')
+PREFIX = 'marcador:activity:'
+TIMEOUT = getattr(settings, 'MARCADOR_ACTIVITY_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+
+def bucket(day, interval):
+    """Return the first day of the bucket `day` falls into."""
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _midnight(day, tzinfo):
+    return timezone.make_aware(datetime.combine(day, time()), tzinfo, is_dst=False)
+
+
+def count_buckets(queryset, interval, tzinfo, since=None):
+    """
+    Count the bookmarks in `queryset` per bucket, optionally only those
+    created on or after the day `since`.
+
+    There is no week truncation in every database, so weeks are summed
+    up from days.
+    """
+    if since is not None:
+        queryset = queryset.filter(date_created__gte=_midnight(since, tzinfo))
+    trunc = TruncMonth if interval == 'month' else TruncDay
+    rows = (
+        queryset.order_by()
+        .annotate(start=trunc('date_created', tzinfo=tzinfo))
+        .values('start').annotate(count=Count('pk'))
+        .values_list('start', 'count')
+    )
+    counts = {}
+    for start, count in rows:
+        start = bucket(start.date(), interval)
+        counts[start] = counts.get(start, 0) + count
+    return counts
+
+
+def histogram(queryset, interval, tzinfo, dependencies):
+    """
+    Return ``(first day, count)`` pairs of the bookmarks in `queryset`
+    created per `interval`, oldest first. Empty buckets are left out.
+
+    `dependencies` are the names of the version keys the closed buckets
+    are invalidated by.
+    """
+    current = bucket(timezone.localtime(timezone.now(), tzinfo).date(), interval)
+    raw = f'{queryset.query}|{interval}|{tzinfo}'
+    key = PREFIX + hashlib.md5(raw.encode('utf-8')).hexdigest()
+    versions = caching.versions(*dependencies)
+
+    entry = cache.get(key)
+    if entry is None or entry['versions'] != versions:
+        entry = {'versions': versions, 'until': None, 'counts': []}
+    counts = dict(entry['counts'])
+    counts.update(count_buckets(queryset, interval, tzinfo, entry['until']))
+
+    if entry['until'] != current:
+        cache.set(key, {
+            'versions': versions,
+            'until': current,
+            'counts': sorted(
+                (start, count) for start, count in counts.items()
+                if start < current
+            ),
+        }, TIMEOUT)
+    return sorted(counts.items())
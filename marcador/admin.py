@@ -1,15 +1,309 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.conf.urls import url
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.http import JsonResponse
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.functional import cached_property
 
-from .models import Bookmark, Tag
+from . import bulk
+from .models import Bookmark, DuplicateBookmark, Favicon, Job, Tag, Webhook
 
 
-class BookmarkAdmin(admin.ModelAdmin):
+def estimated_count(queryset):
+    """
+    Return the number of rows of the queryset's table as estimated by
+    the database, or None if the database keeps no such statistics.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'mysql':
+        sql = ('SELECT table_rows FROM information_schema.tables '
+               'WHERE table_schema = DATABASE() AND table_name = %s')
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def prefix_filter(field, prefix):
+    """
+    Lookups of the values of `field` starting with `prefix`, as a range
+    that an index on the column serves. Unlike ``startswith``, which is
+    a ``LIKE`` on SQLite and scans the table there, they match case.
+    """
+    lookups = {f'{field}__gte': prefix}
+    following = ord(prefix[-1]) + 1
+    # surrogates cannot be encoded, no text contains them
+    if 0xd800 <= following < 0xe000:
+        following = 0xe000
+    if following <= 0x10ffff:
+        lookups[f'{field}__lt'] = prefix[:-1] + chr(following)
+    return lookups
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoid counting large tables.
+
+    Unfiltered querysets are counted from the database statistics, or
+    without any by the largest primary key, once these exceed
+    `max_count`; everything else is counted exactly, but only up to
+    `max_count` rows. Beyond that the size of the table is taken, so that
+    all pages can be reached, the last ones possibly empty.
+    """
+    max_count = 10000
+
+    @cached_property
+    def table_count(self):
+        """The approximate number of rows of the queryset's table."""
+        queryset = self.object_list
+        estimate = estimated_count(queryset)
+        if estimate is None:
+            estimate = queryset.model._default_manager.using(
+                queryset.db
+            ).aggregate(largest=Max('pk'))['largest'] or 0
+        return estimate
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and self.table_count > self.max_count:
+            return self.table_count
+        count = queryset.order_by()[:self.max_count].count()
+        if count < self.max_count:
+            return count
+        return max(count, self.table_count)
+
+
+class OwnerFilter(admin.SimpleListFilter):
+    """Filter by an owner typed in, with usernames suggested as you type."""
+    title = 'owner'
+    parameter_name = 'owner'
+    template = 'admin/marcador/owner_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(owner__username=self.value())
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'value': self.value() or '',
+            'hidden': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, 'p')
+            ],
+            'clear_query_string': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+            'autocomplete_url': reverse(
+                'admin:marcador_bookmark_owner_autocomplete'
+            ),
+        }
+
+
+class TagForm(forms.Form):
+    tag = forms.CharField(max_length=Tag._meta.get_field('name').max_length)
+
+
+class OwnerForm(forms.Form):
+    owner = forms.CharField(label='new owner (username)')
+
+    def clean_owner(self):
+        try:
+            return User.objects.get(username=self.cleaned_data['owner'])
+        except User.DoesNotExist:
+            raise forms.ValidationError('There is no such user.')
+
+
+class BulkActionMixin:
+    """Run set-based actions, asking for their input and confirmation."""
+
+    def bulk_action(self, request, queryset, form_class, description, apply):
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_bound and form.is_valid():
+            count = apply(queryset, form.cleaned_data)
+            self.message_user(
+                request, f'{description}: {count} changed.', messages.SUCCESS
+            )
+            return None
+        opts = self.model._meta
+        context = dict(
+            self.admin_site.each_context(request),
+            title=description,
+            description=description,
+            form=form,
+            count=queryset.count(),
+            opts=opts,
+            selected=request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            select_across=request.POST.get('select_across', '0'),
+            action=request.POST['action'],
+        )
+        return TemplateResponse(
+            request, 'admin/marcador/bulk_action.html', context
+        )
+
+    def delete_selected(self, request, queryset):
+        if not self.has_delete_permission(request):
+            raise PermissionDenied
+        return self.bulk_action(
+            request, queryset, forms.Form, 'Delete selected',
+            lambda queryset, data: self.bulk_delete(queryset),
+        )
+    delete_selected.short_description = 'Delete selected %(verbose_name_plural)s'
+
+
+class BookmarkAdmin(BulkActionMixin, admin.ModelAdmin):
     list_display = ('bookmark_url', 'title', 'owner', 'is_public', 'date_updated')
     list_editable = ('is_public',)
-    list_filter = ('is_public', 'owner__username')
-    search_fields = ['bookmark_url', 'title', 'description']
-    readonly_fields = ('date_created', 'date_updated')
+    list_filter = ('is_public', 'link_status', OwnerFilter)
+    list_select_related = ('owner',)
+    # searched by prefix unless `substring_search`, see get_search_results()
+    search_fields = ['bookmark_url', 'title']
+    substring_search = getattr(settings, 'MARCADOR_ADMIN_SUBSTRING_SEARCH', False)
+    readonly_fields = ('date_created', 'date_updated', 'metadata_status',
+                       'favicon', 'link_status', 'link_status_code',
+                       'link_checked_at')
+    raw_id_fields = ('owner',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_limit = 20
+    actions = ['make_public', 'make_private', 'add_tag', 'remove_tag',
+               'reassign_owner', 'delete_selected']
+
+    def make_public(self, request, queryset):
+        count = bulk.set_public(queryset, True)
+        self.message_user(request, f'{count} bookmarks made public.')
+    make_public.short_description = 'Make selected bookmarks public'
+
+    def make_private(self, request, queryset):
+        count = bulk.set_public(queryset, False)
+        self.message_user(request, f'{count} bookmarks made private.')
+    make_private.short_description = 'Make selected bookmarks private'
+
+    def add_tag(self, request, queryset):
+        return self.bulk_action(
+            request, queryset, TagForm, 'Add a tag',
+            lambda queryset, data: bulk.add_tags(
+                queryset, [Tag.objects.get_or_create(name=data['tag'])[0]]
+            ),
+        )
+    add_tag.short_description = 'Add a tag to selected bookmarks'
+
+    def remove_tag(self, request, queryset):
+        def apply(queryset, data):
+            tag = Tag.objects.filter(name=data['tag']).first()
+            return bulk.remove_tags(queryset, [tag]) if tag else 0
+        return self.bulk_action(
+            request, queryset, TagForm, 'Remove a tag', apply
+        )
+    remove_tag.short_description = 'Remove a tag from selected bookmarks'
+
+    def reassign_owner(self, request, queryset):
+        return self.bulk_action(
+            request, queryset, OwnerForm, 'Reassign owner',
+            lambda queryset, data: bulk.reassign(queryset, data['owner']),
+        )
+    reassign_owner.short_description = 'Reassign selected bookmarks'
+
+    def bulk_delete(self, queryset):
+        return bulk.delete(queryset)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search URLs if the term has a scheme, titles otherwise, for
+        those starting with the term, case-sensitively. The default
+        search for the term anywhere in either, which scans the table,
+        is kept for ``MARCADOR_ADMIN_SUBSTRING_SEARCH``.
+        """
+        if self.substring_search:
+            return super(BookmarkAdmin, self).get_search_results(
+                request, queryset, search_term
+            )
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        field = 'bookmark_url' if '://' in term else 'title'
+        return queryset.filter(**prefix_filter(field, term)), False
+
+    def get_urls(self):
+        return [
+            url(r'^owner-autocomplete/$',
+                self.admin_site.admin_view(self.owner_autocomplete),
+                name='marcador_bookmark_owner_autocomplete'),
+        ] + super(BookmarkAdmin, self).get_urls()
+
+    def owner_autocomplete(self, request):
+        term = request.GET.get('term', '').strip()
+        usernames = []
+        if term and self.has_change_permission(request):
+            usernames = list(
+                User.objects.filter(username__startswith=term)
+                .order_by('username')
+                .values_list('username', flat=True)[:self.autocomplete_limit]
+            )
+        return JsonResponse({'results': usernames})
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'priority', 'attempts', 'run_at',
+                    'locked_by', 'date_finished')
+    list_filter = ('status',)
+    search_fields = ['name']
+    readonly_fields = ('locked_by', 'locked_at', 'last_error',
+                       'date_created', 'date_finished')
+
+
+class DuplicateBookmarkAdmin(admin.ModelAdmin):
+    list_display = ('bookmark', 'duplicate', 'similarity', 'date_found')
+    list_select_related = ('bookmark', 'duplicate')
+    raw_id_fields = ('bookmark', 'duplicate')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class WebhookAdmin(admin.ModelAdmin):
+    list_display = ('webhook_url', 'owner', 'is_active', 'failures',
+                    'next_attempt', 'last_delivery', 'lag', 'events_delivered')
+    list_filter = ('is_active',)
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
+    readonly_fields = ('failures', 'next_attempt', 'last_error',
+                       'last_delivery', 'lag', 'events_delivered',
+                       'delivery_time')
+
+
+class TagAdmin(BulkActionMixin, admin.ModelAdmin):
+    search_fields = ['^name']
+    actions = ['delete_selected']
+
+    def bulk_delete(self, queryset):
+        return bulk.delete_tags(queryset)
 
 
 admin.site.register(Bookmark, BookmarkAdmin)
-admin.site.register(Tag)
\ No newline at end of file
+admin.site.register(DuplicateBookmark, DuplicateBookmarkAdmin)
+admin.site.register(Tag, TagAdmin)
+admin.site.register(Favicon)
+admin.site.register(Job, JobAdmin)
+admin.site.register(Webhook, WebhookAdmin)
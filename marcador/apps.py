@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MarcadorConfig(AppConfig):
     name = 'marcador'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,237 @@
+"""
+Set-based operations on many bookmarks at once.
+
+Every operation runs a constant number of statements, however many rows
+it touches, and bypasses the model signals. Instead, the
+``bookmarks_changed`` signal is sent once per operation, so caches and
+other derived data are updated once per batch.
+"""
+from django.db import connections, models, router, transaction
+from django.utils.timezone import now
+
+from . import caching, changes
+from .models import Bookmark, BookmarkChange, Tag
+from .signals import bookmarks_changed
+
+__all__ = (
+    'update', 'set_public', 'add_tags', 'remove_tags', 'reassign', 'delete',
+    'delete_tags', 'merge_tags', 'rename_tag',
+)
+
+Tagging = Bookmark.tags.through
+
+
+def _selection(queryset):
+    """Return the pks and the owner ids of the bookmarks in `queryset`."""
+    rows = list(queryset.order_by().values_list('pk', 'owner_id'))
+    return [pk for pk, _ in rows], {owner for _, owner in rows}
+
+
+def _subquery(queryset):
+    return queryset.order_by().values('pk')
+
+
+def _insert_tagging(pairs, using):
+    """Insert the (bookmark id, tag id) rows selected by `pairs`."""
+    sql, params = pairs.query.sql_with_params()
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(Tagging._meta.db_table)} '
+            f'({quote("bookmark_id")}, {quote("tag_id")}) {sql}',
+            params,
+        )
+
+
+def _changed(pks, owners, action='update'):
+    if pks:
+        bookmarks_changed.send(
+            sender=Bookmark, pks=pks, owners=owners, action=action
+        )
+
+
+def update(queryset, **fields):
+    """Set `fields` on the bookmarks in `queryset`."""
+    with transaction.atomic(using=queryset.db):
+        pks, owners = _selection(queryset)
+        if not pks:
+            return 0
+        Bookmark.objects.filter(pk__in=_subquery(queryset)).update(
+            date_updated=now(), **fields
+        )
+        _changed(pks, owners)
+    return len(pks)
+
+
+def set_public(queryset, is_public):
+    """Make the bookmarks in `queryset` public or private."""
+    return update(queryset.exclude(is_public=is_public), is_public=is_public)
+
+
+def add_tags(queryset, tags):
+    """Tag the bookmarks in `queryset` with `tags`, where not tagged yet."""
+    changed, owners = set(), set()
+    with transaction.atomic(using=queryset.db):
+        for tag in tags:
+            untagged = queryset.exclude(
+                pk__in=Tagging.objects.filter(tag=tag).values('bookmark_id')
+            )
+            pks, tag_owners = _selection(untagged)
+            if not pks:
+                continue
+            pairs = _subquery(untagged).annotate(
+                tag_id=models.Value(tag.pk, models.IntegerField())
+            ).values('pk', 'tag_id')
+            # touch the bookmarks first, the selection is empty afterwards
+            Bookmark.objects.filter(pk__in=_subquery(untagged)).update(
+                date_updated=now()
+            )
+            _insert_tagging(pairs, queryset.db)
+            changed.update(pks)
+            owners.update(tag_owners)
+        _changed(sorted(changed), owners)
+    return len(changed)
+
+
+def remove_tags(queryset, tags):
+    """Remove `tags` from the bookmarks in `queryset`."""
+    tag_pks = [tag.pk for tag in tags]
+    with transaction.atomic(using=queryset.db):
+        tagged = queryset.filter(
+            pk__in=Tagging.objects.filter(tag__in=tag_pks).values('bookmark_id')
+        )
+        pks, owners = _selection(tagged.distinct())
+        if not pks:
+            return 0
+        Bookmark.objects.filter(pk__in=_subquery(tagged)).update(
+            date_updated=now()
+        )
+        Tagging.objects.filter(
+            tag__in=tag_pks, bookmark__in=_subquery(queryset)
+        )._raw_delete(queryset.db)
+        _changed(pks, owners)
+    return len(pks)
+
+
+def reassign(queryset, owner):
+    """Make `owner` the owner of the bookmarks in `queryset`."""
+    with transaction.atomic(using=queryset.db):
+        selection = queryset.exclude(owner=owner)
+        pks, owners = _selection(selection)
+        if not pks:
+            return 0
+        # the previous owners see the bookmarks go, the new one arrive
+        changes.record_many(selection, BookmarkChange.DELETED)
+        Bookmark.objects.filter(pk__in=_subquery(selection)).update(
+            owner=owner, date_updated=now()
+        )
+        moved = Bookmark.objects.using(queryset.db)
+        for offset in range(0, len(pks), 500):
+            changes.record_many(
+                moved.filter(pk__in=pks[offset:offset + 500]),
+                BookmarkChange.CREATED,
+            )
+        _changed(pks, owners | {owner.pk}, action='move')
+    return len(pks)
+
+
+def _referring_relations(model):
+    """Return the relations of the rows referring to `model`."""
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if (field.one_to_many or field.one_to_one) and
+        field.auto_created and not field.concrete
+    ]
+
+
+def delete(queryset):
+    """Delete the bookmarks in `queryset` and the rows referring to them."""
+    with transaction.atomic(using=queryset.db):
+        pks, owners = _selection(queryset)
+        if not pks:
+            return 0
+        selection = Bookmark.objects.filter(pk__in=_subquery(queryset))
+        changes.record_many(selection, BookmarkChange.DELETED)
+        # delete or detach everything referring to the bookmarks first,
+        # so that the collector, which would load every row to send the
+        # model signals, can be skipped
+        for relation in _referring_relations(Bookmark):
+            referring = relation.related_model._base_manager.using(
+                queryset.db
+            ).filter(**{f'{relation.field.name}__in': selection.values('pk')})
+            if relation.on_delete is models.CASCADE:
+                referring._raw_delete(queryset.db)
+            else:
+                referring.update(**{relation.field.name: None})
+        selection._raw_delete(queryset.db)
+        _changed(pks, owners, action='delete')
+    return len(pks)
+
+
+def delete_tags(queryset):
+    """Delete the tags in `queryset` and remove them from all bookmarks."""
+    with transaction.atomic(using=queryset.db):
+        tags = _subquery(queryset)
+        tagged = Bookmark.objects.filter(
+            pk__in=Tagging.objects.filter(tag__in=tags).values('bookmark_id')
+        )
+        pks, owners = _selection(tagged)
+        if pks:
+            tagged.update(date_updated=now())
+        Tagging.objects.filter(tag__in=tags)._raw_delete(queryset.db)
+        count = queryset.count()
+        Tag.objects.filter(pk__in=tags)._raw_delete(queryset.db)
+        caching.bump('tags')
+        _changed(pks, owners)
+    return count
+
+
+def merge_tags(sources, target):
+    """
+    Merge the tags `sources` into `target` and delete them.
+
+    Every bookmark tagged with any of the sources ends up tagged with
+    `target` exactly once. The bookmarks are not touched otherwise, since
+    their tags were not changed by their owners, but their related
+    bookmarks are marked stale. Returns the number of retagged bookmarks.
+    """
+    source_pks = [tag.pk for tag in sources if tag.pk != target.pk]
+    if not source_pks:
+        return 0
+    using = router.db_for_write(Tag)
+    with transaction.atomic(using=using):
+        tagging = Tagging.objects.using(using).filter(tag__in=source_pks)
+        pks, owners = _selection(Bookmark.objects.using(using).filter(
+            pk__in=tagging.values('bookmark_id')
+        ))
+        pairs = tagging.exclude(
+            bookmark__in=Tagging.objects.using(using).filter(tag=target)
+            .values('bookmark_id')
+        ).order_by().values('bookmark_id').annotate(
+            target=models.Value(target.pk, models.IntegerField())
+        ).distinct()
+        _insert_tagging(pairs, using)
+        Bookmark.objects.using(using).filter(
+            pk__in=tagging.values('bookmark_id')
+        ).update(related_updated=None)
+        tagging._raw_delete(using)
+        Tag.objects.using(using).filter(pk__in=source_pks)._raw_delete(using)
+        caching.bump('tags')
+        _changed(pks, owners)
+    return len(pks)
+
+
+def rename_tag(tag, name):
+    """
+    Rename `tag`, merging it into the tag called `name` if there is one.
+
+    Returns the renamed or the merged tag.
+    """
+    existing = Tag.objects.filter(name=name).exclude(pk=tag.pk).first()
+    if existing is None:
+        tag.name = name
+        tag.save()
+        return tag
+    merge_tags([tag], existing)
+    return existing
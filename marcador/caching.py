@@ -0,0 +1,149 @@
+"""
+Version keys for invalidating cached data across processes.
+
+Cached data records the versions of the keys it depends on. Bumping a
+version key makes everything built against the old version stale,
+without having to know or delete the individual cache entries.
+
+The keys used by Marcador are:
+
+``public``
+    any public bookmark, including visibility flips
+``owner:<user id>``
+    any bookmark of that user, and the user's name
+``tags``
+    the names of tags
+``history``, ``history:public``, ``history:owner:<user id>``
+    the number of bookmarks created in the past, which only changes by
+    deletions, visibility flips and changes of the owner
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.http import HttpResponse
+
+__all__ = (
+    'is_shared', 'version', 'versions', 'bump', 'response_key', 'cached_response',
+)
+
+PREFIX = 'marcador:version:'
+RESPONSE_PREFIX = 'marcador:response:'
+RESPONSE_TIMEOUT = getattr(settings, 'MARCADOR_RESPONSE_CACHE_TIMEOUT', 600)
+# how long a worker may take to rebuild an entry before others step in
+REBUILD_TIMEOUT = 10
+REBUILD_WAIT = 2.0
+
+
+def is_shared():
+    """Whether other processes see the version keys of this one."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def _initial():
+    # start from the clock, so that a version key that was evicted
+    # never goes back to a value seen before
+    return int(time.time() * 1000)
+
+
+def versions(*names):
+    """Return a dict of the current versions of the keys `names`."""
+    keys = {PREFIX + name: name for name in names}
+    found = cache.get_many(list(keys))
+    result = {}
+    for key, name in keys.items():
+        if key not in found:
+            cache.add(key, _initial(), None)
+            found[key] = cache.get(key)
+        result[name] = found[key]
+    return result
+
+
+def version(name):
+    return versions(name)[name]
+
+
+def bump(*names):
+    """
+    Invalidate everything that depends on the keys `names`.
+
+    Inside a transaction the keys are bumped again on commit, since
+    other processes may have cached the old data in the meantime.
+    Returns the new versions by name, None for keys that were missing.
+    """
+    bumped = _bump(names)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(names))
+    return bumped
+
+
+def _bump(names):
+    bumped = {}
+    for name in names:
+        try:
+            bumped[name] = cache.incr(PREFIX + name)
+        except ValueError:
+            cache.add(PREFIX + name, _initial(), None)
+            bumped[name] = None
+    return bumped
+
+
+def response_key(path, params):
+    """Build a cache key from a path and already normalized parameters."""
+    raw = path + '?' + '&'.join(f'{key}={value}' for key, value in params)
+    return RESPONSE_PREFIX + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _is_fresh(entry):
+    return entry is not None and versions(*entry['versions']) == entry['versions']
+
+
+def _restore(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+def cached_response(key, build, timeout=RESPONSE_TIMEOUT):
+    """
+    Return the cached response stored under `key` or build a new one.
+
+    `build()` returns a rendered response and the versions of the keys
+    it depends on, read before the data was. Only one worker at a time
+    rebuilds an entry: while it does, the others serve the stale entry
+    or, if there is none, wait briefly for the new one.
+    """
+    entry = cache.get(key)
+    if _is_fresh(entry):
+        return _restore(entry)
+
+    lock = key + ':lock'
+    deadline = time.monotonic() + REBUILD_WAIT
+    while not cache.add(lock, 1, REBUILD_TIMEOUT):
+        if entry is not None:
+            return _restore(entry)
+        if time.monotonic() > deadline:
+            # the rebuilding worker is too slow, do not wait any longer
+            return build()[0]
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if _is_fresh(entry):
+            return _restore(entry)
+
+    try:
+        response, dependencies = build()
+        if response.status_code == 200 and not response.cookies:
+            cache.set(key, {
+                'versions': dependencies,
+                'content': response.content,
+                'status': response.status_code,
+                'headers': list(response.items()),
+            }, timeout)
+        return response
+    finally:
+        cache.delete(lock)
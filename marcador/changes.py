@@ -0,0 +1,144 @@
+"""
+A log of the changes to the bookmarks of every user, for incremental
+sync.
+
+Every write of a bookmark adds a `BookmarkChange` row, including a
+tombstone when it is deleted or moved to another owner. The primary key
+of the log is an increasing sequence, so a client passes the token of
+the last sequence it saw and only reads what changed since.
+
+Sequence numbers are taken when a row is inserted, but become visible
+when its transaction commits, so a slow transaction may commit a lower
+number after a higher one was read. Changes of the last `SETTLE`
+seconds are therefore repeated by the next read; the event stream and
+the webhooks only consider changes final once they are older, too. Changes are kept for
+`RETENTION`; older tokens are rejected and the client has to download
+the collection again.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections, models
+from django.utils.timezone import now, utc
+
+from .models import BookmarkChange
+
+__all__ = (
+    'InvalidToken', 'ExpiredToken', 'record', 'record_many', 'make_token',
+    'parse_token', 'read_changes', 'purge', 'serialize',
+)
+
+RETENTION = timedelta(days=getattr(settings, 'MARCADOR_CHANGES_RETENTION_DAYS', 30))
+# changes may become visible out of order for as long
+SETTLE = timedelta(seconds=getattr(settings, 'MARCADOR_CHANGES_SETTLE', 10))
+LIMIT = 1000
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class ExpiredToken(Exception):
+    pass
+
+
+def record(bookmark_id, owner_id, action):
+    BookmarkChange.objects.create(
+        bookmark_id=bookmark_id, owner_id=owner_id, action=action
+    )
+
+
+def record_many(queryset, action):
+    """Log `action` for the bookmarks in `queryset` with one statement."""
+    rows = queryset.order_by().annotate(
+        change_action=models.Value(action, models.CharField()),
+        change_date=models.Value(now(), models.DateTimeField()),
+    ).values('owner_id', 'pk', 'change_action', 'change_date')
+    sql, params = rows.query.sql_with_params()
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(column) for column in ('owner_id', 'bookmark_id', 'action', 'date')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(BookmarkChange._meta.db_table)} '
+            f'({columns}) {sql}',
+            params,
+        )
+
+
+def make_token(sequence, issued):
+    raw = f'{sequence}:{int(issued.timestamp())}'
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+
+def parse_token(token):
+    """Return the sequence and the time of issue of a token."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii')
+        sequence, issued = (int(part) for part in raw.split(':'))
+        return sequence, datetime.fromtimestamp(issued, utc)
+    except (ValueError, UnicodeError, OverflowError, OSError):
+        raise InvalidToken(token)
+
+
+def read_changes(user, since=None, limit=LIMIT):
+    """
+    Read the changes to the bookmarks of `user` after the token `since`.
+
+    Returns the ids of the changed bookmarks with their latest action,
+    oldest first, the token to read on from and whether there are more
+    changes. Without `since`, only a token for the current state is
+    returned.
+    """
+    current = now()
+    settled = current - SETTLE
+    changes = BookmarkChange.objects.filter(owner=user)
+    if since is None:
+        head = changes.filter(date__lte=settled).aggregate(
+            head=models.Max('pk')
+        )['head']
+        return [], make_token(head or 0, settled), False
+
+    sequence, issued = parse_token(since)
+    if issued < current - RETENTION:
+        raise ExpiredToken(since)
+    rows = list(
+        changes.filter(pk__gt=sequence).order_by('pk')
+        .values_list('pk', 'bookmark_id', 'action', 'date')[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    advance = True
+    for pk, bookmark_id, action, date in rows:
+        # move it to the end, the order is by the latest change
+        latest.pop(bookmark_id, None)
+        latest[bookmark_id] = action
+        # stop at the first unsettled change, unless that would mean
+        # reading the same full page again
+        advance = advance and (date <= settled or more)
+        if advance:
+            sequence = pk
+    return list(latest.items()), make_token(sequence, settled), more
+
+
+def purge(older_than=RETENTION):
+    """Delete the changes older than `older_than`."""
+    return BookmarkChange.objects.filter(
+        date__lt=now() - older_than
+    ).delete()[0]
+
+
+def serialize(bookmarks):
+    """Serialize `bookmarks` as the API does, for readers of the log."""
+    from marcador_api.serializers import BookmarkSerializer
+    # without a request, URLs are relative
+    context = {'request': None}
+    return [
+        BookmarkSerializer(bookmark, context=context).data
+        for bookmark in bookmarks
+    ]
@@ -0,0 +1,215 @@
+"""
+Near-duplicate bookmarks, found with MinHash and locality-sensitive
+hashing.
+
+Every bookmark is reduced to a set of features: word pairs of its title
+and tokens of its normalized URL, which drops tracking parameters,
+``www.`` and the like. The MinHash signature of that set estimates the
+Jaccard similarity of two bookmarks by the share of equal entries.
+
+Comparing all pairs of a user's bookmarks would take quadratic time, so
+signatures are cut into bands and only bookmarks that agree on a whole
+band, i.e. land in the same bucket, become candidates. With 16 bands of
+4 rows, pairs with a similarity of 0.5 become candidates with a
+probability of 64%, pairs of 0.8 with 99.9%. Candidates are confirmed
+by their estimated similarity and stored as `DuplicateBookmark` rows.
+"""
+import itertools
+import re
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Bookmark, DuplicateBookmark
+
+__all__ = ('normalize_url', 'features', 'find_duplicates', 'update_duplicates')
+
+THRESHOLD = getattr(settings, 'MARCADOR_DUPLICATE_THRESHOLD', 0.5)
+PERMUTATIONS = 64
+BANDS = 16
+# larger buckets are a sign of degenerate features, e.g. empty titles
+MAX_BUCKET = 50
+
+TRACKING_PARAMS = frozenset([
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid',
+    'mc_eid', '_hsenc', '_hsmi', 'ref', 'ref_src', 'spm',
+])
+TRACKING_PREFIXES = ('utm_',)
+
+_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20201019)
+_A = _random.randint(1, _PRIME, PERMUTATIONS).astype(np.uint64)
+_B = _random.randint(0, _PRIME, PERMUTATIONS).astype(np.uint64)
+
+_words = re.compile(r'\w+')
+
+
+def normalize_url(url):
+    """Reduce a URL to the parts that identify the page."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host = f'{host}:{port}'
+    path = re.sub(r'/+', '/', parts.path)
+    path = re.sub(r'/index\.(html?|php)$', '/', path).rstrip('/')
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and
+        not name.lower().startswith(TRACKING_PREFIXES)
+    )
+    if query:
+        return f'{host}{path}?{urlencode(query)}'
+    return host + path
+
+
+def features(title, url):
+    """Return the set of features a bookmark is compared by."""
+    words = _words.findall(title.lower())
+    result = {
+        't:' + ' '.join(words[i:i + 2]) for i in range(max(len(words) - 1, 1))
+    } if words else set()
+    normalized = normalize_url(url)
+    host, _, rest = normalized.partition('/')
+    result.add('u:' + normalized)
+    result.add('h:' + host)
+    result.update('p:' + token for token in _words.findall(rest.lower()))
+    return result
+
+
+def signatures(feature_sets, chunk_size=1000):
+    """Return the MinHash signatures of non-empty sets, one row each."""
+    result = []
+    for offset in range(0, len(feature_sets), chunk_size):
+        chunk = feature_sets[offset:offset + chunk_size]
+        lengths = np.array([len(feature_set) for feature_set in chunk])
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode('utf-8'))
+             for feature_set in chunk for feature in feature_set),
+            dtype=np.uint64, count=lengths.sum(),
+        ) % np.uint64(_PRIME)
+        permuted = (hashes[:, None] * _A + _B) % np.uint64(_PRIME)
+        starts = np.cumsum(lengths) - lengths
+        result.append(np.minimum.reduceat(permuted, starts, axis=0))
+    if not result:
+        return np.empty((0, PERMUTATIONS), dtype=np.uint64)
+    return np.concatenate(result)
+
+
+def candidate_pairs(signatures, groups, bands=BANDS, max_bucket=MAX_BUCKET):
+    """
+    Return the pairs of row indices that share a bucket in any band.
+
+    Only rows of the same group, i.e. owner, end up in the same bucket.
+    """
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        keys = np.column_stack([
+            groups, signatures[:, band * rows:(band + 1) * rows]
+        ])
+        _, buckets = np.unique(keys, axis=0, return_inverse=True)
+        buckets = buckets.ravel()
+        sizes = np.bincount(buckets)
+        shared = (sizes[buckets] > 1) & (sizes[buckets] <= max_bucket)
+        members = np.flatnonzero(shared)
+        members = members[np.argsort(buckets[members], kind='stable')]
+        bounds = np.flatnonzero(np.diff(buckets[members])) + 1
+        for bucket in np.split(members, bounds):
+            pairs.update(itertools.combinations(bucket.tolist(), 2))
+    return pairs
+
+
+def find_duplicates(bookmarks, threshold=THRESHOLD):
+    """
+    Find the near-duplicates among `bookmarks`, which are tuples of
+    ``(pk, owner id, title, url)``.
+
+    Returns ``(pk, pk of the duplicate, similarity)`` tuples, the
+    smaller primary key first.
+    """
+    if not bookmarks:
+        return []
+    pks = [bookmark[0] for bookmark in bookmarks]
+    groups = np.array([bookmark[1] for bookmark in bookmarks], dtype=np.uint64)
+    matrix = signatures([
+        features(title, url) for _, _, title, url in bookmarks
+    ])
+    found = []
+    for first, second in candidate_pairs(matrix, groups):
+        similarity = float(np.mean(matrix[first] == matrix[second]))
+        if similarity >= threshold:
+            a, b = sorted((pks[first], pks[second]))
+            found.append((a, b, similarity))
+    return sorted(found)
+
+
+def _owner_ranges(batch_size):
+    """Yield ranges of owner ids with about `batch_size` bookmarks each."""
+    counts = (
+        Bookmark.objects.order_by('owner_id').values('owner_id')
+        .annotate(count=Count('pk')).values_list('owner_id', 'count')
+    )
+    first, total = None, 0
+    for owner_id, count in counts.iterator():
+        if first is None:
+            first = owner_id
+        total += count
+        if total >= batch_size:
+            yield first, owner_id
+            first, total = None, 0
+    if first is not None:
+        yield first, owner_id
+
+
+def update_duplicates(batch_size=5000, threshold=THRESHOLD):
+    """
+    Find the near-duplicates among the bookmarks of every user and
+    store them, keeping the pairs that were already known.
+
+    Returns the number of pairs found.
+    """
+    total = 0
+    for first, last in _owner_ranges(batch_size):
+        bookmarks = list(
+            Bookmark.objects.filter(owner__gte=first, owner__lte=last)
+            .order_by().values_list('pk', 'owner_id', 'title', 'bookmark_url')
+        )
+        found = {
+            (a, b): similarity
+            for a, b, similarity in find_duplicates(bookmarks, threshold)
+        }
+        total += len(found)
+        with transaction.atomic():
+            stored = DuplicateBookmark.objects.filter(
+                bookmark__owner__gte=first, bookmark__owner__lte=last
+            )
+            known = {
+                (a, b): (pk, similarity) for pk, a, b, similarity in
+                stored.values_list('pk', 'bookmark', 'duplicate', 'similarity')
+            }
+            stored.filter(pk__in=[
+                pk for pair, (pk, _) in known.items() if pair not in found
+            ]).delete()
+            for pair, (pk, similarity) in known.items():
+                if pair in found and found[pair] != similarity:
+                    DuplicateBookmark.objects.filter(pk=pk).update(
+                        similarity=found[pair]
+                    )
+            DuplicateBookmark.objects.bulk_create([
+                DuplicateBookmark(
+                    bookmark_id=a, duplicate_id=b, similarity=similarity
+                )
+                for (a, b), similarity in found.items() if (a, b) not in known
+            ], batch_size=500)
+    return total
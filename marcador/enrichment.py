@@ -0,0 +1,234 @@
+"""
+Background enrichment of bookmarks with metadata of the bookmarked page.
+
+New bookmarks are saved with ``metadata_status = 'pending'``, which is
+all the write path has to do. A worker (see the ``enrichbookmarks``
+command) picks pending bookmarks up in batches, fetches their pages
+concurrently over pooled connections and fills in the title,
+description and favicon wherever the user left them empty. Pages,
+redirects and favicons on non-public addresses are not fetched, see
+`marcador.httpclient`.
+"""
+import hashlib
+import http.client
+import mimetypes
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from .httpclient import HTTPClient
+from .models import Bookmark, Favicon
+from .signals import bookmarks_changed
+
+__all__ = ('Metadata', 'parse_metadata', 'enrich_pending')
+
+MAX_PAGE_BYTES = 512 * 1024
+MAX_FAVICON_BYTES = 100 * 1024
+FETCH_ERRORS = (OSError, ValueError, http.client.HTTPException)
+
+Metadata = namedtuple('Metadata', 'title description favicon_url')
+
+_whitespace = re.compile(r'\s+')
+
+
+class MetadataParser(HTMLParser):
+    """Collect the title, meta tags and icon links of a document head."""
+
+    def __init__(self):
+        super(MetadataParser, self).__init__(convert_charrefs=True)
+        self.title = ''
+        self.meta = {}
+        self.icons = []
+        self.in_title = False
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        attrs = {name: value or '' for name, value in attrs}
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'meta':
+            key = (attrs.get('property') or attrs.get('name') or '').lower()
+            if key and attrs.get('content'):
+                self.meta.setdefault(key, attrs['content'])
+        elif tag == 'link':
+            if 'icon' in attrs.get('rel', '').lower().split() and attrs.get('href'):
+                self.icons.append(attrs['href'])
+        elif tag == 'body':
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'head':
+            self.done = True
+
+    def handle_data(self, data):
+        if self.in_title and not self.done:
+            self.title += data
+
+
+def _clean(text, max_length=None):
+    text = _whitespace.sub(' ', text).strip()
+    return text[:max_length] if max_length else text
+
+
+def parse_metadata(html, base_url):
+    """Extract `Metadata` from the HTML document found at `base_url`."""
+    parser = MetadataParser()
+    parser.feed(html)
+    meta = parser.meta
+    title = parser.title or meta.get('og:title', '')
+    description = meta.get('description') or meta.get('og:description', '')
+    icon = parser.icons[0] if parser.icons else '/favicon.ico'
+    return Metadata(
+        _clean(title, Bookmark._meta.get_field('title').max_length),
+        _clean(description),
+        urljoin(base_url, icon.strip()),
+    )
+
+
+def fetch_metadata(client, url):
+    try:
+        response = client.request(
+            'GET', url,
+            headers={'Accept': 'text/html,application/xhtml+xml'},
+            max_bytes=MAX_PAGE_BYTES,
+        )
+    except FETCH_ERRORS:
+        return None
+    if response.status != 200:
+        return None
+
+    content_type = response.headers.get('content-type', '')
+    if 'html' not in content_type:
+        return Metadata('', '', urljoin(response.url, '/favicon.ico'))
+    charset = 'utf-8'
+    match = re.search(r'charset=([\w-]+)', content_type, re.I)
+    if match:
+        charset = match.group(1)
+    try:
+        html = response.body.decode(charset, errors='replace')
+    except LookupError:
+        html = response.body.decode('utf-8', errors='replace')
+    return parse_metadata(html, response.url)
+
+
+def fetch_favicon(client, url):
+    try:
+        response = client.request('GET', url, max_bytes=MAX_FAVICON_BYTES + 1)
+    except FETCH_ERRORS:
+        return None
+    content_type = response.headers.get('content-type', '')
+    content_type = content_type.split(';')[0].strip().lower()
+    if (response.status != 200 or not response.body or
+            len(response.body) > MAX_FAVICON_BYTES or
+            not content_type.startswith('image/')):
+        return None
+    return content_type, response.body
+
+
+def store_favicon(url, fetched):
+    """
+    Store a fetched favicon and return its `Favicon` row.
+
+    Files are named by the digest of their content, so a favicon
+    shared by many sites is stored once. Favicons that could not be
+    fetched are recorded without an image and are not fetched again.
+    """
+    fields = {}
+    if fetched is not None:
+        content_type, data = fetched
+        digest = hashlib.sha256(data).hexdigest()
+        extension = mimetypes.guess_extension(content_type) or '.ico'
+        name = f'favicons/{digest}{extension}'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        fields = {'image': name, 'digest': digest, 'content_type': content_type}
+    try:
+        with transaction.atomic():
+            return Favicon.objects.create(url=url, **fields)
+    except IntegrityError:
+        # another worker stored it first
+        return Favicon.objects.get(url=url)
+
+
+def apply_metadata(pk, metadata, favicons):
+    """
+    Fill in the empty fields of a bookmark.
+
+    Every field is updated conditionally, so that anything the user
+    entered in the meantime is left alone.
+    """
+    bookmarks = Bookmark.objects.filter(pk=pk)
+    if metadata is None:
+        bookmarks.update(metadata_status=Bookmark.METADATA_FAILED)
+        return
+    if metadata.title:
+        bookmarks.filter(title='').update(
+            title=metadata.title, date_updated=now()
+        )
+    if metadata.description:
+        bookmarks.filter(description='').update(
+            description=metadata.description, date_updated=now()
+        )
+    favicon = favicons.get(metadata.favicon_url)
+    if favicon is not None and favicon.image:
+        bookmarks.filter(favicon__isnull=True).update(favicon=favicon)
+    bookmarks.update(metadata_status=Bookmark.METADATA_DONE)
+
+
+def enrich_pending(limit=100, workers=8, client=None):
+    """
+    Enrich up to `limit` pending bookmarks.
+
+    Pages and favicons are fetched by `workers` threads; each distinct
+    favicon URL is fetched at most once. Returns the number of
+    bookmarks that were processed.
+    """
+    pending = list(
+        Bookmark.objects
+        .filter(metadata_status=Bookmark.METADATA_PENDING)
+        .order_by('pk')
+        .values_list('pk', 'bookmark_url', 'owner_id')[:limit]
+    )
+    if not pending:
+        return 0
+
+    client = client or HTTPClient()
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(
+            lambda row: fetch_metadata(client, row[1]), pending
+        ))
+        max_length = Favicon._meta.get_field('url').max_length
+        urls = {
+            metadata.favicon_url for metadata in results
+            if metadata and len(metadata.favicon_url) <= max_length
+        }
+        favicons = {
+            favicon.url: favicon
+            for favicon in Favicon.objects.filter(url__in=urls)
+        }
+        missing = sorted(urls.difference(favicons))
+        fetched = executor.map(lambda url: fetch_favicon(client, url), missing)
+        for url, favicon in zip(missing, fetched):
+            favicons[url] = store_favicon(url, favicon)
+
+    with transaction.atomic():
+        for (pk, _, _), metadata in zip(pending, results):
+            apply_metadata(pk, metadata, favicons)
+    bookmarks_changed.send(
+        sender=Bookmark,
+        pks=[pk for pk, _, _ in pending],
+        owners={owner for _, _, owner in pending},
+        action='update',
+    )
+    return len(pending)
@@ -0,0 +1,67 @@
+"""
+Cached HTML fragments of single bookmarks.
+
+Most of a rendered bookmark looks the same to every viewer. That part
+is rendered from ``marcador/bookmark_body.html`` once and cached under
+a key derived from everything it shows, so no invalidation is needed:
+a changed bookmark simply gets a new key. What depends on the viewer
+or on the clock is rendered around the fragment on every request.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import caching
+
+__all__ = ('fragment_key', 'render_fragments')
+
+PREFIX = 'marcador:fragment:'
+TEMPLATE = 'marcador/bookmark_body.html'
+TIMEOUT = getattr(settings, 'MARCADOR_FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def fragment_key(bookmark, tags_version):
+    """
+    Return the cache key of a bookmark's fragment.
+
+    The bookmark's tags and owner should have been fetched along with
+    it, e.g. with `BookmarkQuerySet.with_related()`.
+    """
+    shown = (
+        bookmark.is_public,
+        bookmark.owner.username,
+        sorted(tag.pk for tag in bookmark.tags.all()),
+    )
+    digest = hashlib.md5(repr(shown).encode('utf-8')).hexdigest()
+    updated = int(bookmark.date_updated.timestamp() * 1000000)
+    return f'{PREFIX}{bookmark.pk}:{updated}:{tags_version}:{digest}'
+
+
+def render_fragments(bookmarks):
+    """
+    Return a list of ``(bookmark, fragment)`` pairs.
+
+    All fragments are looked up with a single cache request; missing
+    ones are rendered and stored with a single request as well.
+    """
+    bookmarks = list(bookmarks)
+    if not bookmarks:
+        return []
+    tags_version = caching.version('tags')
+    keys = [fragment_key(bookmark, tags_version) for bookmark in bookmarks]
+    found = cache.get_many(keys)
+
+    template = get_template(TEMPLATE)
+    rendered = {}
+    rows = []
+    for bookmark, key in zip(bookmarks, keys):
+        fragment = found.get(key)
+        if fragment is None:
+            fragment = rendered[key] = template.render({'bookmark': bookmark})
+        rows.append((bookmark, mark_safe(fragment)))
+    if rendered:
+        cache.set_many(rendered, TIMEOUT)
+    return rows
@@ -0,0 +1,178 @@
+"""
+A small thread-safe HTTP client with per-host keep-alive pools.
+
+Background workers talk to many remote servers, often to the same ones
+repeatedly. Reusing connections saves a TCP (and TLS) handshake per
+request, which dominates the cost of short requests.
+
+The URLs requested are given by users, so by default the client only
+connects to public addresses: every host is resolved when connecting,
+including those redirected to, and refused if any of its addresses is
+private, loopback, link-local or otherwise not globally reachable.
+"""
+import http.client
+import ipaddress
+import socket
+import threading
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit
+
+__all__ = ('HTTPClient', 'Response', 'is_public', 'public_addresses')
+
+USER_AGENT = 'Marcador/1.0'
+REDIRECT_CODES = frozenset([301, 302, 303, 307, 308])
+
+Response = namedtuple('Response', 'url status headers body')
+
+
+def is_public(address):
+    """Whether the IP `address` is globally reachable."""
+    address = ipaddress.ip_address(address.split('%')[0])
+    return address.is_global and not address.is_multicast
+
+
+def public_addresses(host, port=None, infos=None):
+    """
+    Resolve `host` and return its addresses. Raises ValueError if any of
+    them is not public, and OSError if it cannot be resolved. The result
+    of getaddrinfo() may be passed as `infos` if resolved already.
+    """
+    if infos is None:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    addresses = []
+    for *_, sockaddr in infos:
+        if not is_public(sockaddr[0]):
+            raise ValueError(f'{host} resolves to the non-public address {sockaddr[0]}')
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                              source_address=None):
+    # connect to the addresses checked, the host may resolve differently
+    # by the time a second lookup is made
+    host, port = address
+    error = None
+    for ip in public_addresses(host, port):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class HTTPClient:
+    """
+    Issue HTTP requests over pooled connections.
+
+    At most `pool_size` idle connections are kept per host; a
+    connection is only returned to its pool after its response has
+    been read completely. Unless `allow_private` is set, only public
+    addresses are connected to.
+    """
+
+    def __init__(self, timeout=10.0, pool_size=4, user_agent=USER_AGENT,
+                 allow_private=False):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.user_agent = user_agent
+        self.allow_private = allow_private
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, body=None, headers=None,
+                max_bytes=None, max_redirects=5):
+        """
+        Send a request and return a `Response`.
+
+        Redirects are followed up to `max_redirects` times. At most
+        `max_bytes` of the body are read if given.
+        """
+        for _ in range(max_redirects + 1):
+            response = self._request(method, url, body, headers, max_bytes)
+            location = response.headers.get('location')
+            if response.status not in REDIRECT_CODES or not location:
+                return response
+            url = urljoin(url, location)
+            if response.status == 303:
+                method, body = 'GET', None
+        return response
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for connections in pools.values():
+            for connection in connections:
+                connection.close()
+
+    def _request(self, method, url, body, headers, max_bytes):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'Cannot request {url!r}')
+        key = (parts.scheme, parts.hostname.lower(), parts.port)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        request_headers = {'User-Agent': self.user_agent}
+        request_headers.update(headers or {})
+
+        connection, reused = self._acquire(key)
+        try:
+            try:
+                connection.request(method, target, body, request_headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                if not reused:
+                    raise
+                # the server closed an idle connection, retry on a new one
+                connection.close()
+                connection = self._connect(key)
+                connection.request(method, target, body, request_headers)
+                response = connection.getresponse()
+
+            if max_bytes is None:
+                data = response.read()
+            else:
+                data = response.read(max_bytes)
+            complete = response.isclosed() or response.length == 0
+            if complete and not response.will_close:
+                self._release(key, connection)
+            else:
+                connection.close()
+        except Exception:
+            connection.close()
+            raise
+
+        return Response(
+            url,
+            response.status,
+            {name.lower(): value for name, value in response.getheaders()},
+            data,
+        )
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        if not self.allow_private:
+            connection._create_connection = _create_public_connection
+        return connection
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._pools.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._pools.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
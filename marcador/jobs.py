@@ -0,0 +1,170 @@
+"""
+A small durable job queue backed by the ``Job`` table.
+
+Tasks are plain functions marked with the `task` decorator and are
+referred to by their dotted path::
+
+    from marcador.jobs import enqueue
+    enqueue('marcador.tasks.check_links', limit=1000)
+
+Workers (see the ``jobworker`` command) claim due jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it,
+and with a conditional ``UPDATE`` per job otherwise. A failed job is
+retried with exponential backoff until it runs out of attempts. A job
+still running after ``MARCADOR_JOB_LEASE`` seconds is taken for the job
+of a worker that died and queued again, so that has to exceed the time
+the longest job takes.
+"""
+import json
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from .models import Job
+
+__all__ = (
+    'task', 'enqueue', 'enqueue_many', 'claim', 'run', 'requeue_stale',
+    'purge', 'backoff', 'worker_name',
+)
+
+LEASE = timedelta(seconds=getattr(settings, 'MARCADOR_JOB_LEASE', 30 * 60))
+
+
+def task(func):
+    """Mark a function as runnable by the job queue."""
+    func.is_task = True
+    return func
+
+
+def _name(func):
+    if isinstance(func, str):
+        return func
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def _build(func, kwargs, run_at=None, priority=0, max_attempts=5):
+    return Job(
+        name=_name(func),
+        payload=json.dumps(kwargs),
+        run_at=run_at or now(),
+        priority=priority,
+        max_attempts=max_attempts,
+    )
+
+
+def enqueue(func, run_at=None, priority=0, max_attempts=5, **kwargs):
+    """
+    Queue a call of `func` with the JSON-serializable `kwargs`.
+
+    `func` is a task or its dotted path. The job is saved in the
+    current transaction, so it is only picked up once that commits.
+    """
+    job = _build(func, kwargs, run_at, priority, max_attempts)
+    job.save()
+    return job
+
+
+def enqueue_many(func, kwargs_list, priority=0, max_attempts=5):
+    """Queue one job per item of `kwargs_list` with a single insert."""
+    when = now()
+    return Job.objects.bulk_create(
+        [_build(func, kwargs, when, priority, max_attempts)
+         for kwargs in kwargs_list],
+        batch_size=500,
+    )
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker=None, limit=1):
+    """
+    Claim up to `limit` due jobs for `worker` and return them.
+
+    Claimed jobs are marked as running, so no other worker picks them
+    up, and count as one attempt.
+    """
+    worker = worker or worker_name()
+    when = now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=when)
+    due = due.order_by('-priority', 'run_at').values_list('pk', flat=True)
+    changes = {
+        'status': Job.RUNNING,
+        'locked_by': worker,
+        'locked_at': when,
+        'attempts': F('attempts') + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pks = list(due.select_for_update(skip_locked=True)[:limit])
+            Job.objects.filter(pk__in=pks).update(**changes)
+    else:
+        # Without row locks, several workers may read the same
+        # candidates; the conditional update decides who gets a job.
+        pks = []
+        for pk in due[:limit * 2]:
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**changes):
+                pks.append(pk)
+                if len(pks) == limit:
+                    break
+    return list(Job.objects.filter(pk__in=pks))
+
+
+def backoff(attempts, base=10, cap=3600):
+    """Seconds to wait before the next attempt, with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def run(job):
+    """Run a claimed job and record its outcome."""
+    try:
+        func = import_string(job.name)
+        if not getattr(func, 'is_task', False):
+            raise ImportError(f'{job.name} is not a task')
+        func(**json.loads(job.payload))
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.date_finished = now()
+        else:
+            job.status = Job.QUEUED
+            job.run_at = now() + timedelta(seconds=backoff(job.attempts))
+    else:
+        job.status = Job.DONE
+        job.date_finished = now()
+    job.locked_by = ''
+    job.locked_at = None
+    job.save(update_fields=[
+        'status', 'run_at', 'last_error', 'locked_by', 'locked_at',
+        'date_finished',
+    ])
+    return job.status
+
+
+def requeue_stale(lease=None):
+    """
+    Release jobs held by workers that died while running them, that is
+    for longer than `lease`, by default `LEASE`.
+    """
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now() - (lease or LEASE)
+    ).update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def purge(older_than=timedelta(days=7)):
+    """Delete finished jobs."""
+    return Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED],
+        date_finished__lt=now() - older_than,
+    ).delete()[0]
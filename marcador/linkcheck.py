@@ -0,0 +1,291 @@
+"""
+Concurrent link-health checking for stored bookmarks.
+
+URLs are checked by a small asyncio HTTP client: a ``HEAD`` request
+first, falling back to ``GET`` for servers that reject ``HEAD``. The
+number of requests in flight is bounded globally and per host, so a
+collection dominated by a single site does not hammer that site.
+
+The URLs are given by users, so unless `allow_private` is set only
+public addresses are connected to, checked for every redirect as well;
+links to other ones are recorded as errors.
+
+Results are written back with ``QuerySet.update()``, so checking a
+bookmark neither touches ``date_updated`` nor fires model signals.
+"""
+import asyncio
+import socket
+import ssl
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+from urllib.parse import quote, urljoin, urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from .httpclient import public_addresses
+from .models import Bookmark
+
+__all__ = ('Link', 'LinkCheckResult', 'LinkChecker', 'check_bookmarks')
+
+USER_AGENT = 'Marcador-LinkChecker/1.0'
+
+# servers that answer these to HEAD are retried with GET
+HEAD_FALLBACK_CODES = frozenset([400, 403, 405, 501])
+REDIRECT_CODES = frozenset([301, 302, 303, 307, 308])
+
+PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+QUERY_SAFE = PATH_SAFE + '?'
+
+CHECK_INTERVAL = getattr(
+    settings, 'MARCADOR_LINKCHECK_INTERVAL', timedelta(days=7)
+)
+MAX_CHECK_INTERVAL = getattr(
+    settings, 'MARCADOR_LINKCHECK_MAX_INTERVAL', timedelta(days=56)
+)
+RETRY_INTERVAL = getattr(
+    settings, 'MARCADOR_LINKCHECK_RETRY_INTERVAL', timedelta(days=1)
+)
+
+Link = namedtuple(
+    'Link', 'pk url etag last_modified checked_at next_check'
+)
+LinkCheckResult = namedtuple(
+    'LinkCheckResult', 'pk status status_code etag last_modified unchanged'
+)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class TooManyRedirects(Exception):
+    def __init__(self, status_code):
+        super(TooManyRedirects, self).__init__(status_code)
+        self.status_code = status_code
+
+
+class LinkChecker:
+    """
+    Check many links concurrently.
+
+    At most `concurrency` requests are in flight overall and at most
+    `per_host` against a single host. Every request, including the
+    time to connect, is bounded by `timeout` seconds. Unless
+    `allow_private` is set, only public addresses are connected to.
+    """
+
+    def __init__(self, concurrency=50, per_host=2, timeout=10.0,
+                 max_redirects=5, allow_private=False):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.allow_private = allow_private
+        self.ssl_context = ssl.create_default_context()
+
+    def run(self, links):
+        """Check `links` and return their results in the same order."""
+        return asyncio.run(self.check_all(links))
+
+    async def check_all(self, links):
+        # semaphores are bound to the running loop, so create them here
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        return await asyncio.gather(*[self.check(link) for link in links])
+
+    async def check(self, link):
+        headers = {}
+        if link.etag:
+            headers['If-None-Match'] = link.etag
+        if link.last_modified:
+            headers['If-Modified-Since'] = link.last_modified
+
+        try:
+            try:
+                status, response = await self.follow('HEAD', link.url, headers)
+            except ProtocolError:
+                status, response = None, {}
+            if status is None or status in HEAD_FALLBACK_CODES:
+                status, response = await self.follow('GET', link.url, headers)
+        except TooManyRedirects as e:
+            return LinkCheckResult(
+                link.pk, Bookmark.LINK_REDIRECT, e.status_code,
+                link.etag, link.last_modified, False
+            )
+        except (OSError, ValueError, ProtocolError, asyncio.TimeoutError):
+            return LinkCheckResult(
+                link.pk, Bookmark.LINK_ERROR, None,
+                link.etag, link.last_modified, False
+            )
+
+        if status == 304:
+            return LinkCheckResult(
+                link.pk, Bookmark.LINK_OK, status,
+                link.etag, link.last_modified, True
+            )
+        etag = response.get('etag', '')[:255]
+        last_modified = response.get('last-modified', '')[:64]
+        unchanged = bool(
+            (etag and etag == link.etag) or
+            (last_modified and last_modified == link.last_modified)
+        )
+        if 200 <= status < 300:
+            link_status = Bookmark.LINK_OK
+        elif status >= 400:
+            link_status = Bookmark.LINK_BROKEN
+        else:
+            link_status = Bookmark.LINK_REDIRECT
+        return LinkCheckResult(
+            link.pk, link_status, status, etag, last_modified, unchanged
+        )
+
+    async def follow(self, method, url, headers):
+        """Request `url`, following redirects up to `max_redirects`."""
+        for _ in range(self.max_redirects + 1):
+            status, response = await self.request(method, url, headers)
+            location = response.get('location')
+            if status not in REDIRECT_CODES or not location:
+                return status, response
+            url = urljoin(url, location)
+            # validators belong to the originally stored URL
+            headers = {}
+        raise TooManyRedirects(status)
+
+    async def request(self, method, url, headers):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'Cannot check {url!r}')
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+
+        # take the host slot first, so that requests queued behind a
+        # busy host do not hold on to global slots
+        async with self._hosts[(parts.hostname.lower(), port)]:
+            async with self._global:
+                return await asyncio.wait_for(
+                    self.exchange(method, parts, port, headers),
+                    self.timeout,
+                )
+
+    async def connect(self, parts, port):
+        context = self.ssl_context if parts.scheme == 'https' else None
+        if self.allow_private:
+            return await asyncio.open_connection(parts.hostname, port, ssl=context)
+        # connect to the addresses checked, the host may resolve differently
+        # by the time a second lookup is made
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, port, type=socket.SOCK_STREAM
+        )
+        error = None
+        for ip in public_addresses(parts.hostname, port, infos):
+            try:
+                return await asyncio.open_connection(
+                    ip, port, ssl=context,
+                    server_hostname=parts.hostname if context else None,
+                )
+            except OSError as e:
+                error = e
+        raise error
+
+    async def exchange(self, method, parts, port, headers):
+        reader, writer = await self.connect(parts, port)
+        try:
+            target = quote(parts.path or '/', safe=PATH_SAFE)
+            if parts.query:
+                target += '?' + quote(parts.query, safe=QUERY_SAFE)
+            host = parts.hostname.encode('idna').decode('ascii')
+            if parts.port:
+                host = f'{host}:{parts.port}'
+            lines = [
+                f'{method} {target} HTTP/1.1',
+                f'Host: {host}',
+                f'User-Agent: {USER_AGENT}',
+                'Accept: */*',
+                'Connection: close',
+            ]
+            lines.extend(f'{name}: {value}' for name, value in headers.items())
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            await writer.drain()
+
+            status_line = (await reader.readline()).decode('latin-1')
+            try:
+                version, code = status_line.split(None, 2)[:2]
+                status = int(code)
+            except ValueError:
+                raise ProtocolError(status_line)
+            if not version.startswith('HTTP/'):
+                raise ProtocolError(status_line)
+
+            response = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response[name.strip().lower()] = value.strip()
+            return status, response
+        finally:
+            writer.close()
+
+
+def schedule(link, result, when):
+    """Return when a link should be checked next."""
+    if result.status != Bookmark.LINK_OK:
+        return when + RETRY_INTERVAL
+    interval = CHECK_INTERVAL
+    if result.unchanged and link.checked_at and link.next_check:
+        # back off for pages that keep telling us they did not change
+        previous = link.next_check - link.checked_at
+        interval = min(max(previous * 2, CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+    return when + interval
+
+
+def store_results(links, results, when=None):
+    when = when or now()
+    with transaction.atomic():
+        for link, result in zip(links, results):
+            Bookmark.objects.filter(pk=link.pk).update(
+                link_status=result.status,
+                link_status_code=result.status_code,
+                link_checked_at=when,
+                link_next_check=schedule(link, result, when),
+                link_etag=result.etag,
+                link_last_modified=result.last_modified,
+            )
+
+
+def check_bookmarks(queryset=None, limit=None, chunk_size=500,
+                    checker=None, force=False):
+    """
+    Check the links of all bookmarks in `queryset` that are due.
+
+    Bookmarks are read and written in chunks of `chunk_size` rows, so
+    the memory footprint does not grow with the size of the table.
+    Returns a `Counter` of the resulting link statuses.
+    """
+    if queryset is None:
+        queryset = Bookmark.objects.all()
+    if not force:
+        queryset = queryset.link_check_due()
+    queryset = queryset.order_by('pk').values_list(
+        'pk', 'bookmark_url', 'link_etag', 'link_last_modified',
+        'link_checked_at', 'link_next_check',
+    )
+    checker = checker or LinkChecker()
+    counts = Counter()
+    last_pk = 0
+
+    while limit is None or sum(counts.values()) < limit:
+        size = chunk_size
+        if limit is not None:
+            size = min(size, limit - sum(counts.values()))
+        links = [Link(*row) for row in queryset.filter(pk__gt=last_pk)[:size]]
+        if not links:
+            break
+        results = checker.run(links)
+        store_results(links, results)
+        counts.update(result.status for result in results)
+        last_pk = links[-1].pk
+
+    return counts
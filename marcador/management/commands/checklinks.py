@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from marcador.linkcheck import LinkChecker, check_bookmarks
+
+
+class Command(BaseCommand):
+    help = 'Check the URLs of all bookmarks that are due for a link check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int,
+            help='Check at most this many bookmarks.',
+        )
+        parser.add_argument(
+            '--all', action='store_true', dest='force',
+            help='Ignore the recheck schedule and check every bookmark.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Maximum number of requests in flight (default: 50).',
+        )
+        parser.add_argument(
+            '--per-host', type=int, default=2,
+            help='Maximum number of requests per host (default: 2).',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10.0,
+            help='Timeout of a single request in seconds (default: 10).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of bookmarks read and written at once.',
+        )
+
+    def handle(self, *args, **options):
+        checker = LinkChecker(
+            concurrency=options['concurrency'],
+            per_host=options['per_host'],
+            timeout=options['timeout'],
+        )
+        counts = check_bookmarks(
+            limit=options['limit'],
+            chunk_size=options['chunk_size'],
+            checker=checker,
+            force=options['force'],
+        )
+        total = sum(counts.values())
+        self.stdout.write(f'Checked {total} bookmarks.')
+        for status, count in sorted(counts.items()):
+            self.stdout.write(f'  {status}: {count}')
@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from marcador.webhooks import BATCH_SIZE, Dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Deliver bookmark events to webhooks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Number of events sent per request (default: {BATCH_SIZE}).',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Number of endpoints requested at once (default: 8).',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to sleep when no webhook is due (default: 1).',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit as soon as no webhook is due.',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        dispatcher = Dispatcher(
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+        )
+        served = 0
+        try:
+            while not self.stopping:
+                count = dispatcher.deliver(limit=options['concurrency'] * 4)
+                served += count
+                if not count:
+                    if options['burst']:
+                        break
+                    time.sleep(options['interval'])
+        finally:
+            dispatcher.close()
+        self.stdout.write(f'Served {served} webhook deliveries.')
+
+    def stop(self, signum, frame):
+        # finish the deliveries at hand, then exit
+        self.stopping = True
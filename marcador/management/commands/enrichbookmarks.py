@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from marcador.enrichment import enrich_pending
+from marcador.httpclient import HTTPClient
+
+
+class Command(BaseCommand):
+    help = ('Fill in the title, description and favicon of new bookmarks '
+            'from the bookmarked pages.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of bookmarks fetched per batch (default: 100).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Number of concurrent fetches (default: 8).',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10.0,
+            help='Timeout of a single request in seconds (default: 10).',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep running and poll for new bookmarks.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to sleep when there is nothing to do (default: 5).',
+        )
+
+    def handle(self, *args, **options):
+        client = HTTPClient(timeout=options['timeout'])
+        total = 0
+        try:
+            while True:
+                count = enrich_pending(
+                    limit=options['batch_size'],
+                    workers=options['workers'],
+                    client=client,
+                )
+                total += count
+                if count:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            client.close()
+        self.stdout.write(f'Enriched {total} bookmarks.')
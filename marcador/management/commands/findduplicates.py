@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from marcador.duplicates import THRESHOLD, update_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Find near-duplicate bookmarks of every user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float, default=THRESHOLD,
+            help=f'Minimum estimated similarity (default: {THRESHOLD}).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of bookmarks compared at once.',
+        )
+
+    def handle(self, *args, **options):
+        count = update_duplicates(
+            batch_size=options['batch_size'],
+            threshold=options['threshold'],
+        )
+        self.stdout.write(f'Found {count} possible duplicates.')
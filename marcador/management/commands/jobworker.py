@@ -0,0 +1,89 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from marcador import jobs
+
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of worker processes (default: 1).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10,
+            help='Number of jobs claimed at once (default: 10).',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to sleep when no job is due (default: 1).',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit as soon as no job is due.',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] <= 1:
+            return self.work(options)
+
+        # forked workers must not share database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=self.work, args=(options,))
+            for _ in range(options['concurrency'])
+        ]
+        for process in processes:
+            process.start()
+
+        def terminate(signum, frame):
+            # pass it on, the workers finish the jobs at hand
+            for process in processes:
+                process.terminate()
+
+        previous = signal.signal(signal.SIGTERM, terminate)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+
+    def work(self, options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        worker = jobs.worker_name()
+        processed = 0
+        maintained = 0
+
+        while not self.stopping:
+            if time.monotonic() - maintained > MAINTENANCE_INTERVAL:
+                jobs.requeue_stale()
+                jobs.purge()
+                maintained = time.monotonic()
+            claimed = jobs.claim(worker, options['batch_size'])
+            for job in claimed:
+                jobs.run(job)
+            processed += len(claimed)
+            if not claimed:
+                if options['burst']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(f'{worker} processed {processed} jobs.')
+
+    def stop(self, signum, frame):
+        # finish the jobs at hand, then exit
+        self.stopping = True
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from marcador.bulk import merge_tags, rename_tag
+from marcador.models import Tag
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge tags into the tag TARGET, which is created if needed. '
+        'With a single source, this renames the source.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', help='Name of the resulting tag.')
+        parser.add_argument(
+            'sources', nargs='+', metavar='source',
+            help='Names of the tags to merge into the target.',
+        )
+
+    def handle(self, *args, **options):
+        names = options['sources']
+        sources = list(Tag.objects.filter(name__in=names))
+        missing = set(names).difference(tag.name for tag in sources)
+        if missing:
+            raise CommandError(f'Unknown tags: {", ".join(sorted(missing))}')
+
+        target = Tag.objects.filter(name=options['target']).first()
+        if target is None:
+            # rename one of the sources instead of creating the target
+            target = rename_tag(sources.pop(0), options['target'])
+        count = merge_tags(sources, target)
+        self.stdout.write(
+            f'Merged {len(sources)} tags into {target.name}, '
+            f'retagging {count} bookmarks.'
+        )
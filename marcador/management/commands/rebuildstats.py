@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from marcador.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recount the bookmark counters of all users.'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(f'Recounted the counters of {count} users.')
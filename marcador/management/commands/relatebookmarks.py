@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from marcador.related import TOP_K, update_related
+
+
+class Command(BaseCommand):
+    help = 'Find the related bookmarks of bookmarks that changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', dest='full',
+            help='Update every bookmark, e.g. after tags were merged.',
+        )
+        parser.add_argument(
+            '--top', type=int, default=TOP_K,
+            help=f'Number of related bookmarks to keep (default: {TOP_K}).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of bookmarks compared at once.',
+        )
+
+    def handle(self, *args, **options):
+        count = update_related(
+            full=options['full'],
+            batch_size=options['batch_size'],
+            top_k=options['top'],
+        )
+        self.stdout.write(f'Updated the related bookmarks of {count} bookmarks.')
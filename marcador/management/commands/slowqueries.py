@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from marcador.slowqueries import rank, read
+
+
+class Command(BaseCommand):
+    help = 'Rank the queries in the slow query log by their total time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=getattr(settings, 'MARCADOR_SLOW_QUERY_LOG', None),
+            help='The log file, read with its rotated files.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Show this many queries (default: 20).',
+        )
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Also show the plan of every query.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['log']:
+            raise CommandError(
+                'No slow query log, set MARCADOR_SLOW_QUERY_LOG or pass --log.'
+            )
+        ranking = rank(read(options['log']))
+        if not ranking:
+            self.stdout.write('No slow queries logged.')
+            return
+        self.stdout.write(
+            f'{"total ms":>10} {"count":>6} {"mean ms":>9} {"max ms":>9}  query'
+        )
+        for stats in ranking[:options['limit']]:
+            self.stdout.write(
+                f'{stats["total"]:10.1f} {stats["count"]:6d} '
+                f'{stats["mean"]:9.1f} {stats["max"]:9.1f}  {stats["fingerprint"]}'
+            )
+            views = sorted(stats['views'].items(), key=lambda item: -item[1])
+            for view, count in views:
+                self.stdout.write(f'{"":38}{count:6d} x {view}')
+            if options['explain'] and stats['explain']:
+                for line in stats['explain'].splitlines():
+                    self.stdout.write(f'{"":38}| {line}')
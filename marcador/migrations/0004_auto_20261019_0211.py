@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0003_auto_20200517_1935'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_checked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='link last checked'),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_etag',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_last_modified',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_next_check',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='next link check'),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_status',
+            field=models.CharField(choices=[('unchecked', 'unchecked'), ('ok', 'ok'), ('redirect', 'too many redirects'), ('broken', 'broken'), ('error', 'unreachable')], db_index=True, default='unchecked', max_length=10, verbose_name='link status'),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_status_code',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='HTTP status code'),
+        ),
+    ]
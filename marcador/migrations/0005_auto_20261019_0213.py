@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:13
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_existing_done(apps, schema_editor):
+    # only bookmarks created from now on are to be enriched
+    Bookmark = apps.get_model('marcador', 'Bookmark')
+    Bookmark.objects.using(schema_editor.connection.alias).update(
+        metadata_status='done'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0004_auto_20261019_0211'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Favicon',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000, unique=True, verbose_name='URL')),
+                ('image', models.FileField(blank=True, upload_to='favicons')),
+                ('digest', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'verbose_name': 'favicon',
+                'verbose_name_plural': 'favicons',
+            },
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='metadata_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('done', 'done'), ('failed', 'failed')], db_index=True, default='pending', editable=False, max_length=10, verbose_name='metadata'),
+        ),
+        migrations.RunPython(mark_existing_done, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='bookmark',
+            name='title',
+            field=models.CharField(blank=True, max_length=255, verbose_name='title'),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='favicon',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='marcador.Favicon', verbose_name='favicon'),
+        ),
+    ]
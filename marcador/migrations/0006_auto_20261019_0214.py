@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0005_auto_20261019_0213'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='task')),
+                ('payload', models.TextField(default='{}', verbose_name='payload')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='queued', max_length=10, verbose_name='status')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='priority')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='max. attempts')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='run at')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='locked by')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='locked at')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date created')),
+                ('date_finished', models.DateTimeField(blank=True, null=True, verbose_name='date finished')),
+            ],
+            options={
+                'verbose_name': 'job',
+                'verbose_name_plural': 'jobs',
+                'ordering': ['-priority', 'run_at'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('status', 'priority', 'run_at')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0006_auto_20261019_0214'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookmark',
+            name='bookmark_url',
+            field=models.URLField(db_index=True, verbose_name='URL'),
+        ),
+        migrations.AlterField(
+            model_name='bookmark',
+            name='date_created',
+            field=models.DateTimeField(db_index=True, verbose_name='date created'),
+        ),
+        migrations.AlterField(
+            model_name='bookmark',
+            name='title',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='title'),
+        ),
+    ]
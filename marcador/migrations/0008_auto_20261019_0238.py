@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0007_auto_20261019_0228'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBookmark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='similarity')),
+            ],
+            options={
+                'verbose_name': 'related bookmark',
+                'verbose_name_plural': 'related bookmarks',
+                'ordering': ['bookmark', '-score'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='related_updated',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='related bookmarks updated'),
+        ),
+        migrations.AddField(
+            model_name='relatedbookmark',
+            name='bookmark',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_bookmarks', to='marcador.Bookmark', verbose_name='bookmark'),
+        ),
+        migrations.AddField(
+            model_name='relatedbookmark',
+            name='related',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marcador.Bookmark', verbose_name='related bookmark'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedbookmark',
+            unique_together=set([('bookmark', 'related')]),
+        ),
+    ]
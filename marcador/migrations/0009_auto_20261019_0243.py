@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0008_auto_20261019_0238'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateBookmark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField(verbose_name='similarity')),
+                ('date_found', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date found')),
+                ('bookmark', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicates', to='marcador.Bookmark', verbose_name='bookmark')),
+                ('duplicate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marcador.Bookmark', verbose_name='possible duplicate')),
+            ],
+            options={
+                'verbose_name': 'possible duplicate',
+                'verbose_name_plural': 'possible duplicates',
+                'ordering': ['-similarity', 'bookmark'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='duplicatebookmark',
+            unique_together=set([('bookmark', 'duplicate')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:50
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0008_alter_user_username_max_length'),
+        ('marcador', '0009_auto_20261019_0243'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bookmark_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('bookmarks', models.PositiveIntegerField(default=0, verbose_name='bookmarks')),
+                ('public_bookmarks', models.PositiveIntegerField(default=0, verbose_name='public bookmarks')),
+                ('tags', models.PositiveIntegerField(default=0, verbose_name='distinct tags')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='last activity')),
+            ],
+            options={
+                'verbose_name': 'user statistics',
+                'verbose_name_plural': 'user statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 02:55
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('marcador', '0010_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookmarkChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bookmark_id', models.IntegerField(verbose_name='bookmark')),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted')], max_length=10, verbose_name='action')),
+                ('date', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='date')),
+                ('owner', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='owner')),
+            ],
+            options={
+                'verbose_name': 'bookmark change',
+                'verbose_name_plural': 'bookmark changes',
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='bookmarkchange',
+            index_together=set([('owner', 'id')]),
+        ),
+    ]
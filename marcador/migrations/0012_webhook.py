@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 03:03
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import marcador.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('marcador', '0011_auto_20261019_0255'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Webhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('webhook_url', models.URLField(max_length=1000, verbose_name='URL')),
+                ('secret', models.CharField(default=marcador.models.generate_secret, editable=False, max_length=64, verbose_name='secret')),
+                ('is_active', models.BooleanField(default=True, verbose_name='active')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date created')),
+                ('cursor', models.BigIntegerField(editable=False, null=True, verbose_name='cursor')),
+                ('failures', models.PositiveSmallIntegerField(default=0, verbose_name='failed attempts')),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='next attempt')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('last_delivery', models.DateTimeField(blank=True, null=True, verbose_name='last delivery')),
+                ('lag', models.FloatField(blank=True, null=True, verbose_name='lag in seconds')),
+                ('events_delivered', models.PositiveIntegerField(default=0, verbose_name='events delivered')),
+                ('delivery_time', models.FloatField(default=0, verbose_name='seconds spent delivering')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='webhooks', to=settings.AUTH_USER_MODEL, verbose_name='owner')),
+            ],
+            options={
+                'verbose_name': 'webhook',
+                'verbose_name_plural': 'webhooks',
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-19 03:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import marcador.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marcador', '0012_webhook'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webhook',
+            name='webhook_url',
+            field=models.URLField(max_length=1000, validators=[marcador.models.validate_public_url], verbose_name='URL'),
+        ),
+    ]
@@ -1,9 +1,18 @@
 # encoding: utf-8
+import secrets
+from urllib.parse import urlsplit
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils.timezone import now
 
-__all__ = ('Tag', 'Bookmark')
+from .httpclient import public_addresses
+
+__all__ = (
+    'Tag', 'Favicon', 'Bookmark', 'RelatedBookmark', 'DuplicateBookmark',
+    'UserStats', 'BookmarkChange', 'Webhook', 'Job',
+)
 
 
 class Tag(models.Model):
@@ -18,6 +27,20 @@ class Tag(models.Model):
         return self.name
 
 
+class Favicon(models.Model):
+    url = models.URLField('URL', max_length=1000, unique=True)
+    image = models.FileField(upload_to='favicons', blank=True)
+    digest = models.CharField(max_length=64, blank=True, db_index=True)
+    content_type = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        verbose_name = 'favicon'
+        verbose_name_plural = 'favicons'
+
+    def __str__(self):
+        return self.url
+
+
 class BookmarkQuerySet(models.QuerySet):
     def with_owner(self):
         return self.select_related('owner')
@@ -31,25 +54,81 @@ class BookmarkQuerySet(models.QuerySet):
     def with_related(self):
         return self.with_owner().with_tags()
 
+    def link_check_due(self, when=None):
+        when = when or now()
+        return self.filter(
+            models.Q(link_next_check__isnull=True) |
+            models.Q(link_next_check__lte=when)
+        )
 
-class PublicBookmarkManager(models.Manager):
+
+class PublicBookmarkManager(models.Manager.from_queryset(BookmarkQuerySet)):
     def get_queryset(self):
         qs = super(PublicBookmarkManager, self).get_queryset()
         return qs.filter(is_public=True)
 
 
 class Bookmark(models.Model):
-    bookmark_url = models.URLField('URL')
-    title = models.CharField('title', max_length=255)
+    LINK_UNCHECKED = 'unchecked'
+    LINK_OK = 'ok'
+    LINK_REDIRECT = 'redirect'
+    LINK_BROKEN = 'broken'
+    LINK_ERROR = 'error'
+    LINK_STATUS_CHOICES = (
+        (LINK_UNCHECKED, 'unchecked'),
+        (LINK_OK, 'ok'),
+        (LINK_REDIRECT, 'too many redirects'),
+        (LINK_BROKEN, 'broken'),
+        (LINK_ERROR, 'unreachable'),
+    )
+    METADATA_PENDING = 'pending'
+    METADATA_DONE = 'done'
+    METADATA_FAILED = 'failed'
+    METADATA_STATUS_CHOICES = (
+        (METADATA_PENDING, 'pending'),
+        (METADATA_DONE, 'done'),
+        (METADATA_FAILED, 'failed'),
+    )
+
+    bookmark_url = models.URLField('URL', db_index=True)
+    title = models.CharField('title', max_length=255, blank=True, db_index=True)
     description = models.TextField('description', blank=True)
     is_public = models.BooleanField('public', default=True)
-    date_created = models.DateTimeField('date created')
+    date_created = models.DateTimeField('date created', db_index=True)
     date_updated = models.DateTimeField('date updated')
     owner = models.ForeignKey(
         User, verbose_name='owner',
         related_name='bookmarks'
     )
     tags = models.ManyToManyField(Tag, blank=True)
+    favicon = models.ForeignKey(
+        Favicon, verbose_name='favicon', on_delete=models.SET_NULL,
+        null=True, blank=True, editable=False, related_name='+'
+    )
+    metadata_status = models.CharField(
+        'metadata', max_length=10, db_index=True, editable=False,
+        choices=METADATA_STATUS_CHOICES, default=METADATA_PENDING,
+    )
+    link_status = models.CharField(
+        'link status', max_length=10, db_index=True,
+        choices=LINK_STATUS_CHOICES, default=LINK_UNCHECKED,
+    )
+    link_status_code = models.PositiveSmallIntegerField(
+        'HTTP status code', null=True, blank=True
+    )
+    link_checked_at = models.DateTimeField(
+        'link last checked', null=True, blank=True
+    )
+    link_next_check = models.DateTimeField(
+        'next link check', null=True, blank=True, db_index=True
+    )
+    link_etag = models.CharField(max_length=255, blank=True, editable=False)
+    link_last_modified = models.CharField(
+        max_length=64, blank=True, editable=False
+    )
+    related_updated = models.DateTimeField(
+        'related bookmarks updated', null=True, blank=True, editable=False
+    )
 
     objects = BookmarkQuerySet.as_manager()
     public = PublicBookmarkManager()
@@ -62,8 +141,214 @@ class Bookmark(models.Model):
     def __str__(self):
         return f'{self.title} ({self.bookmark_url})'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Bookmark, cls).from_db(db, field_names, values)
+        # remember the stored state, e.g. to detect visibility flips
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.id:
             self.date_created = now()
         self.date_updated = now()
-        super(Bookmark, self).save(*args, **kwargs)
+        # the counters of the owner are updated on post_save, within
+        # the same transaction
+        with transaction.atomic():
+            super(Bookmark, self).save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
+
+class RelatedBookmark(models.Model):
+    bookmark = models.ForeignKey(
+        Bookmark, verbose_name='bookmark', on_delete=models.CASCADE,
+        related_name='related_bookmarks'
+    )
+    related = models.ForeignKey(
+        Bookmark, verbose_name='related bookmark', on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField('similarity')
+
+    class Meta:
+        verbose_name = 'related bookmark'
+        verbose_name_plural = 'related bookmarks'
+        ordering = ['bookmark', '-score']
+        unique_together = [('bookmark', 'related')]
+
+    def __str__(self):
+        return f'{self.bookmark_id} -> {self.related_id} ({self.score:.2f})'
+
+
+class DuplicateBookmark(models.Model):
+    bookmark = models.ForeignKey(
+        Bookmark, verbose_name='bookmark', on_delete=models.CASCADE,
+        related_name='duplicates'
+    )
+    duplicate = models.ForeignKey(
+        Bookmark, verbose_name='possible duplicate', on_delete=models.CASCADE,
+        related_name='+'
+    )
+    similarity = models.FloatField('similarity')
+    date_found = models.DateTimeField('date found', default=now)
+
+    class Meta:
+        verbose_name = 'possible duplicate'
+        verbose_name_plural = 'possible duplicates'
+        ordering = ['-similarity', 'bookmark']
+        unique_together = [('bookmark', 'duplicate')]
+
+    def __str__(self):
+        return f'{self.bookmark_id} ~ {self.duplicate_id} ({self.similarity:.2f})'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User, verbose_name='user', on_delete=models.CASCADE,
+        primary_key=True, related_name='bookmark_stats'
+    )
+    bookmarks = models.PositiveIntegerField('bookmarks', default=0)
+    public_bookmarks = models.PositiveIntegerField('public bookmarks', default=0)
+    tags = models.PositiveIntegerField('distinct tags', default=0)
+    last_activity = models.DateTimeField('last activity', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'user statistics'
+        verbose_name_plural = 'user statistics'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.bookmarks} bookmarks'
+
+
+class BookmarkChange(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (CREATED, 'created'),
+        (UPDATED, 'updated'),
+        (DELETED, 'deleted'),
+    )
+
+    # no constraints, the changes outlive deleted bookmarks and users
+    # until they expire
+    owner = models.ForeignKey(
+        User, verbose_name='owner', on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+'
+    )
+    bookmark_id = models.IntegerField('bookmark')
+    action = models.CharField('action', max_length=10, choices=ACTION_CHOICES)
+    date = models.DateTimeField('date', default=now, db_index=True)
+
+    class Meta:
+        verbose_name = 'bookmark change'
+        verbose_name_plural = 'bookmark changes'
+        ordering = ['pk']
+        index_together = [('owner', 'id')]
+
+    def __str__(self):
+        return f'#{self.pk} {self.bookmark_id} {self.action}'
+
+
+def generate_secret():
+    return secrets.token_hex(32)
+
+
+def validate_public_url(url):
+    """Refuse URLs whose host resolves to a non-public address."""
+    try:
+        public_addresses(urlsplit(url).hostname)
+    except ValueError:
+        raise ValidationError(
+            'Enter a URL on a public host.', code='non_public'
+        )
+    except OSError:
+        # not resolvable for now; connecting checks the host again
+        pass
+
+
+class Webhook(models.Model):
+    owner = models.ForeignKey(
+        User, verbose_name='owner', on_delete=models.CASCADE,
+        related_name='webhooks'
+    )
+    webhook_url = models.URLField(
+        'URL', max_length=1000, validators=[validate_public_url]
+    )
+    secret = models.CharField(
+        'secret', max_length=64, default=generate_secret, editable=False
+    )
+    is_active = models.BooleanField('active', default=True)
+    date_created = models.DateTimeField('date created', default=now)
+    # the last change of the owner's bookmarks that was delivered
+    cursor = models.BigIntegerField('cursor', null=True, editable=False)
+    failures = models.PositiveSmallIntegerField('failed attempts', default=0)
+    next_attempt = models.DateTimeField('next attempt', default=now, db_index=True)
+    last_error = models.TextField('last error', blank=True)
+    last_delivery = models.DateTimeField('last delivery', null=True, blank=True)
+    lag = models.FloatField('lag in seconds', null=True, blank=True)
+    events_delivered = models.PositiveIntegerField('events delivered', default=0)
+    delivery_time = models.FloatField('seconds spent delivering', default=0)
+
+    class Meta:
+        verbose_name = 'webhook'
+        verbose_name_plural = 'webhooks'
+        ordering = ['pk']
+
+    def __str__(self):
+        return self.webhook_url
+
+    @property
+    def throughput(self):
+        """Events delivered per second of requests."""
+        if not self.delivery_time:
+            return None
+        return self.events_delivered / self.delivery_time
+
+    def save(self, *args, **kwargs):
+        if self.cursor is None:
+            # only deliver what changes from now on
+            self.cursor = BookmarkChange.objects.aggregate(
+                cursor=models.Max('pk')
+            )['cursor'] or 0
+        super(Webhook, self).save(*args, **kwargs)
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'queued'),
+        (RUNNING, 'running'),
+        (DONE, 'done'),
+        (FAILED, 'failed'),
+    )
+
+    name = models.CharField('task', max_length=200)
+    payload = models.TextField('payload', default='{}')
+    status = models.CharField(
+        'status', max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+    priority = models.SmallIntegerField('priority', default=0)
+    attempts = models.PositiveSmallIntegerField('attempts', default=0)
+    max_attempts = models.PositiveSmallIntegerField('max. attempts', default=5)
+    run_at = models.DateTimeField('run at', default=now)
+    locked_by = models.CharField('locked by', max_length=100, blank=True)
+    locked_at = models.DateTimeField('locked at', null=True, blank=True)
+    last_error = models.TextField('last error', blank=True)
+    date_created = models.DateTimeField('date created', default=now)
+    date_finished = models.DateTimeField('date finished', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'job'
+        verbose_name_plural = 'jobs'
+        ordering = ['-priority', 'run_at']
+        index_together = [('status', 'priority', 'run_at')]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,158 @@
+"""
+Detection of N+1 queries: the same query executed again and again in
+one request, typically once per row of a list that a template or a
+serializer renders.
+
+Queries are counted by their fingerprint (see `marcador.queries`). When
+a fingerprint reaches `THRESHOLD` executions, the innermost template
+node or serializer field on the stack is recorded as its origin, so the
+stack is only inspected once per repeated query. With
+``MARCADOR_NPLUSONE = 'raise'``, `NPlusOneMiddleware` raises
+`NPlusOneError` at the end of such a request, which fails tests; with
+``'log'`` it logs a warning instead.
+
+Repeated queries whose origin or fingerprint match a shell-style
+pattern of ``MARCADOR_NPLUSONE_ALLOWLIST`` are ignored.
+"""
+import fnmatch
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.template.base import Node
+
+from .queries import execute_wrapper, fingerprint
+
+__all__ = (
+    'Repeat', 'NPlusOneError', 'Detector', 'detect', 'NPlusOneMiddleware',
+)
+
+logger = logging.getLogger(__name__)
+
+MODE = getattr(settings, 'MARCADOR_NPLUSONE', '')
+THRESHOLD = getattr(settings, 'MARCADOR_NPLUSONE_THRESHOLD', 3)
+ALLOWLIST = getattr(settings, 'MARCADOR_NPLUSONE_ALLOWLIST', ())
+
+Repeat = namedtuple('Repeat', 'fingerprint sql count origin')
+
+# statements of atomic blocks, repeated by every one of them
+_TRANSACTION = re.compile(r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.I)
+
+_RENDER = Node.render_annotated.__code__
+_PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_OWN = {os.path.abspath(__file__), os.path.join(os.path.dirname(__file__), 'queries.py')}
+
+
+def describe(repeat):
+    return f'{repeat.count} x {repeat.fingerprint}\n    from {repeat.origin}'
+
+
+class NPlusOneError(AssertionError):
+    def __init__(self, repeats):
+        self.repeats = repeats
+        super(NPlusOneError, self).__init__(
+            'Repeated queries:\n' + '\n'.join(describe(r) for r in repeats)
+        )
+
+
+def _is_project(filename):
+    return (
+        filename.startswith(_PROJECT) and filename not in _OWN and
+        'site-packages' not in filename
+    )
+
+
+def origin(frame):
+    """
+    Return where the query executed in `frame` came from: the innermost
+    template node or serializer field, or else the innermost frame of
+    the project's own code.
+    """
+    fallback = None
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if frame.f_code is _RENDER:
+            node_origin = getattr(owner, 'origin', None)
+            token = getattr(owner, 'token', None)
+            if node_origin is not None and token is not None:
+                return f'{node_origin.template_name}:{token.lineno}'
+        elif getattr(owner, 'field_name', None) and hasattr(owner, 'to_representation'):
+            # a serializer field, named after the serializer it is part of
+            return f'{type(owner.parent).__name__}.{owner.field_name}'
+        elif fallback is None and _is_project(frame.f_code.co_filename):
+            filename = os.path.relpath(frame.f_code.co_filename, _PROJECT)
+            fallback = f'{filename}:{frame.f_lineno}'
+        frame = frame.f_back
+    return fallback or '<unknown>'
+
+
+class Detector:
+    """An execute wrapper counting queries by their fingerprint."""
+
+    def __init__(self, threshold=THRESHOLD, allowlist=ALLOWLIST):
+        self.threshold = threshold
+        self.allowlist = allowlist
+        self.counts = {}
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if _TRANSACTION.match(sql):
+            return execute(sql, params, many, context)
+        shape = fingerprint(sql)
+        count = self.counts.get(shape, 0) + 1
+        self.counts[shape] = count
+        if count == self.threshold:
+            self.origins[shape] = sql, origin(sys._getframe(1))
+        return execute(sql, params, many, context)
+
+    def allowed(self, shape, where):
+        return any(
+            fnmatch.fnmatchcase(where, pattern) or fnmatch.fnmatchcase(shape, pattern)
+            for pattern in self.allowlist
+        )
+
+    def repeats(self):
+        """Return the queries executed at least `threshold` times."""
+        return [
+            Repeat(shape, sql, self.counts[shape], where)
+            for shape, (sql, where) in self.origins.items()
+            if not self.allowed(shape, where)
+        ]
+
+
+@contextmanager
+def detect(threshold=THRESHOLD, allowlist=ALLOWLIST, using=DEFAULT_DB_ALIAS):
+    """Raise `NPlusOneError` if a query is repeated within the block."""
+    detector = Detector(threshold, allowlist)
+    with execute_wrapper(detector, using):
+        yield detector
+    repeats = detector.repeats()
+    if repeats:
+        raise NPlusOneError(repeats)
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if MODE not in ('raise', 'log'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        detector = Detector()
+        with execute_wrapper(detector):
+            response = self.get_response(request)
+        repeats = detector.repeats()
+        if repeats and MODE == 'raise':
+            raise NPlusOneError(repeats)
+        for repeat in repeats:
+            logger.warning(
+                'N+1 queries in %s %s: %s', request.method, request.path,
+                describe(repeat),
+            )
+        return response
@@ -0,0 +1,232 @@
+"""
+Profiles of single requests, taken on demand in any environment.
+
+A superuser adds ``?profile`` to the URL of any page or API request, and
+gets a profile of it instead of the response: the call tree ranked by
+time, or with ``?profile=collapsed`` the collapsed stacks that
+flamegraph tools read. The share of time spent in SQL, templates and
+serializers is given with both, and the queries are timed exactly.
+
+The profile is taken by sampling the stack of the request's thread every
+``MARCADOR_PROFILE_INTERVAL`` seconds, which costs little compared to
+tracing every call. Still, only the fraction
+``MARCADOR_PROFILE_SAMPLE_RATE`` of the requests asking for a profile
+is profiled, and only one at a time per process; the others get their
+usual response with an ``X-Profile: skipped`` header. API clients
+sending credentials instead of a session are authenticated up front by
+the API's authentication classes, and only profiled as superusers.
+"""
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .queries import execute_wrapper
+
+__all__ = ('Sampler', 'is_superuser', 'ProfilingMiddleware')
+
+PARAMETER = getattr(settings, 'MARCADOR_PROFILE_PARAMETER', 'profile')
+SAMPLE_RATE = getattr(settings, 'MARCADOR_PROFILE_SAMPLE_RATE', 0.1)
+INTERVAL = getattr(settings, 'MARCADOR_PROFILE_INTERVAL', 0.001)
+
+# the innermost frame of one of these modules decides the category
+CATEGORIES = [
+    ('sql', ('django.db.backends', 'marcador.queries')),
+    ('template', ('django.template',)),
+    ('serializer', ('rest_framework.serializers', 'rest_framework.fields',
+                    'rest_framework.relations')),
+]
+
+_profiling = threading.Lock()
+
+
+def _label(frame):
+    code = frame.f_code
+    name = code.co_name
+    if code.co_argcount and code.co_varnames[0] in ('self', 'cls'):
+        owner = frame.f_locals.get(code.co_varnames[0])
+        owner = owner if isinstance(owner, type) else type(owner)
+        name = f'{owner.__name__}.{name}'
+    return f'{frame.f_globals.get("__name__", "?")}.{name}'
+
+
+def _category(frames):
+    for frame in reversed(frames):
+        module = frame.f_globals.get('__name__', '')
+        for category, prefixes in CATEGORIES:
+            if module.startswith(prefixes):
+                return category
+    return 'other'
+
+
+class Sampler:
+    """
+    Sample the stack of the thread `ident` below the frame `root` until
+    stopped, counting the collapsed stacks and their categories.
+    """
+
+    def __init__(self, ident, root=None, interval=INTERVAL):
+        self.ident = ident
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.ident)
+        frames = []
+        while frame is not None and frame is not self.root:
+            frames.append(frame)
+            frame = frame.f_back
+        if not frames:
+            return
+        frames.reverse()
+        self.stacks[';'.join(_label(frame) for frame in frames)] += 1
+        self.categories[_category(frames)] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """The stacks in the collapsed format, one per line."""
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.most_common()
+        )
+
+    def tree(self, min_share=0.01):
+        """
+        The call tree, children ranked by their samples, leaving out
+        calls with less than `min_share` of all samples.
+        """
+        root = {}
+        own = Counter()
+        for stack, count in self.stacks.items():
+            node = root
+            labels = stack.split(';')
+            own[labels[-1]] += count
+            for label in labels:
+                entry = node.setdefault(label, [0, {}])
+                entry[0] += count
+                node = entry[1]
+
+        total = self.samples or 1
+        lines = []
+
+        def walk(node, depth):
+            for label, (count, children) in sorted(
+                    node.items(), key=lambda item: -item[1][0]):
+                if count / total < min_share:
+                    continue
+                lines.append(
+                    f'{count / total:6.1%} {count:6d}  {"  " * depth}{label}\n'
+                )
+                walk(children, depth + 1)
+
+        walk(root, 0)
+        lines.append('\nSelf time\n')
+        for label, count in own.most_common(25):
+            lines.append(f'{count / total:6.1%} {count:6d}  {label}\n')
+        return ''.join(lines)
+
+
+class QueryTimer:
+    """An execute wrapper adding up the number and time of queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def report(request, response, sampler, queries, output):
+    total = sampler.samples or 1
+    lines = [
+        f'# {request.method} {request.get_full_path()} -> {response.status_code}\n',
+        f'# {sampler.duration * 1000:.1f} ms, {sampler.samples} samples '
+        f'every {sampler.interval * 1000:g} ms\n',
+        f'# {queries.count} queries in {queries.duration * 1000:.1f} ms\n',
+    ]
+    for category in [name for name, _ in CATEGORIES] + ['other']:
+        count = sampler.categories[category]
+        lines.append(f'# {category}: {count / total:.1%} of samples\n')
+    lines.append('\n')
+    lines.append(sampler.collapsed() if output == 'collapsed' else sampler.tree())
+    return HttpResponse(''.join(lines), content_type='text/plain; charset=utf-8')
+
+
+def is_superuser(request):
+    """
+    Whether the session or the API credentials of `request` belong to a
+    superuser.
+    """
+    if request.user.is_superuser:
+        return True
+    if 'HTTP_AUTHORIZATION' not in request.META:
+        return False
+    # authenticate without setting the user, the view does so again
+    api_request = Request(request)
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(api_request)
+        except APIException:
+            return False
+        if result is not None:
+            return result[0].is_superuser
+    return False
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PARAMETER not in request.GET:
+            return self.get_response(request)
+        if not is_superuser(request):
+            return self.get_response(request)
+        if random.random() >= SAMPLE_RATE or not _profiling.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile'] = 'skipped'
+            return response
+        try:
+            sampler = Sampler(threading.get_ident(), sys._getframe())
+            queries = QueryTimer()
+            with execute_wrapper(queries):
+                sampler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    sampler.stop()
+        finally:
+            _profiling.release()
+        return report(request, response, sampler, queries, request.GET[PARAMETER])
@@ -0,0 +1,91 @@
+"""
+Instrumentation of the SQL that Django executes.
+
+`execute_wrapper` installs a function around every query of a
+connection, like ``connection.execute_wrapper()`` of later Django
+versions: it is called as ``wrapper(execute, sql, params, many,
+context)`` and has to call ``execute(sql, params, many, context)``.
+
+`fingerprint` reduces a query to its shape, so that queries differing
+only in their parameters can be counted together.
+"""
+import re
+from contextlib import contextmanager
+from functools import lru_cache, partial
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+
+__all__ = ('execute_wrapper', 'fingerprint')
+
+
+class _Hooked:
+    def execute(self, sql, params=None):
+        return self._execute_with_wrappers(
+            sql, params, False, super(_Hooked, self).execute
+        )
+
+    def executemany(self, sql, param_list):
+        return self._execute_with_wrappers(
+            sql, param_list, True, super(_Hooked, self).executemany
+        )
+
+    def _execute_with_wrappers(self, sql, params, many, method):
+        def execute(sql, params, many, context):
+            return method(sql, params)
+
+        for wrapper in reversed(self.db.execute_wrappers):
+            execute = partial(wrapper, execute)
+        return execute(sql, params, many, {'connection': self.db, 'cursor': self})
+
+
+class HookedCursorWrapper(_Hooked, CursorWrapper):
+    pass
+
+
+class HookedCursorDebugWrapper(_Hooked, CursorDebugWrapper):
+    pass
+
+
+def _install(connection):
+    if hasattr(connection, 'execute_wrappers'):
+        return
+    connection.execute_wrappers = []
+    connection.make_cursor = lambda cursor: HookedCursorWrapper(cursor, connection)
+    connection.make_debug_cursor = (
+        lambda cursor: HookedCursorDebugWrapper(cursor, connection)
+    )
+
+
+@contextmanager
+def execute_wrapper(wrapper, using=DEFAULT_DB_ALIAS):
+    """
+    Call `wrapper` around the queries of the connection `using` in the
+    current thread, for cursors created within the block.
+    """
+    connection = connections[using]
+    _install(connection)
+    connection.execute_wrappers.append(wrapper)
+    try:
+        yield
+    finally:
+        connection.execute_wrappers.remove(wrapper)
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """
+    Return the shape of `sql`: literals and placeholders become ``?``
+    and ``IN`` lists of them ``IN (...)``, whatever their length.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
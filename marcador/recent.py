@@ -0,0 +1,143 @@
+"""
+An in-process buffer of the latest public bookmarks.
+
+The first page of public bookmarks is the same for every visitor and
+by far the most requested content. The buffer keeps the latest public
+bookmarks with their owners and tags resolved, so that this page is
+served without touching the database.
+
+Changes of single bookmarks, tags and users are applied to the buffer
+once committed: the bookmarks changed are reloaded into it or dropped
+from it, and the number of public bookmarks is adjusted. Every change
+bumps the version key ``recent``, and the buffer is reloaded as a whole
+whenever that has been bumped by any other process, or by bulk changes.
+"""
+import threading
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from . import caching
+from .models import Bookmark
+
+__all__ = ('RecentBookmarks', 'recent_bookmarks', 'is_first_page')
+
+VERSION_KEY = 'recent'
+
+
+def is_first_page(params, page_param='page', ignore=('format',)):
+    """Whether the query `params` ask for the unfiltered first page."""
+    for key, values in params.lists():
+        if key == page_param:
+            if values != ['1']:
+                return False
+        elif key not in ignore and any(values):
+            return False
+    return True
+
+
+class RecentBookmarksPaginator(Paginator):
+    """A paginator over the buffer, knowing the total number of rows."""
+
+    def __init__(self, bookmarks, per_page, count):
+        super(RecentBookmarksPaginator, self).__init__(bookmarks, per_page)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
+
+    def _get_page(self, object_list, number, paginator):
+        return Page(list(object_list), number, paginator)
+
+
+class RecentBookmarks:
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        # (version, bookmarks, count), replaced as a whole
+        self._state = (None, (), 0)
+
+    def snapshot(self):
+        """Return the buffered bookmarks and the number of public ones."""
+        current = caching.version(VERSION_KEY)
+        state = self._state
+        if state[0] != current:
+            with self._lock:
+                state = self._state
+                if state[0] != current:
+                    state = self._state = self._load(current)
+        return state[1], state[2]
+
+    def _load(self, version):
+        bookmarks = tuple(Bookmark.public.with_related()[:self.size])
+        return version, bookmarks, Bookmark.public.count()
+
+    def can_serve(self, per_page):
+        return 0 < per_page <= self.size
+
+    def paginator(self, per_page):
+        bookmarks, count = self.snapshot()
+        return RecentBookmarksPaginator(bookmarks, per_page, count)
+
+    def first_page(self, per_page):
+        return self.paginator(per_page).page(1)
+
+    def invalidate(self):
+        caching.bump(VERSION_KEY)
+
+    def update(self, pks, delta=0):
+        """
+        Once committed, reload the bookmarks `pks` into the buffer, or drop
+        them if they are not public, and add `delta` to the number of
+        public bookmarks.
+        """
+        pks = set(pks)
+        transaction.on_commit(lambda: self._apply(lambda bookmarks: pks, delta))
+
+    def remove(self, pk):
+        """Once committed, drop the deleted public bookmark `pk`."""
+        transaction.on_commit(
+            lambda: self._apply(lambda bookmarks: {pk}, -1, load=False)
+        )
+
+    def refresh(self, test):
+        """
+        Once committed, reload the buffered bookmarks for which `test`
+        holds; whether they are public must not have changed.
+        """
+        def select(bookmarks):
+            return {bookmark.pk for bookmark in bookmarks if test(bookmark)}
+
+        transaction.on_commit(lambda: self._apply(select))
+
+    def _apply(self, select, delta=0, load=True):
+        with self._lock:
+            version, bookmarks, count = self._state
+            fresh = version == caching.version(VERSION_KEY)
+            pks = select(bookmarks)
+            if fresh and not pks and not delta:
+                return
+            bumped = caching.bump(VERSION_KEY)[VERSION_KEY]
+            # unless nothing else changed since the buffer was loaded, it
+            # is reloaded on demand
+            if not fresh or bumped != version + 1:
+                return
+            changed = [
+                bookmark for bookmark in bookmarks if bookmark.pk not in pks
+            ]
+            if load:
+                changed += Bookmark.public.with_related().filter(pk__in=pks)
+            changed.sort(key=lambda bookmark: bookmark.date_created, reverse=True)
+            count += delta
+            # the bookmarks following the buffered ones are not known
+            if len(changed) < min(self.size, count):
+                return
+            self._state = (bumped, tuple(changed[:self.size]), count)
+
+
+recent_bookmarks = RecentBookmarks(
+    getattr(settings, 'MARCADOR_RECENT_BOOKMARKS', 100)
+)
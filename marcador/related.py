@@ -0,0 +1,172 @@
+"""
+Related bookmarks, found by the tags bookmarks have in common.
+
+Bookmarks and tags form a sparse matrix, which is held as NumPy arrays
+in both row (bookmark -> tags) and column (tag -> bookmarks) order. Tags
+are weighted by their inverse document frequency, so sharing a rare tag
+counts for more than sharing a common one, and bookmarks are compared
+by the cosine of their weighted tag vectors.
+
+Neighbours are only scored for bookmarks that share at least one tag,
+by walking the columns of the query's tags. Tags on more than `max_df`
+bookmarks are skipped, as they would add huge, nearly weightless
+columns. The best `top_k` neighbours of every bookmark are stored as
+`RelatedBookmark` rows.
+"""
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .models import Bookmark, RelatedBookmark
+
+__all__ = ('TagMatrix', 'update_related')
+
+TOP_K = getattr(settings, 'MARCADOR_RELATED_BOOKMARKS', 20)
+MAX_DF = getattr(settings, 'MARCADOR_RELATED_MAX_DF', 1000)
+
+Tagging = Bookmark.tags.through
+
+
+def _ranges(starts, ends):
+    """Concatenate ``arange(start, end)`` for all pairs, vectorized."""
+    lengths = ends - starts
+    offsets = starts - np.cumsum(lengths) + lengths
+    return np.repeat(offsets, lengths) + np.arange(lengths.sum())
+
+
+def _compress(index, size):
+    """Return the order and the row pointers of a CSR layout of `index`."""
+    order = np.argsort(index, kind='stable')
+    pointers = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(index, minlength=size), out=pointers[1:])
+    return order, pointers
+
+
+class TagMatrix:
+    """The IDF-weighted bookmark x tag matrix."""
+
+    def __init__(self, bookmarks, tags, max_df=MAX_DF):
+        self.bookmark_ids, rows = np.unique(bookmarks, return_inverse=True)
+        self.tag_ids, columns = np.unique(tags, return_inverse=True)
+        self.max_df = max_df
+        size = len(self.bookmark_ids)
+
+        df = np.bincount(columns, minlength=len(self.tag_ids))
+        idf = np.log((1 + size) / (1 + df)) + 1
+        self.weights = np.where(df <= max_df, idf, 0.0) ** 2
+
+        order, self.row_pointers = _compress(rows, size)
+        self.row_tags = columns[order]
+        order, self.column_pointers = _compress(columns, len(self.tag_ids))
+        self.column_rows = rows[order]
+        self.norms = np.sqrt(np.bincount(
+            rows, weights=self.weights[columns], minlength=size
+        ))
+
+    @classmethod
+    def load(cls, **kwargs):
+        pairs = Tagging.objects.order_by().values_list('bookmark_id', 'tag_id')
+        flat = np.fromiter(
+            itertools.chain.from_iterable(pairs.iterator()), dtype=np.int64
+        ).reshape(-1, 2)
+        return cls(flat[:, 0], flat[:, 1], **kwargs)
+
+    def rows(self, pks):
+        """Return the row of every bookmark in `pks`, or -1 if untagged."""
+        pks = np.asarray(pks, dtype=np.int64)
+        if not len(self.bookmark_ids):
+            return np.full(len(pks), -1)
+        rows = np.searchsorted(self.bookmark_ids, pks)
+        rows = rows.clip(max=len(self.bookmark_ids) - 1)
+        return np.where(self.bookmark_ids[rows] == pks, rows, -1)
+
+    def neighbours(self, rows, top_k=TOP_K):
+        """
+        Return the best `top_k` neighbours of the bookmarks at `rows`.
+
+        The result are three arrays: the index into `rows`, the row of
+        the neighbour and its score, best first for every query.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        # the (query, tag) pairs, skipping tags that are too common
+        tag_index = _ranges(self.row_pointers[rows], self.row_pointers[rows + 1])
+        queries = np.repeat(
+            np.arange(len(rows)),
+            self.row_pointers[rows + 1] - self.row_pointers[rows]
+        )
+        tags = self.row_tags[tag_index]
+        weighted = self.weights[tags] > 0
+        queries, tags = queries[weighted], tags[weighted]
+
+        # every bookmark sharing one of these tags, once per shared tag
+        starts, ends = self.column_pointers[tags], self.column_pointers[tags + 1]
+        candidates = self.column_rows[_ranges(starts, ends)]
+        queries = np.repeat(queries, ends - starts)
+        weights = np.repeat(self.weights[tags], ends - starts)
+
+        keys, inverse = np.unique(
+            queries * len(self.bookmark_ids) + candidates, return_inverse=True
+        )
+        dots = np.bincount(inverse, weights=weights)
+        queries, candidates = np.divmod(keys, len(self.bookmark_ids))
+        other = candidates != rows[queries]
+        queries, candidates, dots = queries[other], candidates[other], dots[other]
+        scores = dots / (self.norms[rows][queries] * self.norms[candidates])
+
+        order = np.lexsort((candidates, -scores, queries))
+        queries, candidates, scores = (
+            queries[order], candidates[order], scores[order]
+        )
+        first = np.searchsorted(queries, queries)
+        best = np.arange(len(queries)) - first < top_k
+        return queries[best], candidates[best], scores[best]
+
+
+def update_related(full=False, batch_size=1000, top_k=TOP_K, matrix=None):
+    """
+    Store the related bookmarks of all bookmarks changed since they were
+    last updated, or of all bookmarks if `full`. Bookmarks whose tags
+    are changed without saving them, by merging or deleting tags or
+    through the tags' side of the relation, are marked by clearing
+    `related_updated`.
+
+    Other bookmarks keep their neighbours, so a changed bookmark only
+    shows up as their neighbour after the next full update. Returns the
+    number of bookmarks that were updated.
+    """
+    started = now()
+    matrix = matrix or TagMatrix.load()
+    due = Bookmark.objects.all()
+    if not full:
+        due = due.filter(
+            Q(related_updated__isnull=True) |
+            Q(related_updated__lt=F('date_updated'))
+        )
+    pks = np.fromiter(
+        due.order_by('pk').values_list('pk', flat=True).iterator(),
+        dtype=np.int64
+    )
+
+    for offset in range(0, len(pks), batch_size):
+        batch = pks[offset:offset + batch_size]
+        rows = matrix.rows(batch)
+        tagged = rows >= 0
+        queries, neighbours, scores = matrix.neighbours(rows[tagged], top_k)
+        bookmark_ids = batch[tagged][queries]
+        related_ids = matrix.bookmark_ids[neighbours]
+        batch = [int(pk) for pk in batch]
+        with transaction.atomic():
+            RelatedBookmark.objects.filter(bookmark__in=batch).delete()
+            RelatedBookmark.objects.bulk_create([
+                RelatedBookmark(
+                    bookmark_id=int(pk), related_id=int(related),
+                    score=float(score),
+                )
+                for pk, related, score in zip(bookmark_ids, related_ids, scores)
+            ], batch_size=500)
+            Bookmark.objects.filter(pk__in=batch).update(related_updated=started)
+    return len(pks)
@@ -0,0 +1,188 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import Signal, receiver
+
+from . import caching, changes, stats
+from .models import Bookmark, BookmarkChange, Tag
+from .recent import recent_bookmarks
+from .stream import publisher
+
+# Sent after bookmarks were changed by set-based queries, which bypass
+# the model signals. `pks` are the primary keys of the bookmarks,
+# `owners` the ids of their owners and `action` is one of 'update',
+# 'move' to another owner or 'delete'.
+bookmarks_changed = Signal(providing_args=['pks', 'owners', 'action'])
+
+
+def _was_public(instance):
+    loaded = getattr(instance, '_loaded_values', None)
+    return loaded is None or loaded.get('is_public', True)
+
+
+def _changed(instance, attname):
+    loaded = getattr(instance, '_loaded_values', None)
+    return loaded is None or loaded.get(attname) != getattr(instance, attname)
+
+
+def invalidate(owners=(), public=True, history=False):
+    """
+    Bump the version keys of everything showing these bookmarks, and
+    with `history` of the counts of past bookmarks, too.
+    """
+    names = [f'owner:{pk}' for pk in set(owners)]
+    if public:
+        names.append('public')
+    if history:
+        names += ['history'] + [f'history:{name}' for name in names]
+    caching.bump(*names)
+
+
+@receiver(post_save, sender=Bookmark)
+def bookmark_saved(sender, instance, created, **kwargs):
+    owners = [instance.owner_id]
+    moved = not created and _changed(instance, 'owner_id')
+    if moved and getattr(instance, '_loaded_values', None):
+        owners.append(instance._loaded_values['owner_id'])
+    update_stats(instance, created, moved, owners)
+    if created or moved:
+        if moved and len(owners) > 1:
+            changes.record(instance.pk, owners[1], BookmarkChange.DELETED)
+        changes.record(instance.pk, instance.owner_id, BookmarkChange.CREATED)
+    else:
+        changes.record(instance.pk, instance.owner_id, BookmarkChange.UPDATED)
+    if instance.is_public:
+        # publish right away instead of with the next poll
+        transaction.on_commit(publisher.wake)
+    was_public = not created and _was_public(instance)
+    if instance.is_public or was_public:
+        # the count is adjusted, unless the state before is not known
+        if created or 'is_public' in getattr(instance, '_loaded_values', {}):
+            recent_bookmarks.update(
+                [instance.pk], int(instance.is_public) - int(was_public)
+            )
+        else:
+            recent_bookmarks.invalidate()
+    invalidate(
+        owners,
+        public=instance.is_public or was_public,
+        history=moved or (not created and _changed(instance, 'is_public')),
+    )
+
+
+def update_stats(instance, created, moved, owners):
+    public = int(instance.is_public)
+    if created:
+        stats.record(instance.owner_id, 1, public, instance.date_updated)
+    elif moved or not getattr(instance, '_loaded_values', None):
+        stats.refresh(owners)
+    else:
+        stats.record(
+            instance.owner_id, 0, public - int(_was_public(instance)),
+            instance.date_updated,
+        )
+
+
+@receiver(post_delete, sender=Bookmark)
+def bookmark_deleted(sender, instance, **kwargs):
+    stats.record(
+        instance.owner_id, -1, -int(instance.is_public), create=False
+    )
+    stats.refresh_tags([instance.owner_id])
+    changes.record(instance.pk, instance.owner_id, BookmarkChange.DELETED)
+    if instance.is_public:
+        recent_bookmarks.remove(instance.pk)
+    invalidate([instance.owner_id], public=instance.is_public, history=True)
+
+
+@receiver(m2m_changed, sender=Bookmark.tags.through)
+def bookmark_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        stats.refresh_tags([instance.owner_id])
+        changes.record(instance.pk, instance.owner_id, BookmarkChange.UPDATED)
+        if instance.is_public:
+            recent_bookmarks.update([instance.pk])
+        invalidate([instance.owner_id], public=instance.is_public)
+    else:
+        # tags were added to or removed from bookmarks through the tag
+        bookmarks = Bookmark.objects.all()
+        if pk_set is not None:
+            bookmarks = bookmarks.filter(pk__in=pk_set)
+            recent_bookmarks.refresh(lambda bookmark: bookmark.pk in pk_set)
+        else:
+            recent_bookmarks.invalidate()
+        owners = list(bookmarks.values_list('owner_id', flat=True).distinct())
+        stats.refresh_tags(owners)
+        changes.record_many(bookmarks, BookmarkChange.UPDATED)
+        # the bookmarks are not saved, so mark their neighbours stale
+        bookmarks.update(related_updated=None)
+        invalidate(owners)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    # the tagging is gone once the tag is, remember whose tags to count
+    bookmarks = Bookmark.objects.filter(tags=instance)
+    instance._owners = list(
+        bookmarks.values_list('owner_id', flat=True).distinct()
+    )
+    changes.record_many(bookmarks, BookmarkChange.UPDATED)
+    bookmarks.update(related_updated=None)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    stats.refresh_tags(getattr(instance, '_owners', ()))
+    caching.bump('tags')
+    # a deleted tag has lost its pk by the time the buffer is updated
+    pk = instance.pk
+    recent_bookmarks.refresh(
+        lambda bookmark: any(tag.pk == pk for tag in bookmark.tags.all())
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    # logging in only touches `last_login`, and new users have no bookmarks
+    instance._renamed = not raw and instance.pk is not None and (
+        update_fields is None or 'username' in update_fields
+    ) and not User.objects.filter(
+        pk=instance.pk, username=instance.username
+    ).exists()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_renamed', True):
+        owner = instance.pk
+        recent_bookmarks.refresh(lambda bookmark: bookmark.owner_id == owner)
+        invalidate([owner])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate([instance.pk], history=True)
+
+
+@receiver(bookmarks_changed)
+def bookmarks_changed_in_bulk(sender, pks=(), owners=(), action='update',
+                              **kwargs):
+    stats.refresh(owners)
+    transaction.on_commit(publisher.wake)
+    if action == 'update':
+        # deletions are logged before, while the bookmarks still exist,
+        # and moves by the sender
+        pks = list(pks)
+        for offset in range(0, len(pks), 500):
+            changes.record_many(
+                Bookmark.objects.filter(pk__in=pks[offset:offset + 500]),
+                BookmarkChange.UPDATED,
+            )
+    # updates may have flipped the visibility or the owner
+    recent_bookmarks.invalidate()
+    invalidate(owners, history=True)
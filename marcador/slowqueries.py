@@ -0,0 +1,173 @@
+"""
+A log of slow queries, to find out after the fact which SQL made
+requests slow and why.
+
+`SlowQueryMiddleware` times every query of a request and logs those
+taking at least ``MARCADOR_SLOW_QUERY_THRESHOLD`` milliseconds to the
+``marcador.slowqueries`` logger, as one JSON object per line with the
+view or ViewSet action that executed it and the query's fingerprint.
+The first time a fingerprint is logged by a process, the query plan
+(``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` elsewhere) is logged with
+it. The settings send the logger to the rotating file
+``MARCADOR_SLOW_QUERY_LOG``, and only time queries if that is set; the
+``slowqueries`` command ranks the fingerprints found in it by their
+total time.
+"""
+import glob
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.utils import timezone
+
+from .queries import execute_wrapper, fingerprint
+
+__all__ = ('SlowQueryRecorder', 'monitor', 'SlowQueryMiddleware', 'read', 'rank')
+
+logger = logging.getLogger(__name__)
+
+# milliseconds, or None to not time queries at all
+THRESHOLD = getattr(settings, 'MARCADOR_SLOW_QUERY_THRESHOLD', 100)
+
+# fingerprints whose plan this process logged already
+_explained = set()
+_EXPLAINED_MAX = 10000
+
+
+def explain(connection, sql, params, many):
+    """Return the plan of a query, one step per line."""
+    if sql.lstrip()[:6].upper() not in ('SELECT', 'WITH '):
+        # explaining writes is not worth the risk
+        return None
+    if many:
+        params = next(iter(params), None)
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+    finally:
+        cursor.close()
+
+
+class SlowQueryRecorder:
+    """An execute wrapper logging queries slower than `threshold` ms."""
+
+    def __init__(self, view=None, threshold=None):
+        self.view = view
+        self.threshold = THRESHOLD if threshold is None else threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= self.threshold:
+            self.record(sql, params, many, context['connection'], duration)
+        return result
+
+    def record(self, sql, params, many, connection, duration):
+        shape = fingerprint(sql)
+        entry = {
+            'time': timezone.now().isoformat(),
+            'duration': round(duration, 3),
+            'view': self.view,
+            'fingerprint': shape,
+            'database': connection.alias,
+        }
+        if shape not in _explained:
+            if len(_explained) >= _EXPLAINED_MAX:
+                _explained.clear()
+            _explained.add(shape)
+            entry['explain'] = explain(connection, sql, params, many)
+        logger.info(json.dumps(entry))
+
+
+@contextmanager
+def monitor(view, threshold=None, using=DEFAULT_DB_ALIAS):
+    """Log the slow queries of the block as executed by `view`."""
+    recorder = SlowQueryRecorder(view, threshold)
+    with execute_wrapper(recorder, using):
+        yield recorder
+
+
+def view_name(view_func, method):
+    """Name a view function, a class-based view or a ViewSet action."""
+    actions = getattr(view_func, 'actions', None)
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    name = f'{cls.__module__}.{cls.__name__}'
+    if actions and method.lower() in actions:
+        name += '.' + actions[method.lower()]
+    return name
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        if THRESHOLD is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # named after the path until the view is resolved
+        recorder = SlowQueryRecorder(f'{request.method} {request.path}')
+        request._slow_query_recorder = recorder
+        with execute_wrapper(recorder):
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, '_slow_query_recorder', None)
+        if recorder is not None:
+            recorder.view = view_name(view_func, request.method)
+
+
+def _backup_number(name):
+    suffix = name.rpartition('.')[2]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def read(path):
+    """Yield the entries of the log `path` and of its rotated files."""
+    # RotatingFileHandler names the oldest file path.N and the newest path
+    backups = sorted(glob.glob(glob.escape(path) + '.*'), key=_backup_number)
+    for name in backups[::-1] + [path]:
+        try:
+            stream = open(name)
+        except FileNotFoundError:
+            continue
+        with stream:
+            for line in stream:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def rank(entries):
+    """
+    Aggregate log entries per fingerprint: their count, total, mean and
+    maximum duration, the views that executed them and the latest plan.
+    Returns the fingerprints with the highest total first.
+    """
+    ranking = {}
+    for entry in entries:
+        stats = ranking.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'count': 0, 'total': 0.0,
+            'max': 0.0, 'views': {}, 'explain': None,
+        })
+        stats['count'] += 1
+        stats['total'] += entry['duration']
+        stats['max'] = max(stats['max'], entry['duration'])
+        views = stats['views']
+        views[entry.get('view')] = views.get(entry.get('view'), 0) + 1
+        if entry.get('explain'):
+            stats['explain'] = entry['explain']
+    for stats in ranking.values():
+        stats['mean'] = stats['total'] / stats['count']
+    return sorted(ranking.values(), key=lambda stats: stats['total'], reverse=True)
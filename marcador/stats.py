@@ -0,0 +1,117 @@
+"""
+Per-user counters of bookmarks, so that showing or ordering users does
+not count over the whole bookmark table.
+
+The counters are adjusted by the signal handlers in the transaction of
+every bookmark write, and recounted for the owners of bookmarks changed
+by set-based queries. Counters that are missing, e.g. for users who did
+not write since they were introduced, are counted when first read; the
+``rebuildstats`` command recounts all of them.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Bookmark, UserStats
+
+__all__ = ('record', 'refresh', 'refresh_tags', 'rebuild', 'get_stats')
+
+Tagging = Bookmark.tags.through
+
+
+def _count(queryset, owner, aggregate):
+    """A subquery aggregating `queryset` per owner of the outer row."""
+    return Subquery(
+        queryset.filter(**{owner: OuterRef('user')}).order_by()
+        .values(owner).annotate(value=aggregate).values('value')
+    )
+
+
+def _tags():
+    return Coalesce(
+        _count(Tagging.objects.all(), 'bookmark__owner',
+               Count('tag', distinct=True)),
+        Value(0)
+    )
+
+
+def record(owner_id, bookmarks=0, public=0, when=None, create=True):
+    """
+    Add to the counters of a user in the current transaction.
+
+    Missing counters are counted from scratch instead, if `create`.
+    """
+    changes = {
+        'bookmarks': F('bookmarks') + bookmarks,
+        'public_bookmarks': F('public_bookmarks') + public,
+    }
+    if when is not None:
+        changes['last_activity'] = when
+    updated = UserStats.objects.filter(user_id=owner_id).update(**changes)
+    if not updated and create:
+        refresh([owner_id])
+
+
+def _chunks(owners, size=500):
+    owners = sorted(set(owners))
+    for offset in range(0, len(owners), size):
+        yield owners[offset:offset + size]
+
+
+def refresh_tags(owners):
+    """Recount the distinct tags of the users `owners`."""
+    for chunk in _chunks(owners):
+        UserStats.objects.filter(user__in=chunk).update(tags=_tags())
+
+
+def refresh(owners):
+    """Recount all counters of the users `owners`, set-based."""
+    for chunk in _chunks(owners):
+        _refresh(chunk)
+
+
+def _refresh(owners):
+    with transaction.atomic(savepoint=False):
+        existing = set(
+            UserStats.objects.filter(user__in=owners)
+            .values_list('user_id', flat=True)
+        )
+        missing = [owner for owner in owners if owner not in existing]
+        if missing:
+            try:
+                with transaction.atomic():
+                    UserStats.objects.bulk_create(
+                        [UserStats(user_id=owner) for owner in missing]
+                    )
+            except IntegrityError:
+                # created concurrently, the update below counts them anyway
+                pass
+        UserStats.objects.filter(user__in=owners).update(
+            bookmarks=Coalesce(
+                _count(Bookmark.objects.all(), 'owner', Count('pk')), Value(0)
+            ),
+            public_bookmarks=Coalesce(
+                _count(Bookmark.public.all(), 'owner', Count('pk')), Value(0)
+            ),
+            tags=_tags(),
+            last_activity=_count(
+                Bookmark.objects.all(), 'owner', Max('date_updated')
+            ),
+        )
+
+
+def rebuild():
+    """Recount the counters of all users. Returns the number of users."""
+    pks = list(User.objects.values_list('pk', flat=True))
+    refresh(pks)
+    return len(pks)
+
+
+def get_stats(user):
+    """Return the counters of `user`, counting them if missing."""
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        refresh([user.pk])
+        return UserStats.objects.get(user=user)
@@ -0,0 +1,256 @@
+"""
+A stream of newly created or updated public bookmarks, for Server-Sent
+Events.
+
+Every process has one `Publisher`, whose thread reads the change log
+(see `marcador.changes`) once per `INTERVAL` while anyone is
+subscribed, and right away when a bookmark was saved in the process.
+Changed public bookmarks are serialized once and appended to a bounded
+buffer, from which all subscribers of the process are served; reading
+is independent of the number of subscribers.
+
+Events are identified by the sequence number of their change, which is
+the same in every process, so a client reconnecting with
+``Last-Event-ID`` to another process resumes where it left off, as long
+as the change is still buffered.
+
+Subscribers block between events. With thousands of idle connections,
+run the application in a server with green threads, e.g. gunicorn with
+gevent workers, instead of a thread per connection. A process serves at
+most ``MARCADOR_STREAM_MAX_SUBSCRIBERS`` subscribers, and at most
+``MARCADOR_STREAM_MAX_PER_CLIENT`` of them from one client; with a
+thread per connection, keep the former well below the number of
+threads, or the streams hold all of them.
+"""
+import json
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils.timezone import now
+
+from .changes import SETTLE, serialize
+from .models import Bookmark, BookmarkChange
+
+__all__ = ('Event', 'Full', 'Publisher', 'publisher', 'format_event', 'stream')
+
+BUFFER_SIZE = getattr(settings, 'MARCADOR_STREAM_BUFFER', 1000)
+MAX_SUBSCRIBERS = getattr(settings, 'MARCADOR_STREAM_MAX_SUBSCRIBERS', 100)
+MAX_PER_CLIENT = getattr(settings, 'MARCADOR_STREAM_MAX_PER_CLIENT', 5)
+INTERVAL = 1.0
+HEARTBEAT = 15.0
+# the lifetime of a connection, after which the client reconnects
+MAX_AGE = 300.0
+# seconds a client turned away should wait
+RETRY_AFTER = 30
+LIMIT = 1000
+
+Event = namedtuple('Event', 'position id owner tags data')
+
+
+class Full(Exception):
+    """The publisher or a client has as many subscribers as allowed."""
+
+
+class Publisher:
+    """Read changes from the database and fan them out to subscribers."""
+
+    def __init__(self, buffer_size=BUFFER_SIZE, interval=INTERVAL,
+                 threaded=True, max_subscribers=MAX_SUBSCRIBERS,
+                 max_per_client=MAX_PER_CLIENT):
+        self.events = deque(maxlen=buffer_size)
+        self.interval = interval
+        self.threaded = threaded
+        self.max_subscribers = max_subscribers
+        self.max_per_client = max_per_client
+        self.position = 0
+        self.cursor = None
+        self.seen = set()
+        self.subscribers = 0
+        self.clients = Counter()
+        self.condition = threading.Condition()
+        self.polling = threading.Lock()
+        self.woken = threading.Event()
+        self.thread = None
+
+    def subscribe(self, last_event_id=None, client=None):
+        """
+        Register a subscriber and return the position it starts from:
+        after the event `last_event_id`, or at the newest event. Raises
+        `Full` if there are as many subscribers as allowed, in total or
+        of the `client`.
+        """
+        if self.cursor is None:
+            # fill the buffer before anyone waits for new events
+            self.poll()
+        with self.condition:
+            if (self.subscribers >= self.max_subscribers or
+                    client is not None and
+                    self.clients[client] >= self.max_per_client):
+                raise Full
+            self.subscribers += 1
+            if client is not None:
+                self.clients[client] += 1
+            if self.threaded and self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='marcador-stream', daemon=True
+                )
+                self.thread.start()
+            if last_event_id is None:
+                return self.position
+            for event in self.events:
+                if event.id > last_event_id:
+                    return event.position - 1
+            return self.position
+
+    def unsubscribe(self, client=None):
+        with self.condition:
+            self.subscribers -= 1
+            if client is not None:
+                self.clients[client] -= 1
+                if not self.clients[client]:
+                    del self.clients[client]
+
+    def wake(self):
+        self.woken.set()
+
+    def run(self):
+        try:
+            while True:
+                with self.condition:
+                    if not self.subscribers:
+                        self.thread = None
+                        return
+                close_old_connections()
+                self.poll()
+                self.woken.wait(self.interval)
+                self.woken.clear()
+        finally:
+            connection.close()
+
+    def poll(self):
+        """Publish the changes that were not seen yet."""
+        with self.polling:
+            self._poll()
+
+    def _poll(self):
+        changes = BookmarkChange.objects.order_by('pk')
+        if self.cursor is None:
+            # start with the latest changes, so that clients can resume
+            # after a restart
+            latest = changes.reverse()[self.events.maxlen - 1:][:1]
+            self.cursor = latest.values_list('pk', flat=True).first() or 0
+        rows = list(
+            changes.filter(pk__gt=self.cursor)
+            .values_list('pk', 'bookmark_id', 'action', 'date')[:LIMIT]
+        )
+        # one event per bookmark, by its latest change
+        latest = {}
+        for pk, bookmark_id, action, _ in rows:
+            if pk not in self.seen:
+                latest.pop(bookmark_id, None)
+                latest[bookmark_id] = pk, action
+        fresh = [
+            (pk, bookmark_id) for bookmark_id, (pk, action) in latest.items()
+            if action != BookmarkChange.DELETED
+        ]
+        self.seen.update(pk for pk, _, _, _ in rows)
+
+        # changes are only final once older than `SETTLE`
+        settled = now() - SETTLE
+        for pk, _, _, date in rows:
+            if date > settled:
+                break
+            self.cursor = pk
+        self.seen = {pk for pk in self.seen if pk > self.cursor}
+        if fresh:
+            self.publish(fresh)
+
+    def publish(self, changes):
+        bookmarks = {
+            bookmark.pk: bookmark for bookmark in
+            Bookmark.public.with_related().filter(
+                pk__in={bookmark_id for _, bookmark_id in changes}
+            )
+        }
+        data = dict(zip(
+            bookmarks, map(json.dumps, serialize(bookmarks.values()))
+        ))
+        with self.condition:
+            for pk, bookmark_id in changes:
+                bookmark = bookmarks.get(bookmark_id)
+                if bookmark is None:
+                    continue
+                self.position += 1
+                self.events.append(Event(
+                    self.position, pk, bookmark.owner.username,
+                    frozenset(tag.name for tag in bookmark.tags.all()),
+                    data[bookmark_id],
+                ))
+            self.condition.notify_all()
+
+    def wait(self, position, timeout):
+        """
+        Return the events after `position` and the new position, waiting
+        up to `timeout` seconds for one.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.position > position, timeout
+            )
+            # the newest events are at the right, older ones may have
+            # been dropped already
+            count = min(self.position - position, len(self.events))
+            events = list(islice(reversed(self.events), count))
+            events.reverse()
+            return events, self.position
+
+
+def format_event(event):
+    return f'id: {event.id}\nevent: bookmark\ndata: {event.data}\n\n'
+
+
+def stream(publisher, last_event_id=None, tag=None, owner=None,
+           client=None, heartbeat=HEARTBEAT, max_age=MAX_AGE):
+    """
+    Return an iterator over the events of `publisher` as Server-Sent
+    Events, optionally only those of bookmarks tagged `tag` or owned by
+    the user `owner`.
+
+    The subscription is made right away, so that `Full` is raised before
+    anything is sent; closing the iterator ends it.
+    """
+    position = publisher.subscribe(last_event_id, client)
+    events = _stream(publisher, position, tag, owner, client, heartbeat, max_age)
+    # enter the generator, so that closing it unsubscribes
+    next(events)
+    return events
+
+
+def _stream(publisher, position, tag, owner, client, heartbeat, max_age):
+    try:
+        yield
+        yield f'retry: {int(INTERVAL * 1000)}\n\n'
+        deadline = time.monotonic() + max_age
+        while time.monotonic() < deadline:
+            events, position = publisher.wait(
+                position, min(heartbeat, deadline - time.monotonic())
+            )
+            events = [
+                event for event in events
+                if (tag is None or tag in event.tags) and
+                (owner is None or event.owner == owner)
+            ]
+            if events:
+                yield ''.join(format_event(event) for event in events)
+            else:
+                # keeps proxies from closing an idle connection
+                yield ': heartbeat\n\n'
+    finally:
+        publisher.unsubscribe(client)
+
+
+publisher = Publisher()
@@ -0,0 +1,105 @@
+"""
+An in-process cache of tag names and ids.
+
+Filtering by a tag name or posting bookmarks with tag URLs needs the
+tags themselves, one query each. The cache maps names and ids to tags,
+so that known tags are resolved without touching the database, and
+looks up all missing ones of a request in a single query.
+
+The cache holds at most ``MARCADOR_TAG_CACHE_SIZE`` names and as many
+ids, dropping the least recently used. It is cleared whenever the
+version key ``tags`` has been bumped, which every change of a tag does.
+Only a cache shared by all processes carries that to the other ones, so
+entries expire after ``MARCADOR_TAG_CACHE_TIMEOUT`` seconds with a
+shared cache and after ``LOCAL_TIMEOUT`` seconds without one. Tags found
+to be missing are remembered only with a shared cache, lest another
+process keeps rejecting a tag created meanwhile.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import router
+
+from . import caching
+from .models import Tag
+
+__all__ = ('TagCache', 'tag_cache')
+
+VERSION_KEY = 'tags'
+
+TIMEOUT = getattr(settings, 'MARCADOR_TAG_CACHE_TIMEOUT', 300)
+# seconds, for the entries of a process that no invalidation reaches
+LOCAL_TIMEOUT = 5
+
+
+class TagCache:
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._version = None
+        # ((id, name) or None if missing, expiry) of the tags by id and by name
+        self._by_id = OrderedDict()
+        self._by_name = OrderedDict()
+
+    def invalidate(self):
+        """Drop the cached tags of this process."""
+        with self._lock:
+            self._version = None
+
+    def by_id(self, ids):
+        """Return a dict of the existing tags among `ids` by id."""
+        return self._resolve(self._by_id, 'pk', 0, ids)
+
+    def by_name(self, names):
+        """Return a dict of the existing tags among `names` by name."""
+        return self._resolve(self._by_name, 'name', 1, names)
+
+    def _resolve(self, index, field, position, keys):
+        keys = set(keys)
+        # read before the tags are, so that changes meanwhile are noticed
+        current = caching.version(VERSION_KEY)
+        with self._lock:
+            if self._version != current:
+                self._by_id.clear()
+                self._by_name.clear()
+                self._version = current
+            now = time.monotonic()
+            found = {}
+            for key in keys:
+                entry = index.get(key)
+                if entry is not None and entry[1] > now:
+                    found[key] = entry[0]
+                    index.move_to_end(key)
+
+        missing = keys.difference(found)
+        if missing:
+            rows = Tag.objects.filter(**{f'{field}__in': missing}).order_by()
+            loaded = {row[position]: row for row in rows.values_list('pk', 'name')}
+            shared = caching.is_shared()
+            expires = time.monotonic() + (TIMEOUT if shared else LOCAL_TIMEOUT)
+            with self._lock:
+                if self._version == current:
+                    if shared:
+                        for key in missing.difference(loaded):
+                            self._remember(index, key, None, expires)
+                    for row in loaded.values():
+                        self._remember(self._by_id, row[0], row, expires)
+                        self._remember(self._by_name, row[1], row, expires)
+            found.update((key, loaded.get(key)) for key in missing)
+
+        db = router.db_for_read(Tag)
+        return {
+            key: Tag.from_db(db, ['id', 'name'], row)
+            for key, row in found.items() if row is not None
+        }
+
+    def _remember(self, index, key, row, expires):
+        index[key] = (row, expires)
+        index.move_to_end(key)
+        if len(index) > self.size:
+            index.popitem(last=False)
+
+
+tag_cache = TagCache(getattr(settings, 'MARCADOR_TAG_CACHE_SIZE', 10000))
@@ -0,0 +1,45 @@
+"""
+Tasks that can be queued with `marcador.jobs.enqueue`.
+"""
+from . import changes, webhooks
+from .duplicates import update_duplicates
+from .enrichment import enrich_pending
+from .jobs import task
+from .linkcheck import LinkChecker, check_bookmarks
+from .related import update_related
+
+
+@task
+def check_links(limit=1000, **options):
+    """Check the links of up to `limit` bookmarks that are due."""
+    check_bookmarks(limit=limit, checker=LinkChecker(**options))
+
+
+@task
+def enrich_bookmarks(limit=100):
+    """Fetch the metadata of up to `limit` new bookmarks."""
+    enrich_pending(limit=limit)
+
+
+@task
+def update_related_bookmarks(full=False):
+    """Update the related bookmarks of changed, or all, bookmarks."""
+    update_related(full=full)
+
+
+@task
+def find_duplicate_bookmarks():
+    """Find the near-duplicates among the bookmarks of every user."""
+    update_duplicates()
+
+
+@task
+def purge_changes():
+    """Delete the logged changes of bookmarks that have expired."""
+    changes.purge()
+
+
+@task
+def deliver_webhooks(limit=100):
+    """Deliver a batch of events to each of up to `limit` due webhooks."""
+    webhooks.deliver(limit=limit)
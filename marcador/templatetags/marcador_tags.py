@@ -3,6 +3,7 @@ from django.core.urlresolvers import reverse
 from django.db import models
 from django.utils.html import format_html_join
 
+from ..fragments import render_fragments
 from ..models import Tag
 
 
@@ -28,3 +29,17 @@ def tagcloud(context, owner=None):
     tags = tags.order_by('name').values_list('name', 'count')
     fmt = '<a href="%s?tags={0}">{0} ({1})</a>' % url
     return format_html_join(', ', fmt, tags)
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, number):
+    """Return the current query string with the page set to `number`."""
+    query = context['request'].GET.copy()
+    query['page'] = number
+    return '?' + query.urlencode()
+
+
+@register.simple_tag
+def bookmark_fragments(bookmarks):
+    """Pair every bookmark with its cached, viewer-independent HTML."""
+    return render_fragments(bookmarks)
@@ -1,4 +1,22 @@
+from .activity import ActivityTestCase
+from .admin import BookmarkAdminTestCase
+from .bulk import BulkTestCase
+from .caching import FragmentCacheTestCase, ResponseCacheTestCase
+from .changes import ChangeFeedTestCase
+from .duplicates import FindDuplicatesTestCase, UpdateDuplicatesTestCase
+from .enrichment import EnrichmentTestCase, ParseMetadataTestCase
+from .jobs import JobQueueTestCase
+from .linkcheck import LinkCheckTestCase
 from .models import TagTestCase, BookmarkTestCase
+from .nplusone import NPlusOneTestCase
+from .profiling import ProfilingTestCase
+from .related import TagMatrixTestCase, UpdateRelatedTestCase
+from .slowqueries import SlowQueryLogTestCase
+from .stats import UserStatsTestCase
+from .stream import StreamTestCase
+from .tagcache import TagCacheTestCase
+from .webhooks import WebhookTestCase
+from .recent import RecentBookmarksTestCase
 from .views import (
     BookmarkListTestCase,
     UserBookmarkListTestCase,
@@ -0,0 +1,84 @@
+from datetime import date, datetime
+from unittest import mock
+
+import pytz
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..activity import count_buckets, histogram
+from ..models import Bookmark
+
+BERLIN = pytz.timezone('Europe/Berlin')
+
+
+class ActivityTestCase(TestCase):
+    fixtures = ['user']
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.get(pk=2)
+        for when in ['2026-01-04 23:30', '2026-01-05 08:00',
+                     '2026-01-31 12:00', '2026-02-02 12:00']:
+            self.create(when)
+
+    def create(self, when):
+        bookmark = Bookmark.objects.create(
+            bookmark_url='http://example.com/', owner=self.owner
+        )
+        moment = pytz.utc.localize(datetime.strptime(when, '%Y-%m-%d %H:%M'))
+        Bookmark.objects.filter(pk=bookmark.pk).update(date_created=moment)
+        return bookmark
+
+    def test_count_buckets(self):
+        """
+        Bookmarks should be counted in the buckets of the time zone.
+        """
+        bookmarks = Bookmark.objects.all()
+        self.assertEqual(count_buckets(bookmarks, 'day', pytz.utc), {
+            date(2026, 1, 4): 1, date(2026, 1, 5): 1,
+            date(2026, 1, 31): 1, date(2026, 2, 2): 1,
+        })
+        self.assertEqual(count_buckets(bookmarks, 'day', BERLIN), {
+            date(2026, 1, 5): 2, date(2026, 1, 31): 1, date(2026, 2, 2): 1,
+        })
+        self.assertEqual(count_buckets(bookmarks, 'week', pytz.utc), {
+            date(2025, 12, 29): 1, date(2026, 1, 5): 1,
+            date(2026, 1, 26): 1, date(2026, 2, 2): 1,
+        })
+        self.assertEqual(count_buckets(bookmarks, 'month', BERLIN), {
+            date(2026, 1, 1): 3, date(2026, 2, 1): 1,
+        })
+        self.assertEqual(
+            count_buckets(bookmarks, 'month', BERLIN, since=date(2026, 2, 1)),
+            {date(2026, 2, 1): 1}
+        )
+
+    @mock.patch('django.utils.timezone.now')
+    def test_closed_buckets_are_cached(self, now):
+        """
+        Only the current bucket should be counted again, until past
+        bookmarks are deleted.
+        """
+        now.return_value = pytz.utc.localize(datetime(2026, 2, 3, 12))
+        bookmarks = Bookmark.objects.filter(owner=self.owner)
+        dependencies = [f'history:owner:{self.owner.pk}']
+        expected = [(date(2026, 1, 1), 3), (date(2026, 2, 1), 1)]
+        self.assertEqual(
+            histogram(bookmarks, 'month', pytz.utc, dependencies), expected
+        )
+
+        Bookmark.objects.filter(date_created__month=1).update(
+            date_created=pytz.utc.localize(datetime(2025, 6, 1))
+        )
+        self.create('2026-02-03 09:00')
+        expected = [(date(2026, 1, 1), 3), (date(2026, 2, 1), 2)]
+        self.assertEqual(
+            histogram(bookmarks, 'month', pytz.utc, dependencies), expected
+        )
+
+        Bookmark.objects.filter(date_created__month=2).first().delete()
+        self.assertEqual(
+            histogram(bookmarks, 'month', pytz.utc, dependencies),
+            [(date(2025, 6, 1), 3), (date(2026, 2, 1), 1)]
+        )
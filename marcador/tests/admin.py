@@ -0,0 +1,119 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from ..admin import BookmarkAdmin, EstimatedCountPaginator, prefix_filter
+from ..models import Bookmark, Tag
+from ..slowqueries import explain
+
+
+class BookmarkAdminTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+    url = '/admin/marcador/bookmark/'
+
+    def setUp(self):
+        User.objects.filter(username='superuser').update(is_staff=True)
+        self.client.force_login(user=User.objects.get(username='superuser'))
+
+    def test_changelist(self):
+        """
+        The changelist should load owners along with the bookmarks.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="owner-filter"')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_owner_filter(self):
+        response = self.client.get(self.url, {'owner': 'dummy'})
+        self.assertEqual(
+            {bookmark.owner.username for bookmark in response.context['cl'].result_list},
+            {'dummy'},
+        )
+        self.assertContains(response, 'value="dummy"')
+
+    def test_owner_autocomplete(self):
+        response = self.client.get(self.url + 'owner-autocomplete/', {'term': 'd'})
+        self.assertEqual(response.json(), {'results': ['dummy']})
+
+    def test_owner_autocomplete_requires_staff(self):
+        self.client.force_login(user=User.objects.get(username='dummy'))
+        response = self.client.get(self.url + 'owner-autocomplete/', {'term': 'd'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_prefix_search(self):
+        response = self.client.get(self.url, {'q': 'Django'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(self.url, {'q': 'REST'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+        response = self.client.get(self.url, {'q': 'http://www.netflix'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+        with mock.patch.object(BookmarkAdmin, 'substring_search', True):
+            response = self.client.get(self.url, {'q': 'REST'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads an SQLite query plan')
+    def test_prefix_search_uses_index(self):
+        for field, term in [('title', 'Django'), ('bookmark_url', 'http://')]:
+            queryset = Bookmark.objects.filter(**prefix_filter(field, term))
+            sql, params = queryset.query.sql_with_params()
+            self.assertRegex(
+                explain(connection, sql, params, False),
+                rf'SEARCH .* USING INDEX .*\({field}>\? AND {field}<\?\)'
+            )
+
+    def test_prefix_search_before_surrogates(self):
+        lookups = prefix_filter('title', 'a\ud7ff')
+        self.assertEqual(lookups['title__lt'], 'a\ue000')
+        response = self.client.get(self.url, {'q': '\ud7ff'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_count_is_capped(self):
+        """
+        Past `max_count`, the size of the table should be taken, so that
+        the later pages can still be reached.
+        """
+        Bookmark.objects.filter(pk=2).delete()
+        paginator = EstimatedCountPaginator(Bookmark.objects.filter(pk__gt=1), 1)
+        paginator.max_count = 5
+        self.assertEqual(paginator.count, 2)
+
+        paginator = EstimatedCountPaginator(Bookmark.objects.filter(pk__gt=1), 1)
+        paginator.max_count = 1
+        with mock.patch('marcador.admin.estimated_count', return_value=None):
+            self.assertEqual(paginator.count, 4)
+        self.assertEqual(len(paginator.page(4).object_list), 0)
+
+        paginator = EstimatedCountPaginator(Bookmark.objects.all(), 1)
+        paginator.max_count = 1
+        with mock.patch('marcador.admin.estimated_count', return_value=None):
+            self.assertEqual(paginator.count, 4)
+
+    def test_bulk_actions(self):
+        """
+        Actions that need input should ask for it before changing anything.
+        """
+        data = {'action': 'add_tag', '_selected_action': [1, 2], 'index': 0}
+        response = self.client.post(self.url, data)
+        self.assertContains(response, 'name="tag"')
+        self.assertFalse(Tag.objects.filter(name='spam').exists())
+
+        data = {'action': 'add_tag', '_selected_action': [1, 2],
+                'apply': 1, 'tag': 'spam'}
+        response = self.client.post(self.url, data)
+        self.assertRedirects(response, self.url)
+        self.assertEqual(Tag.objects.get(name='spam').bookmark_set.count(), 2)
+
+        data = {'action': 'make_private', '_selected_action': [1],
+                'select_across': 1, 'index': 0}
+        self.client.post(self.url, data)
+        self.assertFalse(Bookmark.objects.filter(is_public=True).exists())
+
+        data = {'action': 'delete_selected', '_selected_action': [1],
+                'select_across': 1, 'apply': 1}
+        self.client.post(self.url + '?owner=dummy', data)
+        self.assertEqual(Bookmark.objects.count(), 2)
@@ -0,0 +1,121 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import bulk
+from ..models import Bookmark, BookmarkChange, Tag
+from ..signals import bookmarks_changed
+
+
+class BulkTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+    # the counters of the owners are recounted with two queries, the
+    # changes are logged with one
+    derived_queries = 3
+
+    def setUp(self):
+        self.receiver = mock.Mock()
+        bookmarks_changed.connect(self.receiver)
+        self.addCleanup(bookmarks_changed.disconnect, self.receiver)
+
+    def assertChanged(self, pks, owners, action='update'):
+        self.receiver.assert_called_once_with(
+            signal=bookmarks_changed, sender=Bookmark,
+            pks=mock.ANY, owners=owners, action=action,
+        )
+        self.assertEqual(sorted(self.receiver.call_args[1]['pks']), pks)
+
+    def test_set_public(self):
+        with self.assertNumQueries(4 + self.derived_queries):
+            count = bulk.set_public(Bookmark.objects.all(), True)
+        self.assertEqual(count, 2)
+        self.assertFalse(Bookmark.objects.filter(is_public=False).exists())
+        self.assertChanged([2, 4], {1, 2})
+
+    def test_add_tag(self):
+        tag = Tag.objects.get(name='testtag')
+        with self.assertNumQueries(5 + self.derived_queries):
+            count = bulk.add_tags(Bookmark.objects.all(), [tag])
+        self.assertEqual(count, 2)
+        self.assertEqual(tag.bookmark_set.count(), 4)
+        self.assertChanged([2, 3], {2, 3})
+
+    def test_add_tags(self):
+        tags = list(Tag.objects.filter(name__in=['testtag', 'dummytag']))
+        count = bulk.add_tags(Bookmark.objects.filter(pk__in=[1, 2]), tags)
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            Bookmark.tags.through.objects.filter(bookmark__in=[1, 2]).count(), 4
+        )
+        self.assertChanged([1, 2], {2})
+
+    def test_remove_tag(self):
+        tag = Tag.objects.get(name='testtag')
+        count = bulk.remove_tags(Bookmark.objects.filter(owner__pk=2), [tag])
+        self.assertEqual(count, 1)
+        self.assertEqual([bookmark.pk for bookmark in tag.bookmark_set.all()], [4])
+        self.assertChanged([1], {2})
+
+    def test_reassign(self):
+        owner = User.objects.get(username='test')
+        logged = BookmarkChange.objects.order_by('-pk').values_list('pk')[0][0]
+        count = bulk.reassign(Bookmark.objects.all(), owner)
+        self.assertEqual(count, 3)
+        self.assertEqual(owner.bookmarks.count(), 4)
+        self.assertChanged([1, 2, 4], {1, 2, 3}, action='move')
+        self.assertEqual(
+            list(BookmarkChange.objects.filter(bookmark_id=1, pk__gt=logged)
+                 .order_by('pk').values_list('owner_id', 'action')),
+            [(2, BookmarkChange.DELETED), (3, BookmarkChange.CREATED)],
+        )
+
+    def test_delete(self):
+        relations = len(bulk._referring_relations(Bookmark))
+        with self.assertNumQueries(4 + relations + self.derived_queries):
+            count = bulk.delete(Bookmark.objects.filter(owner__pk=2))
+        self.assertEqual(count, 2)
+        self.assertEqual(Bookmark.objects.count(), 2)
+        self.assertFalse(
+            Bookmark.tags.through.objects.filter(bookmark__in=[1, 2]).exists()
+        )
+        self.assertChanged([1, 2], {2}, action='delete')
+
+    def test_delete_tags(self):
+        count = bulk.delete_tags(Tag.objects.filter(name='testtag'))
+        self.assertEqual(count, 1)
+        self.assertFalse(Tag.objects.filter(name='testtag').exists())
+        self.assertEqual(Bookmark.objects.count(), 4)
+        self.assertChanged([1, 4], {1, 2})
+
+    def test_merge_tags(self):
+        """
+        Bookmarks should keep a single tag after merging tags they have
+        both of.
+        """
+        target = Tag.objects.get(name='exampletag')
+        sources = Tag.objects.filter(name__in=['testtag', 'dummytag'])
+        count = bulk.merge_tags(sources, target)
+        self.assertEqual(count, 4)
+        self.assertEqual(list(Tag.objects.all()), [target])
+        self.assertEqual(
+            sorted(Bookmark.tags.through.objects.values_list('bookmark_id', flat=True)),
+            [1, 2, 3, 4]
+        )
+        self.assertChanged([1, 2, 3, 4], {1, 2, 3})
+
+    def test_mergetags_command(self):
+        out = StringIO()
+        call_command('mergetags', 'python', 'testtag', 'dummytag', stdout=out)
+        self.assertIn('retagging 2 bookmarks', out.getvalue())
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['exampletag', 'python']
+        )
+        self.assertEqual(Tag.objects.get(name='python').bookmark_set.count(), 4)
+
+    def test_empty_selection(self):
+        self.assertEqual(bulk.delete(Bookmark.objects.none()), 0)
+        self.receiver.assert_not_called()
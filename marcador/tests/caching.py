@@ -0,0 +1,176 @@
+import re
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase
+
+from .. import caching
+from ..fragments import render_fragments
+from ..models import Bookmark, Tag
+from ..recent import recent_bookmarks
+
+
+TOKEN = re.compile(rb"name='csrfmiddlewaretoken' value='([^']+)'")
+
+
+def without_token(content):
+    """Responses differ in the CSRF token of each visitor only."""
+    return TOKEN.sub(b'', content)
+
+
+class ResponseCacheTestCase(TransactionTestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def setUp(self):
+        # the fixtures are restored by rolling back, which bypasses
+        # the signals; start from an empty cache
+        cache.clear()
+        recent_bookmarks.invalidate()
+
+    def test_anonymous_responses_are_cached(self):
+        """
+        Repeated anonymous requests should not hit the database.
+        """
+        first = self.client.get('/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(without_token(first.content), without_token(second.content))
+
+        self.client.get('/user/dummy/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/user/dummy/')
+        self.assertContains(response, 'Example')
+
+    def test_visitors_of_cached_pages_can_log_in(self):
+        """
+        Every visitor should get an own CSRF token and cookie, also from
+        a cached page, so that the login form works.
+        """
+        User.objects.create_user('visitor', password='visitorpass')
+        tokens = []
+        for _ in range(2):
+            client = Client(enforce_csrf_checks=True)
+            response = client.get('/')
+            self.assertIn('csrftoken', response.cookies)
+            token = TOKEN.search(response.content).group(1).decode()
+            self.assertNotEqual(token, 'csrf-token-placeholder')
+            tokens.append(token)
+            response = client.post('/login/', {
+                'username': 'visitor', 'password': 'visitorpass',
+                'csrfmiddlewaretoken': token,
+            })
+            self.assertEqual(response.status_code, 302)
+        self.assertNotEqual(tokens[0], tokens[1])
+
+    def test_authenticated_responses_are_not_cached(self):
+        self.client.get('/')
+        self.client.force_login(user=User.objects.get(username='dummy'))
+        response = self.client.get('/')
+        self.assertIsNotNone(response.context)
+
+    def test_equivalent_urls_share_an_entry(self):
+        self.client.get('/')
+        self.client.get('/?tags=testtag')
+        with self.assertNumQueries(0):
+            self.client.get('/?page=1&tags=testtag&utm_source=feed&title=')
+        with self.assertNumQueries(0):
+            self.client.get('/?page=1')
+        self.assertNotEqual(
+            self.client.get('/?tags=testtag').content,
+            self.client.get('/').content,
+        )
+
+    def test_new_bookmarks_invalidate(self):
+        self.client.get('/')
+        self.client.get('/user/dummy/')
+        Bookmark.objects.create(
+            bookmark_url='http://localhost/',
+            title='brand new',
+            owner=User.objects.get(username='dummy'),
+        )
+        self.assertContains(self.client.get('/'), 'brand new')
+        self.assertContains(self.client.get('/user/dummy/'), 'brand new')
+
+    def test_visibility_flips_invalidate(self):
+        self.assertContains(self.client.get('/'), 'Django REST Framework')
+        bookmark = Bookmark.objects.get(title='Django REST Framework')
+        bookmark.is_public = False
+        bookmark.save()
+        self.assertNotContains(self.client.get('/'), 'Django REST Framework')
+
+    def test_tag_renames_invalidate(self):
+        self.assertContains(self.client.get('/'), 'testtag')
+        tag = Tag.objects.get(name='testtag')
+        tag.name = 'renamed'
+        tag.save()
+        self.assertContains(self.client.get('/'), 'renamed')
+
+    def test_changes_of_other_owners_keep_user_pages(self):
+        self.client.get('/user/dummy/')
+        caching.bump('owner:0')
+        with self.assertNumQueries(0):
+            self.client.get('/user/dummy/')
+
+    def test_stale_entry_is_served_while_rebuilding(self):
+        """
+        While another worker rebuilds an entry, the stale one should be
+        served instead of rebuilding it again.
+        """
+        build = mock.Mock(return_value=(caching.HttpResponse('old'), {}))
+        response = caching.cached_response('test', build)
+        self.assertEqual(response.content, b'old')
+
+        caching.bump('public')
+        build.return_value = (
+            caching.HttpResponse('new'), caching.versions('public')
+        )
+        cache.set('test', dict(cache.get('test'), versions={'public': 0}))
+        cache.add('test:lock', 1)
+        self.assertEqual(caching.cached_response('test', build).content, b'old')
+        self.assertEqual(build.call_count, 1)
+
+        cache.delete('test:lock')
+        self.assertEqual(caching.cached_response('test', build).content, b'new')
+        self.assertEqual(build.call_count, 2)
+
+
+class FragmentCacheTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(user=User.objects.get(username='dummy'))
+
+    def test_fragments_are_reused(self):
+        """
+        Bookmarks should be rendered once and then read from the cache.
+        """
+        bookmarks = list(Bookmark.objects.with_related())
+        rows = render_fragments(bookmarks)
+        self.assertEqual([bookmark for bookmark, _ in rows], bookmarks)
+        with mock.patch('marcador.fragments.get_template') as get_template:
+            self.assertEqual(render_fragments(bookmarks), rows)
+        get_template.return_value.render.assert_not_called()
+
+    def test_changes_are_rendered(self):
+        self.client.get('/user/dummy/')
+        bookmark = Bookmark.objects.get(title='Example')
+        bookmark.title = 'Changed'
+        bookmark.save()
+        Tag.objects.filter(name='testtag').update(name='renamed')
+        caching.bump('tags')
+        response = self.client.get('/user/dummy/')
+        self.assertContains(response, 'Changed')
+        self.assertContains(response, 'renamed')
+
+    def test_controls_depend_on_the_viewer(self):
+        """
+        Cached fragments should not leak the controls of another viewer.
+        """
+        self.assertContains(self.client.get('/'), 'Edit bookmark', count=1)
+        self.client.force_login(user=User.objects.get(username='test'))
+        response = self.client.get('/')
+        self.assertContains(response, 'Edit bookmark', count=1)
+        self.assertContains(response, 'href="/edit/3/"')
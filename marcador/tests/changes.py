@@ -0,0 +1,97 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils.timezone import now
+
+from .. import bulk
+from ..changes import (
+    ExpiredToken, InvalidToken, make_token, parse_token, purge, read_changes
+)
+from ..models import Bookmark, BookmarkChange, Tag
+
+
+class ChangeFeedTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def setUp(self):
+        settle = mock.patch('marcador.changes.SETTLE', timedelta(0))
+        settle.start()
+        self.addCleanup(settle.stop)
+        self.owner = User.objects.get(pk=2)
+        self.token = read_changes(self.owner)[1]
+
+    def test_token(self):
+        issued = now().replace(microsecond=0)
+        self.assertEqual(parse_token(make_token(42, issued)), (42, issued))
+        with self.assertRaises(InvalidToken):
+            parse_token('not a token')
+
+    def test_changes_since_token(self):
+        """
+        Created, updated and deleted bookmarks should be listed once,
+        by their latest change.
+        """
+        created = Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=self.owner
+        )
+        created.tags.add(Tag.objects.get(name='testtag'))
+        Bookmark.objects.get(pk=2).delete()
+        bookmark = Bookmark.objects.get(pk=1)
+        bookmark.title = 'Example domain'
+        bookmark.save()
+        Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=User.objects.get(pk=3)
+        )
+
+        found, token, more = read_changes(self.owner, self.token)
+        self.assertEqual(
+            found, [(created.pk, 'updated'), (2, 'deleted'), (1, 'updated')]
+        )
+        self.assertFalse(more)
+        self.assertEqual(read_changes(self.owner, token)[0], [])
+
+    def test_bulk_changes(self):
+        other = User.objects.get(pk=3)
+        bulk.reassign(Bookmark.objects.filter(pk=1), other)
+        bulk.delete(Bookmark.objects.filter(pk=3))
+        bulk.set_public(Bookmark.objects.filter(pk=2), True)
+        self.assertEqual(
+            read_changes(self.owner, self.token)[0],
+            [(1, 'deleted'), (2, 'updated')]
+        )
+        self.assertEqual(
+            read_changes(other, self.token)[0], [(1, 'created'), (3, 'deleted')]
+        )
+
+    def test_paging(self):
+        for pk in (1, 2, 1):
+            bookmark = Bookmark.objects.get(pk=pk)
+            bookmark.save()
+        found, token, more = read_changes(self.owner, self.token, limit=2)
+        self.assertEqual((found, more), ([(1, 'updated'), (2, 'updated')], True))
+        found, token, more = read_changes(self.owner, token, limit=2)
+        self.assertEqual((found, more), ([(1, 'updated')], False))
+
+    def test_unsettled_changes_are_repeated(self):
+        Bookmark.objects.get(pk=1).save()
+        with mock.patch('marcador.changes.SETTLE', timedelta(minutes=1)):
+            found, token, more = read_changes(self.owner, self.token)
+        self.assertEqual(found, [(1, 'updated')])
+        self.assertEqual(read_changes(self.owner, token)[0], [(1, 'updated')])
+
+    def test_expired_token(self):
+        token = make_token(0, now() - timedelta(days=365))
+        with self.assertRaises(ExpiredToken):
+            read_changes(self.owner, token)
+
+    def test_purge(self):
+        Bookmark.objects.get(pk=1).save()
+        BookmarkChange.objects.update(date=now() - timedelta(days=365))
+        Bookmark.objects.get(pk=2).save()
+        purge()
+        self.assertEqual(
+            list(BookmarkChange.objects.values_list('bookmark_id', flat=True)),
+            [2]
+        )
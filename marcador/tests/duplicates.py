@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..duplicates import find_duplicates, normalize_url, update_duplicates
+from ..models import Bookmark, DuplicateBookmark
+
+
+class FindDuplicatesTestCase(TestCase):
+    def test_normalize_url(self):
+        self.assertEqual(
+            normalize_url('https://WWW.Example.com:443//docs/index.html'
+                          '?b=2&utm_source=feed&a=1#intro'),
+            'example.com/docs?a=1&b=2'
+        )
+        self.assertEqual(
+            normalize_url('http://example.com/docs/'),
+            normalize_url('https://www.example.com/docs?fbclid=abc')
+        )
+        self.assertEqual(
+            normalize_url('http://localhost:8000/'), 'localhost:8000'
+        )
+
+    def test_same_page_is_found(self):
+        found = find_duplicates([
+            (1, 1, 'Python tutorial', 'https://docs.python.org/3/tutorial/'),
+            (2, 1, 'Python tutorial',
+             'http://docs.python.org/3/tutorial?utm_source=rss'),
+            (3, 1, 'Django documentation', 'https://docs.djangoproject.com/'),
+        ])
+        self.assertEqual(found, [(1, 2, 1.0)])
+
+    def test_similar_titles_are_found(self):
+        title = 'How to write a fast bookmark manager in Python and Django'
+        found = find_duplicates([
+            (5, 1, title, 'https://blog.example.com/fast-bookmarks'),
+            (4, 1, title + ' (part 1)', 'https://blog.example.com/fast-bookmarks'),
+        ])
+        self.assertEqual([(a, b) for a, b, _ in found], [(4, 5)])
+        self.assertGreater(found[0][2], 0.5)
+
+    def test_other_owners_are_ignored(self):
+        self.assertEqual(find_duplicates([
+            (1, 1, 'Example', 'http://example.com/'),
+            (2, 2, 'Example', 'http://example.com/'),
+        ]), [])
+
+
+class UpdateDuplicatesTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def test_update_duplicates(self):
+        """
+        Found pairs should be stored once and removed when the bookmarks
+        no longer look alike.
+        """
+        owner = User.objects.get(pk=2)
+        bookmark = Bookmark.objects.create(
+            bookmark_url='https://example.com/', title='Example', owner=owner
+        )
+        self.assertEqual(update_duplicates(batch_size=1), 1)
+        pair = DuplicateBookmark.objects.get()
+        self.assertEqual((pair.bookmark_id, pair.duplicate_id), (1, bookmark.pk))
+
+        self.assertEqual(update_duplicates(), 1)
+        self.assertEqual(DuplicateBookmark.objects.get().pk, pair.pk)
+
+        bookmark.bookmark_url = 'https://www.netflix.com/browse'
+        bookmark.title = 'Browse'
+        bookmark.save()
+        self.assertEqual(update_duplicates(), 0)
+        self.assertFalse(DuplicateBookmark.objects.exists())
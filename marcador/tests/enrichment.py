@@ -0,0 +1,161 @@
+import shutil
+import socket
+import tempfile
+
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from ..enrichment import enrich_pending, parse_metadata
+from ..httpclient import HTTPClient
+from ..models import Bookmark, Favicon
+from .utils import QuietHandler, StubServer
+
+PAGE = b'''<!doctype html>
+<html><head>
+  <title>
+    An example   page
+  </title>
+  <meta name="description" content="Just an example.">
+  <link rel="shortcut icon" href="/static/icon.png">
+</head><body><title>not this one</title></body></html>
+'''
+ICON = b'\x89PNG\r\n\x1a\nfake'
+# an address of the same server that is refused while only 127.0.0.1 is
+# taken for public
+ELSEWHERE = 'http://[::1]:{port}'
+
+
+class PageHandler(QuietHandler):
+    def do_GET(self):
+        if self.path.startswith('/page'):
+            self.respond(200, {'Content-Type': 'text/html; charset=utf-8'}, PAGE)
+        elif self.path == '/redirect':
+            port = self.server.server_address[1]
+            self.respond(302, {'Location': ELSEWHERE.format(port=port) + '/page'})
+        elif self.path == '/private-icon':
+            port = self.server.server_address[1]
+            self.respond(200, {'Content-Type': 'text/html'}, (
+                f'<link rel="icon" href="{ELSEWHERE.format(port=port)}'
+                f'/static/icon.png">'
+            ).encode('ascii'))
+        elif self.path == '/static/icon.png':
+            self.server.icon_requests += 1
+            self.respond(200, {'Content-Type': 'image/png'}, ICON)
+        else:
+            self.respond(404)
+
+
+class ParseMetadataTestCase(TestCase):
+    def test_opengraph_fallback(self):
+        metadata = parse_metadata(
+            '<head><meta property="og:title" content="OG title">'
+            '<meta property="og:description" content="OG description">',
+            'http://example.com/a/b',
+        )
+        self.assertEqual(metadata.title, 'OG title')
+        self.assertEqual(metadata.description, 'OG description')
+        self.assertEqual(metadata.favicon_url, 'http://example.com/favicon.ico')
+
+
+class EnrichmentTestCase(TestCase):
+    fixtures = ['user']
+
+    @classmethod
+    def setUpClass(cls):
+        super(EnrichmentTestCase, cls).setUpClass()
+        cls.server = StubServer(PageHandler).__enter__()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root)
+        cls.server.__exit__(None, None, None)
+        super(EnrichmentTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        self.server.httpd.icon_requests = 0
+
+    def create(self, path, **kwargs):
+        return Bookmark.objects.create(
+            bookmark_url=self.server.url(path),
+            owner=User.objects.get(pk=1),
+            **kwargs
+        )
+
+    def enrich(self, **kwargs):
+        kwargs.setdefault('allow_private', True)
+        return enrich_pending(client=HTTPClient(timeout=2, **kwargs))
+
+    def test_new_bookmarks_are_pending(self):
+        bookmark = self.create('/page')
+        self.assertEqual(bookmark.metadata_status, Bookmark.METADATA_PENDING)
+
+    def test_empty_fields_are_filled_in(self):
+        bookmark = self.create('/page')
+        self.assertEqual(self.enrich(), 1)
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.title, 'An example page')
+        self.assertEqual(bookmark.description, 'Just an example.')
+        self.assertEqual(bookmark.metadata_status, Bookmark.METADATA_DONE)
+        self.assertEqual(bookmark.favicon.image.read(), ICON)
+
+    def test_user_input_is_not_clobbered(self):
+        bookmark = self.create('/page', title='My title')
+        self.enrich()
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.title, 'My title')
+        self.assertEqual(bookmark.description, 'Just an example.')
+
+    def test_favicons_are_fetched_and_stored_once(self):
+        for i in range(3):
+            self.create(f'/page{i}')
+        self.enrich()
+        self.assertEqual(self.server.httpd.icon_requests, 1)
+        self.assertEqual(Favicon.objects.count(), 1)
+        self.assertEqual(
+            Bookmark.objects.filter(favicon__isnull=False).count(), 3
+        )
+
+        self.create('/page3')
+        self.enrich()
+        self.assertEqual(self.server.httpd.icon_requests, 1)
+
+    def test_failed_fetches_are_not_retried(self):
+        bookmark = self.create('/missing', title='missing')
+        self.enrich()
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.metadata_status, Bookmark.METADATA_FAILED)
+        self.assertEqual(self.enrich(), 0)
+
+    def test_private_addresses_are_not_fetched(self):
+        bookmark = self.create('/page')
+        self.enrich(allow_private=False)
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.metadata_status, Bookmark.METADATA_FAILED)
+        self.assertEqual(bookmark.title, '')
+
+    @mock.patch('marcador.httpclient.is_public', '127.0.0.1'.__eq__)
+    def test_redirects_to_private_addresses_are_not_followed(self):
+        """Every redirect and the favicon should be checked on its own."""
+        redirected = self.create('/redirect')
+        icon = self.create('/private-icon')
+        connected = []
+        create_connection = socket.create_connection
+
+        def record(address, *args, **kwargs):
+            connected.append(address[0])
+            return create_connection(address, *args, **kwargs)
+
+        with mock.patch('socket.create_connection', record):
+            self.enrich(allow_private=False)
+        self.assertEqual(set(connected), {'127.0.0.1'})
+        redirected.refresh_from_db()
+        self.assertEqual(redirected.metadata_status, Bookmark.METADATA_FAILED)
+        icon.refresh_from_db()
+        self.assertEqual(icon.metadata_status, Bookmark.METADATA_DONE)
+        self.assertIsNone(icon.favicon)
@@ -0,0 +1,119 @@
+import os
+import signal
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+from django.utils.timezone import now
+
+from .. import jobs
+from ..models import Job
+
+calls = []
+
+
+@jobs.task
+def record(value):
+    calls.append(value)
+
+
+@jobs.task
+def fail():
+    raise RuntimeError('boom')
+
+
+def not_a_task():
+    pass
+
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        del calls[:]
+
+    def test_enqueue_and_run(self):
+        job = jobs.enqueue(record, value=42)
+        self.assertEqual(job.name, 'marcador.tests.jobs.record')
+        claimed = jobs.claim('test')
+        self.assertEqual(claimed, [job])
+        self.assertEqual(claimed[0].status, Job.RUNNING)
+        self.assertEqual(jobs.run(claimed[0]), Job.DONE)
+        self.assertEqual(calls, [42])
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        jobs.enqueue_many(record, [{'value': i} for i in range(3)])
+        first = jobs.claim('a', limit=2)
+        second = jobs.claim('b', limit=2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(jobs.claim('c'), [])
+
+    def test_priority_and_schedule(self):
+        low = jobs.enqueue(record, value=1)
+        high = jobs.enqueue(record, value=2, priority=10)
+        jobs.enqueue(record, value=3, run_at=now() + timedelta(hours=1))
+        self.assertEqual(jobs.claim('test', limit=5), [high, low])
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        jobs.enqueue(fail, max_attempts=2)
+        job = jobs.claim('test')[0]
+        self.assertEqual(jobs.run(job), Job.QUEUED)
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, now() - timedelta(seconds=1))
+
+        Job.objects.update(run_at=now())
+        job = jobs.claim('test')[0]
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(jobs.run(job), Job.FAILED)
+
+    def test_only_tasks_are_run(self):
+        jobs.enqueue('marcador.tests.jobs.not_a_task', max_attempts=1)
+        self.assertEqual(jobs.run(jobs.claim('test')[0]), Job.FAILED)
+
+    def test_stale_jobs_are_requeued(self):
+        jobs.enqueue(record, value=1)
+        jobs.claim('dead')
+        Job.objects.update(locked_at=now() - timedelta(hours=1))
+        with mock.patch('marcador.jobs.LEASE', timedelta(hours=2)):
+            self.assertEqual(jobs.requeue_stale(), 0)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(len(jobs.claim('alive')), 1)
+
+    def test_command(self):
+        jobs.enqueue_many(record, [{'value': i} for i in range(15)])
+        out = StringIO()
+        call_command('jobworker', '--burst', stdout=out)
+        self.assertIn('processed 15 jobs', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(15)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 15)
+
+    def test_workers_are_stopped_with_the_command(self):
+        """A SIGTERM to the command should be passed on to its workers."""
+        processes = []
+
+        class Process:
+            def __init__(self, target, args):
+                self.terminated = False
+                processes.append(self)
+
+            def start(self):
+                pass
+
+            def join(self):
+                if not self.terminated:
+                    os.kill(os.getpid(), signal.SIGTERM)
+
+            def terminate(self):
+                self.terminated = True
+
+        handler = signal.getsignal(signal.SIGTERM)
+        with mock.patch('multiprocessing.Process', Process), \
+                mock.patch.object(connections, 'close_all'):
+            call_command('jobworker', '--concurrency', '2', stdout=StringIO())
+        self.assertEqual(
+            [process.terminated for process in processes], [True, True]
+        )
+        self.assertIs(signal.getsignal(signal.SIGTERM), handler)
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+
+from ..linkcheck import LinkChecker, check_bookmarks
+from ..models import Bookmark
+from .utils import QuietHandler, StubServer
+
+# an address of the same server that is refused while only 127.0.0.1 is
+# taken for public
+ELSEWHERE = 'http://[::1]:{port}'
+
+
+class LinkHandler(QuietHandler):
+    def do_HEAD(self):
+        if self.path == '/no-head':
+            self.respond(405)
+        else:
+            self.do_GET()
+
+    def do_GET(self):
+        if self.path in ('/ok', '/no-head'):
+            self.respond(200, body=b'hello')
+        elif self.path == '/etag':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.respond(304, {'ETag': '"v1"'})
+            else:
+                self.respond(200, {'ETag': '"v1"'}, b'hello')
+        elif self.path == '/moved':
+            self.respond(301, {'Location': '/ok'})
+        elif self.path == '/elsewhere':
+            port = self.server.server_address[1]
+            self.respond(302, {'Location': ELSEWHERE.format(port=port) + '/ok'})
+        elif self.path == '/loop':
+            self.respond(302, {'Location': '/loop'})
+        elif self.path == '/slow':
+            time.sleep(1)
+            self.respond(200)
+        else:
+            self.respond(404)
+
+
+class LinkCheckTestCase(TestCase):
+    fixtures = ['user']
+
+    @classmethod
+    def setUpClass(cls):
+        super(LinkCheckTestCase, cls).setUpClass()
+        cls.server = StubServer(LinkHandler).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__(None, None, None)
+        super(LinkCheckTestCase, cls).tearDownClass()
+
+    def create(self, path):
+        return Bookmark.objects.create(
+            bookmark_url=self.server.url(path),
+            title=path,
+            owner=User.objects.get(pk=1),
+        )
+
+    def check(self, **kwargs):
+        kwargs.setdefault(
+            'checker', LinkChecker(timeout=0.5, allow_private=True)
+        )
+        return check_bookmarks(**kwargs)
+
+    def test_status_is_stored(self):
+        """
+        The outcome of a check should be stored per bookmark without
+        touching the date of the last update.
+        """
+        ok = self.create('/ok')
+        gone = self.create('/gone')
+        updated = ok.date_updated
+        counts = self.check()
+        self.assertEqual(counts, {'ok': 1, 'broken': 1})
+
+        ok.refresh_from_db()
+        gone.refresh_from_db()
+        self.assertEqual(ok.link_status, Bookmark.LINK_OK)
+        self.assertEqual(ok.link_status_code, 200)
+        self.assertIsNotNone(ok.link_checked_at)
+        self.assertEqual(ok.date_updated, updated)
+        self.assertEqual(gone.link_status, Bookmark.LINK_BROKEN)
+        self.assertEqual(gone.link_status_code, 404)
+
+    def test_head_falls_back_to_get(self):
+        bookmark = self.create('/no-head')
+        self.check()
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.link_status_code, 200)
+
+    def test_redirects(self):
+        moved = self.create('/moved')
+        loop = self.create('/loop')
+        self.check()
+        moved.refresh_from_db()
+        loop.refresh_from_db()
+        self.assertEqual(moved.link_status, Bookmark.LINK_OK)
+        self.assertEqual(loop.link_status, Bookmark.LINK_REDIRECT)
+
+    def test_timeout_and_unreachable(self):
+        slow = self.create('/slow')
+        closed = Bookmark.objects.create(
+            bookmark_url='http://127.0.0.1:9/',
+            title='closed',
+            owner=User.objects.get(pk=1),
+        )
+        self.check()
+        slow.refresh_from_db()
+        closed.refresh_from_db()
+        self.assertEqual(slow.link_status, Bookmark.LINK_ERROR)
+        self.assertEqual(closed.link_status, Bookmark.LINK_ERROR)
+        self.assertLess(slow.link_next_check, now() + timedelta(days=2))
+
+    def test_private_addresses_are_not_checked(self):
+        bookmark = self.create('/ok')
+        self.check(checker=LinkChecker(timeout=0.5))
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.link_status, Bookmark.LINK_ERROR)
+        self.assertIsNone(bookmark.link_status_code)
+
+    @mock.patch('marcador.httpclient.is_public', '127.0.0.1'.__eq__)
+    def test_redirects_to_private_addresses_are_not_followed(self):
+        bookmark = self.create('/elsewhere')
+        connected = []
+        open_connection = asyncio.open_connection
+
+        def record(host, *args, **kwargs):
+            connected.append(host)
+            return open_connection(host, *args, **kwargs)
+
+        with mock.patch('asyncio.open_connection', record):
+            self.check(checker=LinkChecker(timeout=0.5))
+        self.assertEqual(set(connected), {'127.0.0.1'})
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.link_status, Bookmark.LINK_ERROR)
+
+    def test_unchanged_pages_are_rechecked_less_often(self):
+        """
+        A page whose validators did not change should be revalidated
+        with a conditional request and rechecked later each time.
+        """
+        bookmark = self.create('/etag')
+        self.check()
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.link_etag, '"v1"')
+        first = bookmark.link_next_check - bookmark.link_checked_at
+
+        self.check(force=True)
+        bookmark.refresh_from_db()
+        self.assertEqual(bookmark.link_status_code, 304)
+        second = bookmark.link_next_check - bookmark.link_checked_at
+        self.assertGreater(second, first)
+
+    def test_only_due_bookmarks_are_checked(self):
+        self.create('/ok')
+        self.assertEqual(sum(self.check().values()), 1)
+        self.assertEqual(sum(self.check().values()), 0)
+        self.assertEqual(sum(self.check(force=True, limit=1).values()), 1)
+
+    @mock.patch('marcador.httpclient.is_public', '127.0.0.1'.__eq__)
+    def test_command(self):
+        self.create('/ok')
+        out = StringIO()
+        call_command('checklinks', '--timeout', '0.5', stdout=out)
+        self.assertIn('Checked 1 bookmarks.', out.getvalue())
+        self.assertTrue(
+            Bookmark.objects.filter(link_status=Bookmark.LINK_OK).exists()
+        )
@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase
+
+from ..models import Bookmark
+from ..nplusone import Detector, NPlusOneError, NPlusOneMiddleware, detect
+from ..queries import fingerprint
+
+
+class NPlusOneTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def test_fingerprint(self):
+        """Queries differing only in their parameters should match."""
+        self.assertEqual(
+            fingerprint('SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s, %s) LIMIT 21'),
+            fingerprint("SELECT \"a\".\"id\" FROM \"a\"  WHERE \"a\".\"id\" IN (1) LIMIT 5"),
+        )
+        self.assertNotEqual(
+            fingerprint('SELECT "a"."id" FROM "a" WHERE "a"."b" = %s'),
+            fingerprint('SELECT "a"."id" FROM "a" WHERE "a"."c" = %s'),
+        )
+
+    def test_template_origin(self):
+        """Repeated queries should be reported with their template line."""
+        with self.assertRaises(NPlusOneError) as context:
+            with detect():
+                for bookmark in Bookmark.objects.all():
+                    render_to_string(
+                        'marcador/bookmark_body.html', {'bookmark': bookmark}
+                    )
+        self.assertEqual(
+            sorted(repeat.origin for repeat in context.exception.repeats),
+            ['marcador/bookmark_body.html:10', 'marcador/bookmark_body.html:13']
+        )
+        self.assertEqual(context.exception.repeats[0].count, 4)
+
+        with detect(allowlist=['marcador/bookmark_body.html:*']):
+            for bookmark in Bookmark.objects.all():
+                render_to_string(
+                    'marcador/bookmark_body.html', {'bookmark': bookmark}
+                )
+        with detect():
+            for bookmark in Bookmark.objects.with_related():
+                render_to_string(
+                    'marcador/bookmark_body.html', {'bookmark': bookmark}
+                )
+
+    def test_code_origin(self):
+        """Outside of templates, the line of own code should be reported."""
+        with self.assertRaises(NPlusOneError) as context:
+            with detect(threshold=2):
+                for pk in (1, 2):
+                    Bookmark.objects.get(pk=pk)
+        origin = context.exception.repeats[0].origin
+        self.assertTrue(origin.startswith('marcador/tests/nplusone.py:'), origin)
+
+    def test_transactions_are_not_repeats(self):
+        """Atomic blocks in autocommit mode each begin a transaction."""
+        detector = Detector(threshold=2)
+        for sql in ['BEGIN', 'SAVEPOINT "s1"', 'BEGIN', 'SAVEPOINT "s1"']:
+            detector(lambda *args: None, sql, None, False, {})
+        self.assertEqual(detector.repeats(), [])
+
+    def test_middleware_logs(self):
+        def view(request):
+            for bookmark in Bookmark.objects.all():
+                list(bookmark.tags.all())
+            return HttpResponse()
+
+        with mock.patch('marcador.nplusone.MODE', 'log'), \
+                self.assertLogs('marcador.nplusone', 'WARNING') as logs:
+            NPlusOneMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('N+1 queries in GET /: 4 x SELECT', logs.output[0])
@@ -0,0 +1,89 @@
+import base64
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from .. import profiling
+from ..profiling import Sampler
+
+
+def basic(username, password):
+    credentials = f'{username}:{password}'.encode('ascii')
+    return 'Basic ' + base64.b64encode(credentials).decode('ascii')
+
+
+def wait():
+    time.sleep(0.05)
+
+
+class ProfilingTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def test_sampler(self):
+        sampler = Sampler(threading.get_ident(), interval=0.001)
+        sampler.start()
+        wait()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        stack, count = sampler.stacks.most_common(1)[0]
+        self.assertTrue(stack.endswith(';marcador.tests.profiling.wait'), stack)
+        self.assertIn(f'{stack} {count}\n', sampler.collapsed())
+        self.assertIn('marcador.tests.profiling.wait\n', sampler.tree())
+
+    def test_superuser(self):
+        self.client.force_login(User.objects.get(username='superuser'))
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1):
+            response = self.client.get('/api/bookmarks/?profile')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        content = response.content.decode()
+        self.assertTrue(
+            content.startswith('# GET /api/bookmarks/?profile -> 200\n'), content
+        )
+        self.assertRegex(content, r'# [1-9]\d* queries in')
+        for category in ['sql', 'template', 'serializer', 'other']:
+            self.assertIn(f'# {category}: ', content)
+        self.assertIn('\nSelf time\n', content)
+
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1):
+            response = self.client.get('/?profile=collapsed')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertNotIn('Self time', response.content.decode())
+
+    def test_skipped(self):
+        """Unsampled requests and other users get the usual response."""
+        self.client.force_login(User.objects.get(username='superuser'))
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 0):
+            response = self.client.get('/api/bookmarks/?profile')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['X-Profile'], 'skipped')
+
+        self.client.force_login(User.objects.get(username='dummy'))
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1):
+            response = self.client.get('/?profile')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertFalse(response.has_header('X-Profile'))
+
+        # credentials of other users or none at all are not profiled
+        self.client.logout()
+        User.objects.create_user('client', password='secret')
+        for credentials in ('Basic eDp5', basic('client', 'secret')):
+            with mock.patch.object(profiling, 'Sampler') as sampler, \
+                    mock.patch.object(profiling, 'SAMPLE_RATE', 1):
+                response = self.client.get(
+                    '/api/bookmarks/?profile', HTTP_AUTHORIZATION=credentials
+                )
+            sampler.assert_not_called()
+            self.assertFalse(response.has_header('X-Profile'))
+
+    def test_api_credentials(self):
+        """API clients with a superuser's credentials should be profiled."""
+        User.objects.create_superuser('root', 'root@localhost', 'secret')
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1):
+            response = self.client.get(
+                '/api/bookmarks/?profile',
+                HTTP_AUTHORIZATION=basic('root', 'secret'),
+            )
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
@@ -0,0 +1,121 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TransactionTestCase
+
+from .. import caching
+from ..models import Bookmark, Tag
+from ..recent import is_first_page, recent_bookmarks
+
+
+class RecentBookmarksTestCase(TransactionTestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def setUp(self):
+        # changes are applied to the buffer once committed; the fixtures
+        # are restored by flushing, which bypasses the signals, so start
+        # from a fresh buffer
+        cache.clear()
+        recent_bookmarks.invalidate()
+        recent_bookmarks.snapshot()
+
+    def test_is_first_page(self):
+        self.assertTrue(is_first_page(QueryDict('')))
+        self.assertTrue(is_first_page(QueryDict('page=1&tags=')))
+        self.assertTrue(is_first_page(QueryDict('format=json')))
+        self.assertFalse(is_first_page(QueryDict('page=2')))
+        self.assertFalse(is_first_page(QueryDict('tags=testtag')))
+
+    def test_first_page_is_served_from_memory(self):
+        """
+        The first page of public bookmarks should not query the
+        bookmarks; only the tag cloud is left.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get('/')
+        self.assertEqual(len(response.context['bookmarks']), 2)
+        self.assertContains(response, 'Django REST Framework')
+        self.assertContains(response, 'testtag')
+
+    def test_pages_are_lists(self):
+        page = recent_bookmarks.first_page(1)
+        self.assertIsInstance(page.object_list, list)
+        self.assertEqual(len(page.object_list), 1)
+        self.assertEqual(page.paginator.count, 2)
+
+    def test_api_first_page_is_served_from_memory(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookmarks/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [bookmark['id'] for bookmark in response.data['results']], [3, 1]
+        )
+
+    def test_new_public_bookmarks_are_listed(self):
+        Bookmark.objects.create(
+            bookmark_url='http://localhost/',
+            title='brand new',
+            owner=User.objects.get(pk=1),
+        )
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookmarks/')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['title'], 'brand new')
+
+    def test_visibility_flips_are_reflected(self):
+        bookmark = Bookmark.objects.get(pk=3)
+        bookmark.is_public = False
+        bookmark.save()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookmarks/')
+        self.assertEqual(response.data['count'], 1)
+
+        Bookmark.objects.get(pk=2).delete()
+        Bookmark.objects.get(pk=1).delete()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookmarks/')
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['results'], [])
+
+    def test_owners_and_tags_are_reloaded(self):
+        """
+        Renamed owners and tags should be reloaded into the buffer, and
+        other changes of users should leave it alone.
+        """
+        version = caching.version('recent')
+        user = User.objects.get(username='test')
+        user.first_name = 'Test'
+        user.save()
+        self.assertEqual(caching.version('recent'), version)
+
+        user.username = 'renamed'
+        user.save()
+        tag = Tag.objects.get(pk=3)
+        tag.name = 'renamed-tag'
+        tag.save()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/bookmarks/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertTrue(
+            response.data['results'][0]['owner'].endswith('/users/renamed/')
+        )
+        with self.assertNumQueries(0):
+            first = recent_bookmarks.snapshot()[0][0]
+            self.assertIn('renamed-tag', [tag.name for tag in first.tags.all()])
+
+    def test_deeper_pages_use_the_database(self):
+        for i in range(12):
+            Bookmark.objects.create(
+                bookmark_url=f'http://localhost/{i}',
+                title=f'bookmark {i}',
+                owner=User.objects.get(pk=1),
+            )
+        first = self.client.get('/api/bookmarks/')
+        self.assertEqual(first.data['count'], 14)
+        self.assertIsNotNone(first.data['next'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 4)
+        self.assertEqual(second.data['results'][-1]['id'], 1)
+
+        response = self.client.get('/?page=2')
+        self.assertEqual(len(response.context['bookmarks']), 4)
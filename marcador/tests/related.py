@@ -0,0 +1,99 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..bulk import merge_tags
+from ..models import Bookmark, RelatedBookmark, Tag
+from ..related import TagMatrix, update_related
+
+
+class TagMatrixTestCase(TestCase):
+    def test_neighbours_match_brute_force(self):
+        """
+        Neighbours should be the bookmarks with the highest cosine
+        similarity of their IDF-weighted tags.
+        """
+        random = np.random.RandomState(0)
+        dense = random.rand(60, 15) < 0.2
+        bookmarks, tags = np.nonzero(dense)
+        matrix = TagMatrix(bookmarks + 100, tags + 10)
+
+        used = dense[:, dense.any(axis=0)][dense.any(axis=1)]
+        df = used.sum(axis=0)
+        idf = np.log((1 + len(used)) / (1 + df)) + 1
+        vectors = used * idf
+        vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+        expected = vectors @ vectors.T
+        np.fill_diagonal(expected, 0)
+
+        rows = np.arange(len(used))
+        queries, neighbours, scores = matrix.neighbours(rows, top_k=3)
+        for query in rows:
+            found = scores[queries == query]
+            best = np.sort(expected[query][expected[query] > 0])[::-1][:3]
+            np.testing.assert_allclose(found, best)
+            np.testing.assert_allclose(
+                expected[query, neighbours[queries == query]], found
+            )
+
+    def test_common_tags_are_skipped(self):
+        matrix = TagMatrix(np.array([1, 2, 3, 1, 2]), np.array([1, 1, 1, 2, 3]),
+                           max_df=2)
+        queries, neighbours, scores = matrix.neighbours(matrix.rows([1, 2, 3]))
+        self.assertEqual(len(queries), 0)
+
+    def test_rows(self):
+        matrix = TagMatrix(np.array([5, 7]), np.array([1, 1]))
+        self.assertEqual(list(matrix.rows([7, 6, 5, 9])), [1, -1, 0, -1])
+
+
+class UpdateRelatedTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def test_update_related(self):
+        """
+        Only bookmarks changed since the last update should be updated.
+        """
+        self.assertEqual(update_related(), 4)
+        self.assertEqual(
+            list(RelatedBookmark.objects.filter(bookmark=3)
+                 .values_list('related', flat=True)),
+            [2, 4]
+        )
+        self.assertEqual(update_related(), 0)
+
+        bookmark = Bookmark.objects.get(pk=1)
+        bookmark.tags.add(Tag.objects.get(name='dummytag'))
+        bookmark.save()
+        self.assertEqual(update_related(), 1)
+        self.assertEqual(
+            list(RelatedBookmark.objects.filter(bookmark=1)
+                 .values_list('related', flat=True)),
+            [2, 4, 3]
+        )
+        self.assertEqual(update_related(full=True), 4)
+
+    def test_tag_changes_mark_bookmarks_stale(self):
+        """
+        Bookmarks whose tags were merged, deleted or changed through the
+        tag should be updated, although they were not saved.
+        """
+        update_related()
+        merge_tags([Tag.objects.get(name='dummytag')],
+                   Tag.objects.get(name='testtag'))
+        self.assertEqual(update_related(), 2)
+
+        Tag.objects.get(name='testtag').delete()
+        self.assertEqual(update_related(), 4)
+
+        Tag.objects.get(name='exampletag').bookmark_set.add(
+            Bookmark.objects.get(pk=1)
+        )
+        self.assertEqual(update_related(), 1)
+
+    def test_untagged_bookmarks_have_no_related(self):
+        bookmark = Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=User.objects.get(pk=1)
+        )
+        update_related()
+        self.assertFalse(bookmark.related_bookmarks.exists())
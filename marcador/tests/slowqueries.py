@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import slowqueries
+from ..models import Bookmark
+from ..slowqueries import monitor, rank, read
+
+
+class SlowQueryLogTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def setUp(self):
+        patcher = mock.patch.object(slowqueries, '_explained', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def entries(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_monitor(self):
+        """Slow queries are logged, with a plan once per fingerprint."""
+        with self.assertLogs('marcador.slowqueries', 'INFO') as logs:
+            with monitor('test', threshold=0):
+                Bookmark.objects.get(pk=1)
+                Bookmark.objects.get(pk=2)
+        first, second = self.entries(logs)
+        self.assertEqual(first['view'], 'test')
+        self.assertEqual(first['fingerprint'], second['fingerprint'])
+        self.assertIn('"marcador_bookmark"."id" = ?', first['fingerprint'])
+        self.assertIn('marcador_bookmark', first['explain'])
+        self.assertNotIn('explain', second)
+
+        with mock.patch.object(slowqueries.logger, 'info') as info:
+            with monitor('test', threshold=10 ** 6):
+                Bookmark.objects.get(pk=1)
+        info.assert_not_called()
+
+    def test_middleware(self):
+        """Queries are logged with the view or ViewSet action."""
+        with mock.patch.object(slowqueries, 'THRESHOLD', 0), \
+                self.assertLogs('marcador.slowqueries', 'INFO') as logs:
+            self.client.get('/api/tags/')
+            # logged in, so the list is not served from the cache
+            self.client.force_login(User.objects.get(username='dummy'))
+            self.client.get('/')
+        views = {entry['view'] for entry in self.entries(logs)}
+        self.assertIn('marcador_api.views.TagViewSet.list', views)
+        self.assertIn('marcador.views.BookmarkList', views)
+
+    def test_rank(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slowqueries.log')
+            lines = {
+                path + '.1': [('SELECT a', 300.0, 'old'), ('SELECT b', 50.0, 'b')],
+                path: [('SELECT b', 200.0, 'b'), ('SELECT b', 100.0, 'c')],
+            }
+            for name, entries in lines.items():
+                with open(name, 'w') as stream:
+                    for shape, duration, view in entries:
+                        stream.write(json.dumps({
+                            'fingerprint': shape, 'duration': duration,
+                            'view': view, 'explain': f'plan of {shape}',
+                        }) + '\n')
+                    stream.write('not json\n')
+
+            ranking = rank(read(path))
+            self.assertEqual(
+                [(stats['fingerprint'], stats['count'], stats['total'])
+                 for stats in ranking],
+                [('SELECT b', 3, 350.0), ('SELECT a', 1, 300.0)]
+            )
+            self.assertEqual(ranking[0]['views'], {'b': 2, 'c': 1})
+            self.assertEqual(ranking[0]['max'], 200.0)
+
+            out = StringIO()
+            call_command('slowqueries', '--log', path, '--explain', stdout=out)
+            output = out.getvalue()
+            self.assertLess(output.index('SELECT b'), output.index('SELECT a'))
+            self.assertIn('2 x b', output)
+            self.assertIn('| plan of SELECT a', output)
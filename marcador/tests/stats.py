@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from .. import bulk
+from ..models import Bookmark, Tag, UserStats
+from ..stats import get_stats, rebuild
+
+
+class UserStatsTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def assertCounters(self, user, bookmarks, public, tags):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.bookmarks, stats.public_bookmarks, stats.tags),
+            (bookmarks, public, tags)
+        )
+
+    def test_counted_when_missing(self):
+        stats = get_stats(User.objects.get(pk=3))
+        self.assertEqual(
+            (stats.bookmarks, stats.public_bookmarks, stats.tags), (1, 1, 2)
+        )
+        self.assertIsNotNone(stats.last_activity)
+
+    def test_counters_follow_writes(self):
+        """
+        The counters should be adjusted by every write of a bookmark.
+        """
+        owner = User.objects.get(pk=2)
+        get_stats(owner)
+        self.assertCounters(owner, 2, 1, 2)
+
+        bookmark = Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=owner, is_public=False
+        )
+        self.assertCounters(owner, 3, 1, 2)
+        bookmark.tags.add(Tag.objects.get(name='exampletag'))
+        self.assertCounters(owner, 3, 1, 3)
+        bookmark.is_public = True
+        bookmark.save()
+        self.assertCounters(owner, 3, 2, 3)
+        self.assertEqual(
+            UserStats.objects.get(user=owner).last_activity,
+            bookmark.date_updated
+        )
+
+        Tag.objects.get(name='exampletag').delete()
+        self.assertCounters(owner, 3, 2, 2)
+        bookmark.delete()
+        self.assertCounters(owner, 2, 1, 2)
+
+    def test_counters_follow_bulk_changes(self):
+        owner = User.objects.get(pk=3)
+        get_stats(owner)
+        bulk.reassign(Bookmark.objects.filter(owner__pk=2), owner)
+        self.assertCounters(owner, 3, 2, 3)
+        self.assertCounters(User.objects.get(pk=2), 0, 0, 0)
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild(), 3)
+        self.assertCounters(User.objects.get(pk=1), 1, 0, 2)
+        self.assertCounters(User.objects.get(pk=2), 2, 1, 2)
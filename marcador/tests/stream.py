@@ -0,0 +1,120 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..models import Bookmark, BookmarkChange, Tag
+from ..stream import Full, Publisher, stream
+
+
+class StreamTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    def setUp(self):
+        self.publisher = Publisher(buffer_size=3, threaded=False)
+        self.position = self.publisher.subscribe()
+        self.addCleanup(self.publisher.unsubscribe)
+        self.owner = User.objects.get(pk=2)
+
+    def publish(self):
+        self.publisher.poll()
+        events, self.position = self.publisher.wait(self.position, 0)
+        return events
+
+    def test_publish_public_bookmarks(self):
+        """
+        Created and updated public bookmarks should be published once,
+        private ones not at all.
+        """
+        created = Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=self.owner
+        )
+        Bookmark.objects.create(
+            bookmark_url='http://localhost/private', owner=self.owner,
+            is_public=False
+        )
+        events = self.publish()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(
+            events[0].id,
+            BookmarkChange.objects.filter(bookmark_id=created.pk).get().pk
+        )
+        self.assertEqual(events[0].owner, 'dummy')
+        self.assertEqual(json.loads(events[0].data)['bookmark_url'], 'http://localhost/')
+
+        created.title = 'changed'
+        created.save()
+        events = self.publish()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(json.loads(events[0].data)['title'], 'changed')
+        self.assertEqual(self.publish(), [])
+
+    def test_resume(self):
+        """
+        Subscribers should resume after the last event they saw, as long
+        as it is buffered.
+        """
+        for path in ('a', 'b', 'c', 'd'):
+            Bookmark.objects.create(
+                bookmark_url=f'http://localhost/{path}', owner=self.owner
+            )
+        events = self.publish()
+        self.assertEqual(len(events), 3)
+        self.assertEqual(
+            json.loads(events[0].data)['bookmark_url'], 'http://localhost/b'
+        )
+
+        position = self.publisher.subscribe(events[0].id)
+        self.addCleanup(self.publisher.unsubscribe)
+        resumed, _ = self.publisher.wait(position, 0)
+        self.assertEqual(resumed, events[1:])
+        position = self.publisher.subscribe(events[0].id - 1000)
+        self.addCleanup(self.publisher.unsubscribe)
+        self.assertEqual(self.publisher.wait(position, 0)[0], events)
+
+    def test_stream(self):
+        """The stream should only contain events matching its filters."""
+        bookmark = Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=self.owner
+        )
+        bookmark.tags.add(Tag.objects.get(name='testtag'))
+        Bookmark.objects.create(
+            bookmark_url='http://localhost/other', owner=self.owner
+        )
+        events = stream(self.publisher, tag='testtag', heartbeat=0, max_age=1)
+        self.assertEqual(next(events), 'retry: 1000\n\n')
+        self.assertEqual(next(events), ': heartbeat\n\n')
+        self.publisher.poll()
+        message = next(events)
+        self.assertEqual(message.count('event: bookmark\n'), 1)
+        self.assertIn('"bookmark_url": "http://localhost/"', message)
+        events.close()
+        self.assertEqual(self.publisher.subscribers, 1)
+
+        events = stream(self.publisher, owner='test', heartbeat=0, max_age=1)
+        next(events)
+        Bookmark.objects.filter(pk=3).get().save()
+        self.publisher.poll()
+        self.assertIn('"id": 3', next(events))
+
+    def test_limits(self):
+        """Subscribers beyond the limits should be turned away."""
+        publisher = Publisher(
+            threaded=False, max_subscribers=3, max_per_client=2
+        )
+        streams = [stream(publisher, client='10.0.0.1') for _ in range(2)]
+        with self.assertRaises(Full):
+            stream(publisher, client='10.0.0.1')
+        streams.append(stream(publisher, client='10.0.0.2'))
+        with self.assertRaises(Full):
+            stream(publisher, client='10.0.0.3')
+        self.assertEqual(publisher.subscribers, 3)
+
+        # closing a stream that was never read makes room
+        streams.pop(0).close()
+        self.assertEqual(publisher.clients['10.0.0.1'], 1)
+        streams.append(stream(publisher, client='10.0.0.1'))
+        for events in streams:
+            events.close()
+        self.assertEqual(publisher.subscribers, 0)
+        self.assertEqual(publisher.clients, {})
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..models import Tag
+from .. import tagcache
+from ..tagcache import TagCache, tag_cache
+
+
+class TagCacheTestCase(TestCase):
+    fixtures = ['tag']
+
+    def setUp(self):
+        # the fixtures are restored by rolling back, which bypasses
+        # the signals; start from an empty cache
+        cache.clear()
+        tag_cache.invalidate()
+
+    @mock.patch('marcador.caching.is_shared', return_value=True)
+    def test_batch(self, shared):
+        """Missing tags should be looked up together, and then cached."""
+        with self.assertNumQueries(1):
+            tags = tag_cache.by_name(['testtag', 'dummytag', 'unknown'])
+        self.assertEqual(
+            {name: (tag.pk, tag.name) for name, tag in tags.items()},
+            {'testtag': (1, 'testtag'), 'dummytag': (2, 'dummytag')}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(tag_cache.by_name(['testtag', 'unknown']).keys(),
+                             {'testtag'})
+            self.assertEqual(tag_cache.by_id([1, 2]).keys(), {1, 2})
+        with self.assertNumQueries(1):
+            self.assertEqual(tag_cache.by_id([1, 3, 4]).keys(), {1, 3})
+
+    def test_local_misses(self):
+        """Without a shared cache, missing tags should not be remembered."""
+        tag_cache.by_name(['testtag', 'unknown'])
+        with self.assertNumQueries(0):
+            tag_cache.by_name(['testtag'])
+        with self.assertNumQueries(1):
+            self.assertEqual(tag_cache.by_name(['unknown']), {})
+
+    def test_expiry(self):
+        """Entries should expire, sooner without a shared cache."""
+        now = 1000.0
+        with mock.patch('time.monotonic', lambda: now):
+            tag_cache.by_name(['testtag'])
+            now += tagcache.LOCAL_TIMEOUT - 1
+            with self.assertNumQueries(0):
+                tag_cache.by_name(['testtag'])
+            now += 1
+            with self.assertNumQueries(1):
+                tag_cache.by_name(['testtag'])
+
+            with mock.patch('marcador.caching.is_shared', return_value=True):
+                tag_cache.invalidate()
+                tag_cache.by_name(['testtag'])
+                now += tagcache.TIMEOUT - 1
+                with self.assertNumQueries(0):
+                    tag_cache.by_name(['testtag'])
+                now += 1
+                with self.assertNumQueries(1):
+                    tag_cache.by_name(['testtag'])
+
+    def test_tags_are_usable(self):
+        tag = tag_cache.by_name(['testtag'])['testtag']
+        self.assertFalse(tag._state.adding)
+        self.assertEqual(tag, Tag.objects.get(name='testtag'))
+
+    def test_changes_invalidate(self):
+        """Saving or deleting a tag should clear the cache everywhere."""
+        tag_cache.by_name(['testtag', 'newtag'])
+        Tag.objects.create(name='newtag')
+        self.assertIn('newtag', tag_cache.by_name(['newtag']))
+
+        tag = Tag.objects.get(name='testtag')
+        tag.name = 'renamed'
+        tag.save()
+        self.assertEqual(tag_cache.by_name(['testtag', 'renamed']).keys(),
+                         {'renamed'})
+
+        tag.delete()
+        self.assertEqual(tag_cache.by_id([tag.pk]), {})
+
+    def test_size(self):
+        """The least recently used tags should be dropped first."""
+        tags = TagCache(2)
+        tags.by_name(['testtag'])
+        tags.by_name(['dummytag'])
+        tags.by_name(['testtag'])
+        tags.by_name(['exampletag'])
+        self.assertEqual(list(tags._by_name), ['testtag', 'exampletag'])
+        self.assertEqual(len(tags._by_id), 2)
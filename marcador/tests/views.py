@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
 from ..models import Bookmark, Tag
@@ -7,13 +8,17 @@ from ..models import Bookmark, Tag
 class BookmarkListTestCase(TestCase):
     fixtures = ['bookmark', 'tag', 'user']
 
+    def setUp(self):
+        # cached responses carry no template context
+        cache.clear()
+
     def test_public_bookmarks(self):
         """
         All public bookmarks should be listed.
         """
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.context['bookmarks'].count(), 2)
+        self.assertEqual(len(response.context['bookmarks']), 2)
 
     def test_filter_tags(self):
         """
@@ -31,6 +36,10 @@ class BookmarkListTestCase(TestCase):
 class UserBookmarkListTestCase(TestCase):
     fixtures = ['bookmark', 'tag', 'user']
 
+    def setUp(self):
+        # cached responses carry no template context
+        cache.clear()
+
     def test_unauthenticated_public_bookmarks(self):
         """
         An unauthenticated user should be able to retrieve all public
@@ -39,6 +48,7 @@ class UserBookmarkListTestCase(TestCase):
         response = self.client.get('/user/dummy/')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context['bookmarks'].count(), 1)
+        self.assertContains(response, '1 bookmarks in total')
 
     def test_user_all_own_bookmarks(self):
         """
@@ -52,6 +62,7 @@ class UserBookmarkListTestCase(TestCase):
             response.context['bookmarks'].filter(is_public=False).count(),
             1
         )
+        self.assertContains(response, '2 bookmarks in total')
 
     def test_superuser_all_bookmarks(self):
         """
@@ -0,0 +1,154 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils.timezone import now
+
+from .. import webhooks
+from ..models import Bookmark, Webhook
+from ..webhooks import Dispatcher, sign
+from .utils import QuietHandler, StubServer
+
+
+class ReceiverHandler(QuietHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append(
+            (self.path, self.headers, body, self.client_address[1])
+        )
+        self.respond(500 if self.path == '/fail' else 204)
+
+
+class WebhookTestCase(TestCase):
+    fixtures = ['bookmark', 'tag', 'user']
+
+    @classmethod
+    def setUpClass(cls):
+        super(WebhookTestCase, cls).setUpClass()
+        cls.server = StubServer(ReceiverHandler).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__(None, None, None)
+        super(WebhookTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        settle = mock.patch('marcador.webhooks.SETTLE', timedelta(0))
+        settle.start()
+        self.addCleanup(settle.stop)
+        self.server.httpd.received = self.received = []
+        self.dispatcher = Dispatcher(
+            batch_size=10, concurrency=2, timeout=2, allow_private=True
+        )
+        self.addCleanup(self.dispatcher.close)
+        self.owner = User.objects.get(pk=2)
+
+    def create(self, path='/hook'):
+        return Webhook.objects.create(
+            owner=self.owner, webhook_url=self.server.url(path)
+        )
+
+    def test_batched_delivery(self):
+        """
+        Changes of the owner's bookmarks since the webhook was created
+        should be delivered in one signed request.
+        """
+        webhook = self.create()
+        bookmark = Bookmark.objects.create(
+            bookmark_url='http://localhost/', owner=self.owner
+        )
+        bookmark.title = 'changed'
+        bookmark.save()
+        Bookmark.objects.get(pk=2).delete()
+        Bookmark.objects.get(pk=3).save()
+
+        self.assertEqual(self.dispatcher.deliver(), 1)
+        self.assertEqual(len(self.received), 1)
+        path, headers, body, _ = self.received[0]
+        self.assertEqual(
+            headers['X-Marcador-Signature'],
+            'sha256=' + sign(webhook.secret, headers['X-Marcador-Timestamp'], body)
+        )
+        events = json.loads(body.decode('utf-8'))['events']
+        self.assertEqual(
+            [(event['type'], event['bookmark']['id']) for event in events],
+            [('bookmark.created', bookmark.pk),
+             ('bookmark.updated', bookmark.pk),
+             ('bookmark.deleted', 2)]
+        )
+        self.assertEqual(events[1]['bookmark']['title'], 'changed')
+
+        webhook.refresh_from_db()
+        self.assertEqual(webhook.cursor, events[-1]['id'])
+        self.assertEqual(webhook.events_delivered, 3)
+        self.assertIsNotNone(webhook.lag)
+        self.assertGreater(webhook.throughput, 0)
+        self.assertEqual(self.dispatcher.deliver(), 0)
+        self.assertEqual(len(self.received), 1)
+
+    def test_batch_size(self):
+        """Events beyond the batch size should follow in the next request."""
+        webhook = self.create()
+        dispatcher = Dispatcher(batch_size=2, allow_private=True)
+        self.addCleanup(dispatcher.close)
+        for path in ('a', 'b', 'c'):
+            Bookmark.objects.create(
+                bookmark_url=f'http://localhost/{path}', owner=self.owner
+            )
+        self.assertEqual(dispatcher.deliver(), 1)
+        self.assertEqual(dispatcher.deliver(), 1)
+        self.assertEqual(dispatcher.deliver(), 0)
+        self.assertEqual(
+            [len(json.loads(body.decode('utf-8'))['events'])
+             for _, _, body, _ in self.received],
+            [2, 1]
+        )
+        # both requests went over the same connection
+        self.assertEqual(self.received[0][3], self.received[1][3])
+        webhook.refresh_from_db()
+        self.assertEqual(webhook.events_delivered, 3)
+
+    def test_retry_with_backoff(self):
+        """
+        Failed deliveries should be retried later, and webhooks that
+        keep failing deactivated.
+        """
+        webhook = self.create('/fail')
+        cursor = webhook.cursor
+        Bookmark.objects.get(pk=1).save()
+        self.assertEqual(self.dispatcher.deliver(), 1)
+        webhook.refresh_from_db()
+        self.assertEqual(webhook.failures, 1)
+        self.assertEqual(webhook.last_error, 'HTTP 500')
+        self.assertEqual(webhook.cursor, cursor)
+        self.assertGreater(webhook.next_attempt, now())
+        self.assertEqual(self.dispatcher.deliver(), 0)
+
+        Webhook.objects.filter(pk=webhook.pk).update(
+            next_attempt=now(), failures=webhooks.MAX_FAILURES - 1
+        )
+        self.assertEqual(self.dispatcher.deliver(), 1)
+        webhook.refresh_from_db()
+        self.assertFalse(webhook.is_active)
+        self.assertEqual(len(self.received), 2)
+
+    def test_private_addresses(self):
+        """Endpoints on non-public addresses should not be connected to."""
+        webhook = self.create()
+        Bookmark.objects.get(pk=1).save()
+        dispatcher = Dispatcher(timeout=2)
+        self.addCleanup(dispatcher.close)
+        self.assertEqual(dispatcher.deliver(), 1)
+        webhook.refresh_from_db()
+        self.assertEqual(webhook.failures, 1)
+        self.assertIn('non-public address 127.0.0.1', webhook.last_error)
+        self.assertEqual(self.received, [])
+
+    def test_claim(self):
+        """A claimed webhook should not be claimed again."""
+        webhook = self.create()
+        Bookmark.objects.get(pk=1).save()
+        self.assertEqual(webhooks.claim(10), [webhook])
+        self.assertEqual(webhooks.claim(10), [])
@@ -1,6 +1,7 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, UpdateView, DeleteView
@@ -8,7 +9,10 @@ from django.views.generic import CreateView, UpdateView, DeleteView
 from django_filters.views import FilterView
 
 from marcador_api.filters import BookmarkFilter
+from . import caching
 from .models import Bookmark
+from .recent import is_first_page, recent_bookmarks
+from .stats import get_stats
 
 __all__ = (
     'BookmarkList',
@@ -19,18 +23,98 @@ __all__ = (
 )
 
 
-class BookmarkList(FilterView):
+# stands in for the CSRF token of every visitor in cached responses
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+
+
+class AnonymousCacheMixin:
+    """
+    Cache the complete responses of anonymous GET requests.
+
+    Views call `depend_on()` with the version keys of the data they
+    read, before reading it; bumping any of these keys invalidates the
+    cached responses.
+
+    The CSRF token of the login form differs per visitor, so responses
+    are rendered with a placeholder, which is replaced by the token of
+    the visitor when served. This also sets the visitor's CSRF cookie.
+    """
+    dependencies = None
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super(AnonymousCacheMixin, self).get(request, *args, **kwargs)
+
+        def build():
+            self.dependencies = {}
+            response = super(AnonymousCacheMixin, self).get(
+                request, *args, **kwargs
+            )
+            response.render()
+            return response, self.dependencies
+
+        key = caching.response_key(request.path, self.get_cache_params())
+        response = caching.cached_response(key, build)
+        placeholder = CSRF_PLACEHOLDER.encode('ascii')
+        if placeholder in response.content:
+            response.content = response.content.replace(
+                placeholder, get_token(request).encode('ascii')
+            )
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super(AnonymousCacheMixin, self).get_context_data(**kwargs)
+        if self.dependencies is not None:
+            # rendered for the cache, see above
+            context['csrf_token'] = CSRF_PLACEHOLDER
+        return context
+
+    def depend_on(self, *names):
+        if self.dependencies is not None:
+            self.dependencies.update(caching.versions(*names))
+
+    def get_cache_params(self):
+        """
+        Return the query parameters that change the response, sorted.
+
+        Unknown and empty parameters are dropped and the first page is
+        requested without a page number, so that equivalent URLs share
+        an entry.
+        """
+        names = tuple(self.filterset_class.base_filters)
+        params = []
+        for key, values in sorted(self.request.GET.lists()):
+            if key == self.page_kwarg:
+                values = [value for value in values if value != '1']
+            elif not any(key == name or key.startswith(name + '_')
+                         for name in names):
+                continue
+            params.extend((key, value) for value in sorted(values) if value)
+        return params
+
+
+class BookmarkList(AnonymousCacheMixin, FilterView):
     model = Bookmark
     context_object_name = 'bookmarks'
     template_name = 'marcador/bookmark_list.html'
     filterset_class = BookmarkFilter
+    paginate_by = 10
 
     def get_queryset(self):
-        bookmarks = Bookmark.public.all()
+        self.depend_on('public', 'tags')
+        bookmarks = Bookmark.public.with_related()
         return bookmarks
 
+    def paginate_queryset(self, queryset, page_size):
+        # the unfiltered first page is served from memory
+        if (is_first_page(self.request.GET, self.page_kwarg) and
+                recent_bookmarks.can_serve(page_size)):
+            page = recent_bookmarks.first_page(page_size)
+            return page.paginator, page, page.object_list, page.has_other_pages()
+        return super(BookmarkList, self).paginate_queryset(queryset, page_size)
+
 
-class UserBookmarkList(FilterView):
+class UserBookmarkList(AnonymousCacheMixin, FilterView):
     context_object_name = 'bookmarks'
     template_name = 'marcador/bookmark_user.html'
     filterset_class = BookmarkFilter
@@ -42,15 +126,21 @@ class UserBookmarkList(FilterView):
     def get_queryset(self):
         username = self.kwargs['username']
         self.user = get_object_or_404(User, username=username)
+        self.depend_on('tags', f'owner:{self.user.pk}')
         if self.request.user == self.user or self.request.user.is_superuser:
             bookmarks = self.user.bookmarks.all()
         else:
             bookmarks = Bookmark.public.filter(owner__username=username)
-        return bookmarks
+        return bookmarks.with_related()
 
     def get_context_data(self, **kwargs):
         context = super(UserBookmarkList, self).get_context_data(**kwargs)
         context['owner'] = self.user
+        stats = get_stats(self.user)
+        if self.request.user == self.user or self.request.user.is_superuser:
+            context['bookmark_count'] = stats.bookmarks
+        else:
+            context['bookmark_count'] = stats.public_bookmarks
         return context
 
 
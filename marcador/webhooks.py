@@ -0,0 +1,227 @@
+"""
+Delivery of bookmark events to the webhooks of their owners.
+
+The change log (see `marcador.changes`) is written in the transaction
+of every bookmark write and serves as the outbox: each webhook keeps a
+cursor into the changes of its owner. Workers (see the
+``deliverwebhooks`` command) claim due webhooks, send up to
+`BATCH_SIZE` events per request over connections kept open per
+endpoint, and move the cursor on success. Failed deliveries are retried
+with exponential backoff; webhooks that keep failing are deactivated.
+
+Requests are signed with the secret of the webhook: the
+``X-Marcador-Signature`` header is ``sha256=`` and the hex HMAC-SHA256
+of the timestamp in ``X-Marcador-Timestamp``, a dot and the body.
+Events may be delivered more than once; their ``id`` is the sequence
+number of their change.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from django.utils.timezone import now
+
+from .changes import SETTLE, serialize
+from .httpclient import HTTPClient
+from .jobs import backoff
+from .models import Bookmark, BookmarkChange, Webhook
+
+__all__ = ('sign', 'claim', 'Dispatcher', 'deliver')
+
+USER_AGENT = 'Marcador-Webhooks/1.0'
+BATCH_SIZE = getattr(settings, 'MARCADOR_WEBHOOK_BATCH_SIZE', 100)
+MAX_FAILURES = getattr(settings, 'MARCADOR_WEBHOOK_MAX_FAILURES', 20)
+# a claimed webhook is not claimed again before, even if its worker died
+LEASE = timedelta(minutes=5)
+
+
+def sign(secret, timestamp, body):
+    message = str(timestamp).encode('ascii') + b'.' + body
+    return hmac.new(secret.encode('ascii'), message, hashlib.sha256).hexdigest()
+
+
+def _pending(settled):
+    return BookmarkChange.objects.filter(
+        owner=OuterRef('owner'), pk__gt=OuterRef('cursor'), date__lte=settled
+    )
+
+
+def claim(limit, when=None):
+    """Claim up to `limit` active webhooks with due events."""
+    when = when or now()
+    due = (
+        Webhook.objects.filter(is_active=True, next_attempt__lte=when)
+        .annotate(pending=Exists(_pending(when - SETTLE)))
+        .filter(pending=True)
+        .order_by('next_attempt')
+        .values_list('pk', 'next_attempt')
+    )
+    pks = []
+    for pk, next_attempt in due[:limit * 2]:
+        # another worker may have claimed it since it was read
+        if Webhook.objects.filter(pk=pk, next_attempt=next_attempt).update(
+                next_attempt=when + LEASE):
+            pks.append(pk)
+            if len(pks) == limit:
+                break
+    return list(Webhook.objects.filter(pk__in=pks))
+
+
+def _load(pks, chunk_size=500):
+    pks = sorted(pks)
+    bookmarks = {}
+    for offset in range(0, len(pks), chunk_size):
+        chunk = list(
+            Bookmark.objects.with_related()
+            .filter(pk__in=pks[offset:offset + chunk_size])
+        )
+        bookmarks.update(
+            (bookmark.pk, (bookmark.owner_id, data))
+            for bookmark, data in zip(chunk, serialize(chunk))
+        )
+    return bookmarks
+
+
+def _events(webhook, changes, bookmarks):
+    events = []
+    for pk, bookmark_id, action, date in changes:
+        if action == BookmarkChange.DELETED:
+            data = {'id': bookmark_id}
+        else:
+            owner, data = bookmarks.get(bookmark_id, (None, None))
+            if owner != webhook.owner_id:
+                # deleted or moved since, which is delivered later
+                continue
+        events.append({
+            'id': pk,
+            'type': f'bookmark.{action}',
+            'date': date.isoformat(),
+            'bookmark': data,
+        })
+    return events
+
+
+class Dispatcher:
+    """
+    Deliver batches of events to webhooks.
+
+    Requests to up to `concurrency` endpoints are in flight at once.
+    Connections are kept open per endpoint between deliveries, so keep
+    a dispatcher around instead of creating one per delivery. Endpoints
+    on non-public addresses are refused unless `allow_private` is set.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, concurrency=8, timeout=10.0,
+                 allow_private=False):
+        self.batch_size = batch_size
+        self.client = HTTPClient(
+            timeout=timeout, user_agent=USER_AGENT, allow_private=allow_private
+        )
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def close(self):
+        self.executor.shutdown()
+        self.client.close()
+
+    def deliver(self, limit=100):
+        """
+        Deliver a batch to each of up to `limit` due webhooks. Returns
+        the number of webhooks served.
+        """
+        when = now()
+        webhooks = claim(limit, when)
+        batches = [
+            list(
+                BookmarkChange.objects.filter(
+                    owner_id=webhook.owner_id, pk__gt=webhook.cursor,
+                    date__lte=when - SETTLE,
+                )
+                .order_by('pk')
+                .values_list('pk', 'bookmark_id', 'action', 'date')
+                [:self.batch_size]
+            )
+            for webhook in webhooks
+        ]
+        bookmarks = _load({
+            bookmark_id for changes in batches
+            for _, bookmark_id, _, _ in changes
+        })
+        events = [
+            _events(webhook, changes, bookmarks)
+            for webhook, changes in zip(webhooks, batches)
+        ]
+        # only the requests run in threads, the database is written here
+        results = self.executor.map(self.send, webhooks, events)
+        for webhook, changes, sent, (elapsed, error) in zip(
+                webhooks, batches, events, results):
+            self.record(webhook, changes, sent, elapsed, error)
+        return len(webhooks)
+
+    def send(self, webhook, events):
+        """
+        POST `events` to `webhook`. Returns the seconds it took, or None
+        and the error if it failed.
+        """
+        if not events:
+            return 0.0, ''
+        body = json.dumps({'webhook': webhook.pk, 'events': events}).encode('utf-8')
+        timestamp = int(time.time())
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Marcador-Timestamp': str(timestamp),
+            'X-Marcador-Signature': 'sha256=' + sign(webhook.secret, timestamp, body),
+        }
+        started = time.monotonic()
+        try:
+            response = self.client.request(
+                'POST', webhook.webhook_url, body, headers,
+                max_bytes=1024, max_redirects=0,
+            )
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            return None, f'{type(e).__name__}: {e}'
+        if not 200 <= response.status < 300:
+            return None, f'HTTP {response.status}'
+        return time.monotonic() - started, ''
+
+    def record(self, webhook, changes, events, elapsed, error):
+        """Store the outcome of a delivery and schedule the next one."""
+        when = now()
+        webhooks = Webhook.objects.filter(pk=webhook.pk)
+        if elapsed is None:
+            failures = webhook.failures + 1
+            webhooks.update(
+                failures=failures,
+                next_attempt=when + timedelta(seconds=backoff(failures)),
+                last_error=error,
+                is_active=failures < MAX_FAILURES,
+            )
+            return
+        changed = {
+            'cursor': changes[-1][0],
+            'failures': 0,
+            'next_attempt': when,
+            'last_error': '',
+        }
+        if events:
+            changed.update(
+                last_delivery=when,
+                lag=(when - changes[0][3]).total_seconds(),
+                events_delivered=F('events_delivered') + len(events),
+                delivery_time=F('delivery_time') + elapsed,
+            )
+        webhooks.update(**changed)
+
+
+def deliver(limit=100, **options):
+    """Deliver a batch to each of up to `limit` due webhooks."""
+    dispatcher = Dispatcher(**options)
+    try:
+        return dispatcher.deliver(limit)
+    finally:
+        dispatcher.close()
@@ -1,16 +1,40 @@
+from django.core.exceptions import ValidationError
+from django_filters import fields
 from django_filters import rest_framework as filters
 
 from marcador.models import Bookmark, Tag
+from marcador.tagcache import tag_cache
+
+
+class TagNameField(fields.ModelChoiceField):
+    """A tag by its name, resolved through the tag cache."""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        tag = tag_cache.by_name([value]).get(value)
+        if tag is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice'
+            )
+        return tag
+
+
+class TagNameFilter(filters.ModelChoiceFilter):
+    field_class = TagNameField
 
 
 class BookmarkFilter(filters.FilterSet):
     date_created = filters.IsoDateTimeFromToRangeFilter()
     date_updated = filters.IsoDateTimeFromToRangeFilter()
-    tags = filters.ModelChoiceFilter(
+    tags = TagNameFilter(
         queryset=Tag.objects.all(),
         to_field_name='name',
     )
+    link_status = filters.ChoiceFilter(choices=Bookmark.LINK_STATUS_CHOICES)
+    link_checked_at = filters.IsoDateTimeFromToRangeFilter()
 
     class Meta:
         model = Bookmark
-        fields = ['date_created', 'date_updated', 'tags']
+        fields = ['date_created', 'date_updated', 'tags',
+                  'link_status', 'link_status_code', 'link_checked_at']
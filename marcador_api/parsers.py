@@ -0,0 +1,28 @@
+"""
+Parsers matching the renderers of `marcador_api.renderers`.
+"""
+import msgpack
+import orjson
+
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+__all__ = ('JSONParser', 'MessagePackParser')
+
+
+class JSONParser(parsers.JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(parsers.BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except ValueError as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
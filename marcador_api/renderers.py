@@ -0,0 +1,56 @@
+"""
+Faster renderers for the API.
+
+`JSONRenderer` encodes with orjson, which writes dicts (including DRF's
+`ReturnDict` and `OrderedDict`), lists and datetimes natively, and only
+falls back to DRF's encoder for other types such as `Decimal` or lazy
+strings. `MessagePackRenderer` serves ``application/msgpack`` for
+internal consumers.
+"""
+import msgpack
+import orjson
+
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+__all__ = ('JSONRenderer', 'MessagePackRenderer')
+
+# the same escaping as DRF, so responses stay safe to embed in scripts
+LINE_SEPARATOR = '\u2028'.encode('utf-8')
+PARAGRAPH_SEPARATOR = '\u2029'.encode('utf-8')
+
+
+def _default(obj):
+    return JSONEncoder().default(obj)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            # only the browsable API and explicit requests indent
+            return super(JSONRenderer, self).render(
+                data, accepted_media_type, renderer_context
+            )
+        ret = orjson.dumps(data, default=_default, option=self.options)
+        return ret.replace(LINE_SEPARATOR, b'\\u2028').replace(
+            PARAGRAPH_SEPARATOR, b'\\u2029'
+        )
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=_default, use_bin_type=True, datetime=True
+        )
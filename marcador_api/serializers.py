@@ -1,8 +1,64 @@
 from django.contrib.auth.models import User
 
+from django.core.exceptions import ObjectDoesNotExist
+
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from marcador.models import (
+    Bookmark, DuplicateBookmark, Tag, UserStats, Webhook
+)
+from marcador.tagcache import tag_cache
+
+
+class TagRelatedField(serializers.HyperlinkedRelatedField):
+    """
+    A tag by its URL, resolved through the tag cache. With ``many=True``
+    all tags of the input are resolved at once.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('view_name', 'marcador_api:tag-detail')
+        if not kwargs.get('read_only'):
+            kwargs.setdefault('queryset', Tag.objects.all())
+        super(TagRelatedField, self).__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return TagsField(**list_kwargs)
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        # only the id, the tags are looked up together by `resolve`
+        try:
+            return int(view_kwargs[self.lookup_url_kwarg])
+        except (KeyError, ValueError):
+            raise ObjectDoesNotExist
+
+    def to_id(self, data):
+        return super(TagRelatedField, self).to_internal_value(data)
+
+    def to_internal_value(self, data):
+        return self.resolve([self.to_id(data)])[0]
+
+    def resolve(self, ids):
+        tags = tag_cache.by_id(ids)
+        if not tags.keys() >= set(ids):
+            self.fail('does_not_exist')
+        return [tags[pk] for pk in ids]
+
 
-from marcador.models import Bookmark, Tag
+class TagsField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        return child.resolve([child.to_id(item) for item in data])
 
 
 class TagSerializer(serializers.HyperlinkedModelSerializer):
@@ -14,28 +70,48 @@ class TagSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
+class TagMergeSerializer(serializers.Serializer):
+    tags = TagRelatedField(many=True, allow_empty=False)
+
+
+class TagRenameSerializer(serializers.Serializer):
+    name = serializers.CharField(
+        max_length=Tag._meta.get_field('name').max_length
+    )
+
+
 class BookmarkSerializer(serializers.HyperlinkedModelSerializer):
+    tags = TagRelatedField(many=True, required=False)
+
     class Meta:
         model = Bookmark
         fields = ['url', 'id', 'bookmark_url', 'title', 'description',
-                  'is_public', 'date_created', 'date_updated', 'owner', 'tags']
+                  'is_public', 'date_created', 'date_updated', 'owner', 'tags',
+                  'link_status', 'link_status_code', 'link_checked_at']
         extra_kwargs = {
             'url': {'view_name': 'marcador_api:bookmark-detail'},
             'date_created': {'read_only': True},
             'date_updated': {'read_only': True},
+            'link_status': {'read_only': True},
+            'link_status_code': {'read_only': True},
+            'link_checked_at': {'read_only': True},
             'owner': {
                 'view_name': 'marcador_api:user-detail',
                 'lookup_field': 'username',
                 'read_only': True
             },
-            'tags': {
-                'view_name': 'marcador_api:tag-detail',
-                'queryset': Tag.objects.all(),
-                'many': True
-            },
         }
 
 
+class DuplicateBookmarkSerializer(serializers.ModelSerializer):
+    bookmark = BookmarkSerializer(read_only=True)
+    duplicate = BookmarkSerializer(read_only=True)
+
+    class Meta:
+        model = DuplicateBookmark
+        fields = ['bookmark', 'duplicate', 'similarity', 'date_found']
+
+
 class NestedBookmarkSerializer(serializers.HyperlinkedModelSerializer):
     tags = TagSerializer(many=True)
 
@@ -60,3 +136,75 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
                 'lookup_field': 'username'
             },
         }
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserStats
+        fields = ['bookmarks', 'public_bookmarks', 'tags', 'last_activity']
+
+
+class PublicUserStatsSerializer(serializers.ModelSerializer):
+    # not `last_activity`, which private bookmarks move too
+    bookmarks = serializers.IntegerField(source='public_bookmarks')
+
+    class Meta:
+        model = UserStats
+        fields = ['bookmarks']
+
+
+class WebhookSerializer(serializers.HyperlinkedModelSerializer):
+    throughput = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Webhook
+        fields = ['url', 'id', 'webhook_url', 'is_active', 'secret',
+                  'date_created', 'failures', 'next_attempt', 'last_error',
+                  'last_delivery', 'lag', 'events_delivered', 'throughput']
+        read_only_fields = ['date_created', 'failures', 'next_attempt',
+                            'last_error', 'last_delivery', 'lag',
+                            'events_delivered']
+        extra_kwargs = {
+            'url': {'view_name': 'marcador_api:webhook-detail'},
+        }
+
+
+class BookmarkChangesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Bookmark
+        fields = ['title', 'description', 'is_public']
+        extra_kwargs = {
+            'title': {'required': False},
+            'description': {'required': False},
+            'is_public': {'required': False},
+        }
+
+
+class BookmarkBatchSerializer(serializers.Serializer):
+    OPERATIONS = ['update', 'add_tags', 'remove_tags', 'delete']
+    # bookmarks selected at most, by ids or by a filter
+    MAX_BOOKMARKS = 10000
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False,
+        allow_empty=False, max_length=MAX_BOOKMARKS
+    )
+    filter = serializers.DictField(required=False)
+    operation = serializers.ChoiceField(OPERATIONS)
+    changes = BookmarkChangesSerializer(required=False)
+    tags = TagRelatedField(many=True, required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError(
+                'Select bookmarks either by `ids` or by `filter`.'
+            )
+        if data['operation'] == 'update' and not data.get('changes'):
+            raise serializers.ValidationError(
+                {'changes': 'This field is required to update bookmarks.'}
+            )
+        if data['operation'] in ('add_tags', 'remove_tags') and not data.get('tags'):
+            raise serializers.ValidationError(
+                {'tags': 'This field is required to change tags.'}
+            )
+        return data
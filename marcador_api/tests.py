@@ -1,10 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import msgpack
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.timezone import utc
 
-from rest_framework import status
+from rest_framework import renderers, status
 from rest_framework.test import APITestCase
 
-from marcador.models import Bookmark, Tag
+from marcador.duplicates import update_duplicates
+from marcador.models import Bookmark, Tag, Webhook
+from marcador.related import update_related
+from marcador.stats import rebuild
+from marcador.stream import Publisher
+from marcador_api.renderers import JSONRenderer
+from marcador_api.serializers import BookmarkBatchSerializer
+from marcador_api.throttling import parse_rate, take
 
 
 class TagViewSetTestCase(APITestCase):
@@ -186,10 +210,56 @@ class TagViewSetTestCase(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_superuser_can_merge_tags(self):
+        """
+        Superusers should be able to merge tags; bookmarks tagged with
+        several of them keep a single tag.
+        """
+        js = Tag.objects.create(name='js')
+        bookmark = Bookmark.objects.create(
+            bookmark_url='http://example.com/', owner=self.user
+        )
+        bookmark.tags.add(self.tag, js)
+        self.client.force_login(user=self.superuser)
+        response = self.client.post(
+            reverse('marcador_api:tag-merge', kwargs={'pk': self.tag.pk}),
+            {'tags': [reverse(self.detail_view, kwargs={'pk': js.pk})]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bookmarks_changed'], 1)
+        self.assertFalse(Tag.objects.filter(name='js').exists())
+        self.assertEqual(list(bookmark.tags.all()), [self.tag])
+
+    def test_superuser_can_rename_a_tag_to_a_taken_name(self):
+        """
+        Renaming a tag to the name of another tag should merge them.
+        """
+        other = Tag.objects.create(name='other')
+        self.client.force_login(user=self.superuser)
+        response = self.client.post(
+            reverse('marcador_api:tag-rename', kwargs={'pk': other.pk}),
+            {'name': 'test'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.tag.pk)
+        self.assertFalse(Tag.objects.filter(name='other').exists())
+
+    def test_authenticated_cannot_merge_tags(self):
+        other = Tag.objects.create(name='other')
+        self.client.force_login(user=self.user)
+        response = self.client.post(
+            reverse('marcador_api:tag-merge', kwargs={'pk': self.tag.pk}),
+            {'tags': [reverse(self.detail_view, kwargs={'pk': other.pk})]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class BookmarkViewSetTestCase(APITestCase):
     list_view = 'marcador_api:bookmark-list'
     detail_view = 'marcador_api:bookmark-detail'
+    tag_view = 'marcador_api:tag-detail'
 
     def setUp(self):
         self.user_a = User.objects.create(username='testA', password='pass123')
@@ -342,6 +412,60 @@ class BookmarkViewSetTestCase(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_tags_are_resolved_together(self):
+        """
+        The tags of a new bookmark should be looked up in one query, and
+        not at all once they are cached.
+        """
+        tags = [Tag.objects.create(name=f'tag{i}') for i in range(15)]
+        urls = [reverse(self.tag_view, args=[tag.pk]) for tag in tags]
+        self.client.force_login(user=self.user_a)
+        for expected in (1, 0):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse(self.list_view),
+                    {'bookmark_url': 'https://www.test.com/', 'tags': urls},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            # looking up tags, not saving or serializing the tagging
+            tag_queries = [
+                query for query in queries
+                if 'FROM "marcador_tag" WHERE' in query['sql']
+            ]
+            self.assertEqual(len(tag_queries), expected)
+        self.assertEqual(
+            set(Bookmark.objects.get(pk=response.data['id']).tags.all()),
+            set(tags)
+        )
+
+        response = self.client.post(
+            reverse(self.list_view),
+            {'bookmark_url': 'https://www.test.com/',
+             'tags': urls + [reverse(self.tag_view, args=[0])]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['tags'], ['Invalid hyperlink - Object does not exist.']
+        )
+
+    def test_authenticated_can_create_bookmarks_without_title(self):
+        """
+        The title of a bookmark is optional; it is filled in later from
+        the bookmarked page.
+        """
+        self.client.force_login(user=self.user_a)
+        response = self.client.post(
+            reverse(self.list_view),
+            {'bookmark_url': 'https://www.test.com/'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Bookmark.objects.get(pk=response.data['id']).metadata_status,
+            Bookmark.METADATA_PENDING
+        )
+
     def test_authenticated_can_update_an_own_public_bookmark(self):
         """
         Authenticated users should be able to perform the update action
@@ -541,6 +665,287 @@ class BookmarkViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
 
+    def test_filter_bookmarks_by_link_status(self):
+        """
+        All users should be able to filter the bookmarks by the outcome
+        of the last link check.
+        """
+        Bookmark.objects.filter(pk=self.public_b.pk).update(
+            link_status=Bookmark.LINK_BROKEN,
+            link_status_code=404,
+        )
+        response = self.client.get(
+            f'{reverse(self.list_view)}?link_status=broken'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['link_status_code'], 404)
+        response = self.client.get(
+            f'{reverse(self.list_view)}?link_status_code=404'
+        )
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_related_bookmarks_respect_visibility(self):
+        """
+        Related bookmarks should only list bookmarks the user may see.
+        """
+        update_related()
+        url = reverse('marcador_api:bookmark-related', kwargs={'pk': self.public_a.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+        self.client.force_login(user=self.user_a)
+        response = self.client.get(url)
+        self.assertEqual(
+            [bookmark['id'] for bookmark in response.data], [self.private_a.pk]
+        )
+
+        url = reverse('marcador_api:bookmark-related', kwargs={'pk': self.private_b.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_activity_counts_visible_bookmarks(self):
+        """
+        The activity histogram should only count the bookmarks the user
+        may see.
+        """
+        cache.clear()
+        url = reverse('marcador_api:bookmark-activity')
+        response = self.client.get(url, {'interval': 'week', 'tz': 'Asia/Tokyo'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['time_zone'], 'Asia/Tokyo')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['count'], 2)
+
+        self.client.force_login(user=self.user_a)
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['count'], 3)
+
+        self.client.force_login(user=self.superuser)
+        response = self.client.get(url, {'interval': 'month'})
+        self.assertEqual(response.data['results'][0]['count'], 4)
+
+    def test_activity_rejects_unknown_parameters(self):
+        url = reverse('marcador_api:bookmark-activity')
+        response = self.client.get(url, {'interval': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'tz': 'Mars/Olympus_Mons'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('marcador.changes.SETTLE', timedelta(0))
+    def test_authenticated_can_sync_changes(self):
+        """
+        Authenticated users should be able to read the changes to their
+        bookmarks since a token, including deletions.
+        """
+        url = reverse('marcador_api:bookmark-changes')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_login(user=self.user_a)
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'], [])
+        token = response.data['next']
+
+        self.client.patch(
+            reverse(self.detail_view, kwargs={'pk': self.public_a.pk}),
+            {'title': 'changed'}
+        )
+        self.client.delete(
+            reverse(self.detail_view, kwargs={'pk': self.private_a.pk})
+        )
+        self.public_b.save()
+        response = self.client.get(url, {'since': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(
+            [(result['id'], result['action']) for result in results],
+            [(self.public_a.pk, 'updated'), (self.private_a.pk, 'deleted')]
+        )
+        self.assertEqual(results[0]['bookmark']['title'], 'changed')
+        self.assertIsNone(results[1]['bookmark'])
+
+        response = self.client.get(url, {'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stream_public_bookmarks(self):
+        """
+        Anyone should be able to stream public bookmarks and resume
+        with the id of the last event.
+        """
+        publisher = Publisher(threaded=False)
+        patcher = mock.patch('marcador_api.views.publisher', publisher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.public_b.save()
+        publisher.poll()
+        event_id = publisher.events[-1].id
+
+        self.public_a.save()
+        self.private_a.save()
+        publisher.poll()
+        response = self.client.get(
+            reverse('marcador_api:bookmark-stream'), {'owner': 'testA'},
+            HTTP_LAST_EVENT_ID=str(event_id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        content = iter(response.streaming_content)
+        self.assertEqual(next(content), b'retry: 1000\n\n')
+        message = next(content).decode('utf-8')
+        self.assertEqual(message.count('event: bookmark'), 1)
+        self.assertIn(f'"id": {self.public_a.pk}', message)
+        response.close()
+        self.assertEqual(publisher.subscribers, 0)
+
+    def test_stream_limit(self):
+        publisher = Publisher(threaded=False, max_per_client=1)
+        patcher = mock.patch('marcador_api.views.publisher', publisher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        url = reverse('marcador_api:bookmark-stream')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        refused = self.client.get(url)
+        self.assertEqual(
+            refused.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(refused['Retry-After'], '30')
+        response.close()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response.close()
+
+    def test_authenticated_can_list_own_duplicates(self):
+        """
+        Authenticated users should see the possible duplicates among
+        their own bookmarks only.
+        """
+        duplicate = Bookmark.objects.create(
+            bookmark_url='https://www.example.com/?utm_source=feed',
+            title='Example',
+            owner=self.user_a,
+        )
+        update_duplicates()
+        url = reverse('marcador_api:bookmark-duplicates')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_login(user=self.user_a)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(pair['bookmark']['id'], pair['duplicate']['id'])
+             for pair in response.data['results']],
+            [(self.public_a.pk, duplicate.pk)]
+        )
+
+        self.client.force_login(user=self.user_b)
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'], [])
+
+    def test_authenticated_can_batch_update_own_bookmarks(self):
+        """
+        Authenticated users should be able to change many bookmarks at
+        once; foreign bookmarks are reported and left alone.
+        """
+        self.client.force_login(user=self.user_a)
+        ids = [self.public_a.pk, self.private_a.pk, self.public_b.pk,
+               self.private_b.pk, 999]
+        response = self.client.post(
+            reverse('marcador_api:bookmark-batch'),
+            {'ids': ids, 'operation': 'update',
+             'changes': {'is_public': False}},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            [200, 200, 403, 404, 404]
+        )
+        self.assertEqual(
+            Bookmark.objects.filter(is_public=False).count(), 3
+        )
+
+    def test_authenticated_can_batch_tag_filtered_bookmarks(self):
+        """
+        Bookmarks of a batch can be selected by the list filters.
+        """
+        self.client.force_login(user=self.user_a)
+        tag_url = reverse(self.tag_view, kwargs={'pk': self.test_tag_b.pk})
+        response = self.client.post(
+            reverse('marcador_api:bookmark-batch'),
+            {'filter': {'tags': 'testA'}, 'operation': 'add_tags',
+             'tags': [tag_url]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.test_tag_b.bookmark_set.count(), 4)
+
+        response = self.client.post(
+            reverse('marcador_api:bookmark-batch'),
+            {'ids': [self.public_a.pk], 'operation': 'remove_tags',
+             'tags': [tag_url]},
+            format='json'
+        )
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(self.test_tag_b.bookmark_set.count(), 3)
+
+    def test_batch_filter_selects_a_limited_number(self):
+        self.client.force_login(user=self.user_a)
+        with mock.patch.object(BookmarkBatchSerializer, 'MAX_BOOKMARKS', 1):
+            response = self.client.post(
+                reverse('marcador_api:bookmark-batch'),
+                {'filter': {'tags': 'testA'}, 'operation': 'delete'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('filter', response.data)
+        self.assertEqual(Bookmark.objects.count(), 4)
+
+    def test_superuser_can_batch_delete_bookmarks(self):
+        self.client.force_login(user=self.superuser)
+        response = self.client.post(
+            reverse('marcador_api:bookmark-batch'),
+            {'ids': [self.private_a.pk, self.private_b.pk],
+             'operation': 'delete'},
+            format='json'
+        )
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(Bookmark.objects.count(), 2)
+
+    def test_batch_requires_a_selection(self):
+        self.client.force_login(user=self.user_a)
+        response = self.client.post(
+            reverse('marcador_api:bookmark-batch'),
+            {'operation': 'delete'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_authenticated_cannot_batch(self):
+        response = self.client.post(
+            reverse('marcador_api:bookmark-batch'),
+            {'ids': [self.public_a.pk], 'operation': 'delete'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Bookmark.objects.count(), 4)
+
+    def test_browsable_api_links_extra_actions(self):
+        """The browsable API should link the actions in the namespace."""
+        response = self.client.get(
+            reverse(self.list_view), HTTP_ACCEPT='text/html'
+        )
+        self.assertEqual(
+            response.context['extra_actions']['Activity'],
+            'http://testserver' + reverse('marcador_api:bookmark-activity')
+        )
+
 
 class UserViewSetTestCase(APITestCase):
     list_view = 'marcador_api:user-list'
@@ -647,3 +1052,265 @@ class UserViewSetTestCase(APITestCase):
         self.assertEqual(len(response.data['results']), 2)
         self.assertEqual(response.data['results'][0]['title'], 'example uk')
         self.assertEqual(response.data['results'][1]['title'], 'example')
+
+    def test_user_activity_counts_visible_bookmarks(self):
+        cache.clear()
+        url = reverse('marcador_api:user-activity', kwargs={'username': 'test'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['count'], 1)
+
+        self.client.force_login(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['count'], 2)
+
+        response = self.client.get(
+            reverse('marcador_api:user-activity', kwargs={'username': 'nobody'})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_user_stats(self):
+        """
+        Users should see all their counters, others only the public ones.
+        """
+        url = reverse('marcador_api:user-stats', kwargs={'username': 'test'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bookmarks'], 1)
+        self.assertNotIn('tags', response.data)
+        # private bookmarks move it
+        self.assertNotIn('last_activity', response.data)
+
+        self.client.force_login(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.data['bookmarks'], 2)
+        self.assertEqual(response.data['public_bookmarks'], 1)
+        self.assertEqual(response.data['tags'], 1)
+
+    def test_users_can_be_ordered_by_bookmarks(self):
+        response = self.client.get(
+            reverse(self.list_view), {'ordering': '-bookmark_count'}
+        )
+        self.assertEqual(
+            [user['username'] for user in response.data['results']],
+            ['test', 'admin']
+        )
+
+    def test_users_cannot_be_ordered_by_activity(self):
+        """Ordering should not reveal when private bookmarks changed."""
+        rebuild()
+        results = [
+            self.client.get(
+                reverse(self.list_view), {'ordering': ordering}
+            ).data['results']
+            for ordering in ('last_activity', '-last_activity')
+        ]
+        self.assertEqual(results[0], results[1])
+
+
+class WebhookViewSetTestCase(APITestCase):
+    list_view = 'marcador_api:webhook-list'
+    detail_view = 'marcador_api:webhook-detail'
+
+    def setUp(self):
+        self.user_a = User.objects.create(username='testA', password='pass123')
+        self.user_b = User.objects.create(username='testB', password='pass456')
+        self.webhook_b = Webhook.objects.create(
+            owner=self.user_b, webhook_url='http://localhost/b'
+        )
+
+    def test_not_authenticated_cannot_read_webhooks(self):
+        response = self.client.get(reverse(self.list_view))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_authenticated_can_manage_own_webhooks(self):
+        """
+        Authenticated users should only see and change their own
+        webhooks, and activate them again after failures.
+        """
+        self.client.force_login(user=self.user_a)
+        response = self.client.post(
+            reverse(self.list_view), {'webhook_url': 'http://93.184.216.34/a'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['secret']), 64)
+        webhook = Webhook.objects.get(pk=response.data['id'])
+        self.assertEqual(webhook.owner, self.user_a)
+
+        response = self.client.get(reverse(self.list_view))
+        self.assertEqual(
+            [result['id'] for result in response.data['results']], [webhook.pk]
+        )
+        response = self.client.get(
+            reverse(self.detail_view, kwargs={'pk': self.webhook_b.pk})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        Webhook.objects.filter(pk=webhook.pk).update(
+            is_active=False, failures=20
+        )
+        response = self.client.patch(
+            reverse(self.detail_view, kwargs={'pk': webhook.pk}),
+            {'is_active': True, 'failures': 3}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        webhook.refresh_from_db()
+        self.assertTrue(webhook.is_active)
+        self.assertEqual(webhook.failures, 0)
+
+
+    def test_private_addresses_are_refused(self):
+        self.client.force_login(user=self.user_a)
+        for url in ('http://localhost/a', 'http://10.0.0.1/a',
+                    'http://169.254.169.254/latest/', 'http://[::1]/a'):
+            response = self.client.post(
+                reverse(self.list_view), {'webhook_url': url}
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST, url
+            )
+            self.assertIn('webhook_url', response.data)
+        self.assertFalse(Webhook.objects.filter(owner=self.user_a).exists())
+
+
+class ThrottleTestCase(APITestCase):
+    rates = {'read': '3/min', 'write': '2/min', 'bulk': '1/min'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create(username='testA', password='pass123')
+        self.bookmark = Bookmark.objects.create(
+            bookmark_url='http://example.com/', owner=self.user
+        )
+        rest_framework = dict(settings.REST_FRAMEWORK)
+        rest_framework['DEFAULT_THROTTLE_RATES'] = self.rates
+        override = override_settings(REST_FRAMEWORK=rest_framework)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_token_bucket(self):
+        """
+        Buckets should allow bursts up to their capacity and refill at
+        their rate.
+        """
+        self.assertEqual(parse_rate('60/min'), (60, 1000))
+        self.assertEqual(take('bucket', 2, 1000, now=0), 0)
+        self.assertEqual(take('bucket', 2, 1000, now=0), 0)
+        self.assertEqual(take('bucket', 2, 1000, now=0), 1.0)
+        self.assertEqual(take('bucket', 2, 1000, now=500), 0.5)
+        self.assertEqual(take('bucket', 2, 1000, now=1000), 0)
+        # an idle bucket fills up to its capacity only
+        self.assertEqual(take('bucket', 2, 1000, now=60000), 0)
+        self.assertEqual(take('bucket', 2, 1000, now=60000), 0)
+        self.assertEqual(take('bucket', 2, 1000, now=60000), 1.0)
+
+    def test_separate_budgets(self):
+        """
+        Reads, writes and bulk operations should be throttled per user
+        or address and separately, with a `Retry-After` header.
+        """
+        self.client.force_login(user=self.user)
+        url = reverse('marcador_api:bookmark-detail', kwargs={'pk': self.bookmark.pk})
+        for _ in range(2):
+            response = self.client.patch(url, {'title': 'changed'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, {'title': 'changed'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        batch = reverse('marcador_api:bookmark-batch')
+        data = {'ids': [self.bookmark.pk], 'operation': 'delete'}
+        response = self.client.post(batch, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(batch, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.client.logout()
+        url = reverse('marcador_api:tag-list')
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_production_requires_shared_cache(self):
+        """
+        Without DEBUG, the settings should refuse a throttle cache that
+        every process has for itself.
+        """
+        def load_settings(cache_url):
+            environ = dict(
+                os.environ, DJANGO_DEBUG='0', DJANGO_SECRET_KEY='secret',
+                DJANGO_CACHE_URL=cache_url,
+            )
+            return subprocess.run(
+                [sys.executable, '-c', 'import mysite.settings'],
+                env=environ, cwd=settings.BASE_DIR,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+
+        result = load_settings('locmem://')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn(b'Throttling needs a cache shared', result.stderr)
+        self.assertEqual(load_settings('memcached://127.0.0.1:11211').returncode, 0)
+
+
+class RendererTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testA', password='pass123')
+        self.bookmark = Bookmark.objects.create(
+            bookmark_url='http://example.com/',
+            title='line\u2028separator',
+            owner=self.user,
+        )
+
+    def test_json_renderer(self):
+        """
+        The JSON renderer should encode like DRF's, including dates,
+        decimals and ordered dicts.
+        """
+        data = OrderedDict([
+            ('date', datetime(2020, 5, 17, 14, 5, tzinfo=utc)),
+            ('price', Decimal('1.50')),
+            ('items', [1, 'two', None]),
+            ('text', 'line\u2028separator'),
+        ])
+        content = JSONRenderer().render(data)
+        self.assertEqual(
+            json.loads(content.decode('utf-8')),
+            json.loads(renderers.JSONRenderer().render(data).decode('utf-8'))
+        )
+        self.assertIn(b'"2020-05-17T14:05:00Z"', content)
+        self.assertIn(b'\\u2028', content)
+
+    def test_msgpack(self):
+        """
+        Clients should be able to read and write bookmarks as
+        MessagePack.
+        """
+        url = reverse('marcador_api:bookmark-list')
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            msgpack.unpackb(response.content, raw=False),
+            json.loads(self.client.get(url).content.decode('utf-8'))
+        )
+
+        self.client.force_login(user=self.user)
+        response = self.client.post(
+            url, msgpack.packb({'bookmark_url': 'http://localhost/', 'tags': []}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            msgpack.unpackb(response.content, raw=False)['bookmark_url'],
+            'http://localhost/'
+        )
+        response = self.client.post(
+            url, b'\xc1', content_type='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
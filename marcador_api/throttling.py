@@ -0,0 +1,102 @@
+"""
+Token-bucket throttling of the API, shared by all worker processes.
+
+Every client has a bucket per scope: ``read``, ``write`` and ``bulk``
+for the set-based operations. Buckets refill at the rates of the
+``DEFAULT_THROTTLE_RATES`` setting, e.g. ``'60/min'`` allows a burst of
+60 requests and then one per second. Authenticated clients are
+identified by their user, anonymous ones by their address.
+
+A bucket is a single integer in the cache: the time in milliseconds at
+which it is full again (the theoretical arrival time of GCRA). Taking a
+token is one atomic ``incr``, so the limits hold across processes
+without locking, as long as the cache backend increments atomically,
+like memcached or Redis do. The database cache does not, so concurrent
+requests may occasionally be granted the same token. A rejected request
+returns its token.
+
+The settings refuse to start without DEBUG when the cache
+``MARCADOR_THROTTLE_CACHE`` is local to every process.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import permissions
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+__all__ = ('parse_rate', 'take', 'TokenBucketThrottle')
+
+PREFIX = 'marcador:throttle:'
+CACHE = getattr(settings, 'MARCADOR_THROTTLE_CACHE', 'default')
+# idle buckets are full anyway, they only need to outlive a burst
+TIMEOUT = 24 * 3600
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Return the capacity and the milliseconds per token of a rate like
+    ``'60/min'``.
+    """
+    number, period = rate.split('/')
+    capacity = int(number)
+    return capacity, max(round(PERIODS[period[0]] * 1000 / capacity), 1)
+
+
+def take(key, capacity, interval, now=None):
+    """
+    Take a token from the bucket `key`. Returns 0 if one was taken,
+    otherwise the seconds until one is available.
+    """
+    cache = caches[CACHE]
+    if now is None:
+        now = int(time.time() * 1000)
+    try:
+        full = cache.incr(key, interval)
+    except ValueError:
+        # a new bucket, or one that expired, is full
+        if cache.add(key, now + interval, TIMEOUT):
+            return 0
+        full = cache.incr(key, interval)
+    if full - interval < now:
+        # The bucket was full: move it to the present. Requests racing
+        # with this one may lose their increment, they were granted.
+        cache.set(key, now + interval, TIMEOUT)
+        return 0
+    if full <= now + capacity * interval:
+        return 0
+    cache.decr(key, interval)
+    return (full - capacity * interval - now) / 1000
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle by the scope of the view's `throttle_scope` attribute, or
+    ``read`` or ``write`` by the request method.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        if request.method in permissions.SAFE_METHODS:
+            return 'read'
+        return 'write'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        if request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        self.delay = take(f'{PREFIX}{scope}:{ident}', *parse_rate(rate))
+        return not self.delay
+
+    def wait(self):
+        return self.delay
@@ -9,8 +9,10 @@ router = DefaultRouter()
 router.register(r'tags', views.TagViewSet)
 router.register(r'bookmarks', views.BookmarkViewSet)
 router.register(r'users', views.UserViewSet)
+router.register(r'webhooks', views.WebhookViewSet)
 
 app_name = MarcadorApiConfig.name
 urlpatterns = [
+    url(r'^bookmarks/stream/$', views.bookmark_stream, name='bookmark-stream'),
     url('^', include(router.urls)),
 ]
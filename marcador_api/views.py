@@ -1,14 +1,31 @@
+import pytz
 from django.contrib.auth.models import User
-from django.db.models import Prefetch, Q
+from django.db import transaction
+from django.db.models import F, Prefetch, Q, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.utils import timezone
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from rest_framework import generics
 from rest_framework import permissions
+from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
 
-from marcador.models import Bookmark, Tag
+from marcador import bulk
+from marcador.activity import INTERVALS, histogram
+from marcador.changes import ExpiredToken, InvalidToken, read_changes
+from marcador.models import (
+    Bookmark, DuplicateBookmark, RelatedBookmark, Tag, Webhook
+)
+from marcador.recent import is_first_page, recent_bookmarks
+from marcador.stats import get_stats
+from marcador.stream import RETRY_AFTER, Full, publisher, stream
 from .filters import BookmarkFilter
 from .permissions import (
     IsOwnerOrReadOnly,
@@ -16,14 +33,94 @@ from .permissions import (
     IsPublicOrOwnerOrSuperuser
 )
 from .serializers import (
+    BookmarkBatchSerializer,
     BookmarkSerializer,
+    DuplicateBookmarkSerializer,
     NestedBookmarkSerializer,
+    PublicUserStatsSerializer,
+    TagMergeSerializer,
+    TagRenameSerializer,
     TagSerializer,
-    UserSerializer
+    UserSerializer,
+    UserStatsSerializer,
+    WebhookSerializer
 )
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class NamespacedActionsMixin:
+    """
+    Link the extra actions in the browsable API within the namespace the
+    view set is routed in.
+    """
+
+    def get_extra_action_url_map(self):
+        basename = self.basename
+        namespace = self.request.resolver_match.namespace
+        if namespace:
+            self.basename = f'{namespace}:{basename}'
+        try:
+            return super(NamespacedActionsMixin, self).get_extra_action_url_map()
+        finally:
+            self.basename = basename
+
+
+def activity_response(request, bookmarks, dependencies):
+    """
+    Respond with the histogram of `bookmarks` for the `interval` and the
+    time zone `tz` of the query parameters.
+    """
+    interval = request.query_params.get('interval', 'day')
+    if interval not in INTERVALS:
+        raise ValidationError(
+            {'interval': [f'Must be one of: {", ".join(INTERVALS)}.']}
+        )
+    tzinfo = timezone.get_current_timezone()
+    if 'tz' in request.query_params:
+        try:
+            tzinfo = pytz.timezone(request.query_params['tz'])
+        except pytz.UnknownTimeZoneError:
+            raise ValidationError({'tz': ['Unknown time zone.']})
+    counts = histogram(bookmarks, interval, tzinfo, dependencies)
+    return Response({
+        'interval': interval,
+        'time_zone': str(tzinfo),
+        'results': [{'date': day, 'count': count} for day, count in counts],
+    })
+
+
+def bookmark_stream(request):
+    """
+    Stream newly created or updated public bookmarks as Server-Sent
+    Events, optionally only those with the tag `tags` or of the user
+    `owner`. Clients resume with the `Last-Event-ID` header.
+
+    Clients are turned away with 503 while the process has as many
+    subscribers as it allows, or they have.
+    """
+    try:
+        last_event_id = int(request.META['HTTP_LAST_EVENT_ID'])
+    except (KeyError, ValueError):
+        last_event_id = None
+    try:
+        events = stream(
+            publisher, last_event_id,
+            tag=request.GET.get('tags') or None,
+            owner=request.GET.get('owner') or None,
+            # the address as the throttles see it
+            client=BaseThrottle().get_ident(request),
+        )
+    except Full:
+        response = HttpResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(RETRY_AFTER)
+        return response
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # keep nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class TagViewSet(NamespacedActionsMixin, viewsets.ModelViewSet):
     """
     This **Tag View Set** automatically provides the following actions:
 
@@ -34,15 +131,44 @@ class TagViewSet(viewsets.ModelViewSet):
      - `destroy`
 
     Write operations are permitted only to superusers.
+
+    Custom `merge` and `rename` actions rewrite the tagging of all
+    bookmarks at once.
     """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    # the bulk actions have their own, smaller budget
+    throttle_scope = None
     permission_classes = [
         IsSuperuserOrReadOnly
     ]
 
+    @action(detail=True, methods=['post'], throttle_scope='bulk')
+    def merge(self, request, *args, **kwargs):
+        """Merge the given `tags` into this tag and delete them."""
+        tag = self.get_object()
+        serializer = TagMergeSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        count = bulk.merge_tags(serializer.validated_data['tags'], tag)
+        data = self.get_serializer(tag).data
+        return Response(dict(data, bookmarks_changed=count))
+
+    @action(detail=True, methods=['post'], throttle_scope='bulk')
+    def rename(self, request, *args, **kwargs):
+        """
+        Rename this tag; if the new `name` is taken, merge this tag into
+        the one of that name.
+        """
+        tag = self.get_object()
+        serializer = TagRenameSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tag = bulk.rename_tag(tag, serializer.validated_data['name'])
+        return Response(self.get_serializer(tag).data)
 
-class BookmarkViewSet(viewsets.ModelViewSet):
+
+class BookmarkViewSet(NamespacedActionsMixin, viewsets.ModelViewSet):
     """
     This **Bookmark View Set** automatically provides
     the following actions:
@@ -54,6 +180,15 @@ class BookmarkViewSet(viewsets.ModelViewSet):
     `Update` and `destroy` operations are permitted
     only to owners of bookmarks or superusers.
 
+    A custom `batch` action applies one operation to many bookmarks,
+    a custom `related` action lists similar bookmarks, a custom
+    `duplicates` action lists the user's possible duplicates and a
+    custom `activity` action counts the bookmarks created per `day`,
+    `week` or `month`.
+
+    A custom `changes` action lists the user's bookmarks that were
+    created, updated or deleted since the token `since`.
+
     When filtering by __date created__ or __date updated__,
     please use the following ISO 8601 format:
 
@@ -61,6 +196,7 @@ class BookmarkViewSet(viewsets.ModelViewSet):
     """
     queryset = Bookmark.objects.with_related()
     serializer_class = BookmarkSerializer
+    throttle_scope = None
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         IsOwnerOrReadOnly,
@@ -69,14 +205,19 @@ class BookmarkViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     filterset_class = BookmarkFilter
     search_fields = ['title', 'bookmark_url', 'description']
+    related_limit = 10
 
     def list(self, request, *args, **kwargs):
         if not self.request.user.is_authenticated:
-            bookmarks = Bookmark.public.all()
+            page_size = self.paginator.get_page_size(request)
+            if (page_size and recent_bookmarks.can_serve(page_size) and
+                    is_first_page(request.query_params)):
+                return self.list_recent(request, page_size)
+            bookmarks = Bookmark.public.with_related()
         elif self.request.user.is_superuser:
             bookmarks = self.queryset
         else:
-            bookmarks = Bookmark.objects.filter(
+            bookmarks = Bookmark.objects.with_related().filter(
                 Q(owner=self.request.user) | Q(is_public=True)
             )
         queryset = self.filter_queryset(bookmarks)
@@ -89,51 +230,250 @@ class BookmarkViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def list_recent(self, request, page_size):
+        """Serve the first page of public bookmarks from memory."""
+        self.paginator.request = request
+        self.paginator.page = recent_bookmarks.first_page(page_size)
+        serializer = self.get_serializer(self.paginator.page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    @action(detail=True)
+    def related(self, request, *args, **kwargs):
+        """List the bookmarks most similar to this one by their tags."""
+        bookmark = self.get_object()
+        related = RelatedBookmark.objects.filter(bookmark=bookmark)
+        if not request.user.is_authenticated:
+            related = related.filter(related__is_public=True)
+        elif not request.user.is_superuser:
+            related = related.filter(
+                Q(related__owner=request.user) | Q(related__is_public=True)
+            )
+        related = related.select_related('related__owner').prefetch_related(
+            'related__tags'
+        )
+        bookmarks = [item.related for item in related[:self.related_limit]]
+        serializer = self.get_serializer(bookmarks, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def activity(self, request, *args, **kwargs):
+        """Count the visible bookmarks created per interval."""
+        if not request.user.is_authenticated:
+            bookmarks = Bookmark.public.all()
+            dependencies = ['history:public']
+        elif request.user.is_superuser:
+            bookmarks = Bookmark.objects.all()
+            dependencies = ['history']
+        else:
+            bookmarks = Bookmark.objects.filter(
+                Q(owner=request.user) | Q(is_public=True)
+            )
+            dependencies = ['history:public', f'history:owner:{request.user.pk}']
+        return activity_response(request, bookmarks, dependencies)
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def changes(self, request, *args, **kwargs):
+        """
+        List the changes to the user's bookmarks since the token `since`.
+
+        Without `since`, only the token of the current state is returned;
+        take it before downloading the whole collection. Every response
+        has the `next` token to continue from. Expired tokens are
+        answered with 410 Gone, after which the whole collection has to
+        be downloaded again.
+        """
+        try:
+            found, token, more = read_changes(
+                request.user, request.query_params.get('since')
+            )
+        except InvalidToken:
+            raise ValidationError({'since': ['Invalid token.']})
+        except ExpiredToken:
+            return Response(
+                {'detail': 'The token has expired, please sync all bookmarks.'},
+                status=status.HTTP_410_GONE
+            )
+        bookmarks = {
+            bookmark.pk: bookmark for bookmark in
+            Bookmark.objects.with_related().filter(
+                owner=request.user, pk__in=[pk for pk, _ in found]
+            )
+        }
+        # deleted and moved bookmarks are not found
+        results = [{
+            'id': pk,
+            'action': change,
+            'bookmark': (
+                self.get_serializer(bookmarks[pk]).data
+                if pk in bookmarks else None
+            ),
+        } for pk, change in found]
+        return Response({'next': token, 'more': more, 'results': results})
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def duplicates(self, request, *args, **kwargs):
+        """List pairs of the user's bookmarks that look like duplicates."""
+        pairs = DuplicateBookmark.objects.filter(
+            bookmark__owner=request.user, duplicate__owner=request.user
+        ).select_related(
+            'bookmark__owner', 'duplicate__owner'
+        ).prefetch_related('bookmark__tags', 'duplicate__tags')
+        context = self.get_serializer_context()
+
+        page = self.paginate_queryset(pairs)
+        if page is not None:
+            serializer = DuplicateBookmarkSerializer(
+                page, many=True, context=context
+            )
+            return self.get_paginated_response(serializer.data)
+
+        serializer = DuplicateBookmarkSerializer(
+            pairs, many=True, context=context
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'], throttle_scope='bulk')
+    def batch(self, request, *args, **kwargs):
+        """
+        Apply an `operation` to many bookmarks at once.
+
+        Bookmarks are selected by a list of `ids` or by a `filter` with
+        the parameters of the list endpoint. Operations are `update`
+        with `changes`, `add_tags` and `remove_tags` with `tags`, and
+        `delete`. All changes are made in a single transaction and the
+        outcome is reported per bookmark. Filters selecting more than
+        10000 bookmarks are rejected, like as many `ids`.
+        """
+        serializer = BookmarkBatchSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        writable = Bookmark.objects.all()
+        if not request.user.is_superuser:
+            writable = writable.filter(owner=request.user)
+
+        with transaction.atomic():
+            if 'ids' in data:
+                results = self.check_batch(request, data['ids'])
+                selection = writable.filter(pk__in=[
+                    pk for pk, status in results.items() if status == 200
+                ])
+            else:
+                params = QueryDict(mutable=True)
+                for key, value in data['filter'].items():
+                    params.setlist(
+                        key, value if isinstance(value, list) else [value]
+                    )
+                filterset = self.filterset_class(
+                    params, queryset=writable, request=request
+                )
+                if not filterset.is_valid():
+                    raise ValidationError({'filter': filterset.errors})
+                selection = filterset.qs
+                limit = BookmarkBatchSerializer.MAX_BOOKMARKS
+                pks = list(
+                    selection.order_by('pk').values_list('pk', flat=True)
+                    [:limit + 1]
+                )
+                if len(pks) > limit:
+                    raise ValidationError({'filter': [
+                        f'Selects more than {limit} bookmarks, narrow it down.'
+                    ]})
+                results = dict.fromkeys(pks, 200)
+
+            operation = data['operation']
+            if operation == 'update':
+                bulk.update(selection, **data['changes'])
+            elif operation == 'add_tags':
+                bulk.add_tags(selection, data['tags'])
+            elif operation == 'remove_tags':
+                bulk.remove_tags(selection, data['tags'])
+            else:
+                bulk.delete(selection)
+
+        return Response({
+            'count': list(results.values()).count(200),
+            'results': [
+                {'id': pk, 'status': status} for pk, status in results.items()
+            ],
+        })
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+    def check_batch(self, request, ids):
+        """
+        Map every id to the status code a single request would get.
+
+        Like `IsOwnerOrReadOnly`, only owners and superusers may change
+        a bookmark; private bookmarks of others are not found.
+        """
+        found = {
+            pk: (owner_id, is_public) for pk, owner_id, is_public in
+            Bookmark.objects.filter(pk__in=ids)
+            .values_list('pk', 'owner_id', 'is_public')
+        }
+        results = {}
+        for pk in ids:
+            if pk not in found:
+                results[pk] = 404
+            elif found[pk][0] == request.user.pk or request.user.is_superuser:
+                results[pk] = 200
+            else:
+                results[pk] = 403 if found[pk][1] else 404
+        return results
+
+
+class UserViewSet(NamespacedActionsMixin, viewsets.ReadOnlyModelViewSet):
     """
     This **User View Set** automatically provides the following actions:
 
     - `list`
     - `retrieve`
 
-    A custom `bookmarks` action can be performed on the user endpoints.
+    Custom `bookmarks`, `activity` and `stats` actions can be performed
+    on the user endpoints.
+
+    Users can be ordered by `username` and their number of public
+    bookmarks (`bookmark_count`), e.g. `?ordering=-bookmark_count`.
     """
     queryset = User.objects.all().order_by('pk')
     serializer_class = UserSerializer
     lookup_field = 'username'
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['username', 'bookmark_count']
 
     def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return self.queryset.prefetch_related(
-                Prefetch(
-                    'bookmarks',
-                    Bookmark.public.all(),
-                )
+        if self.action == 'list':
+            # the counters are public and maintained per user, so no
+            # aggregate over the bookmarks is needed for ordering
+            users = self.queryset.annotate(
+                bookmark_count=Coalesce(
+                    F('bookmark_stats__public_bookmarks'), Value(0)
+                ),
             )
+        else:
+            users = self.queryset
+        if not self.request.user.is_authenticated:
+            bookmarks = Bookmark.public.with_tags()
         elif self.request.user.is_superuser:
-            return self.queryset
+            bookmarks = Bookmark.objects.with_tags()
         else:
-            return self.queryset.prefetch_related(
-                Prefetch(
-                    'bookmarks',
-                    Bookmark.objects.filter(
-                        Q(owner=self.request.user) | Q(is_public=True)
-                    )
-                )
+            bookmarks = Bookmark.objects.with_tags().filter(
+                Q(owner=self.request.user) | Q(is_public=True)
             )
+        return users.prefetch_related(Prefetch('bookmarks', bookmarks))
 
     @action(detail=True)
     def bookmarks(self, request, *args, **kwargs):
         """An additional endpoint for listing all user's bookmarks."""
         user = self.get_object()
-        bookmarks = Bookmark.public.filter(owner=user)
+        bookmarks = Bookmark.public.with_tags().filter(owner=user)
         if request.user.is_authenticated and (request.user == user or
                                               request.user.is_superuser):
-            bookmarks = Bookmark.objects.filter(owner=user)
+            bookmarks = Bookmark.objects.with_tags().filter(owner=user)
 
         context = {
             'request': request
@@ -154,3 +494,66 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             context=context
         )
         return Response(serializer.data)
+
+    @action(detail=True)
+    def activity(self, request, *args, **kwargs):
+        """Count the user's visible bookmarks created per interval."""
+        # not `get_object`, which would prefetch all bookmarks
+        user = generics.get_object_or_404(
+            self.queryset, username=kwargs[self.lookup_field]
+        )
+        bookmarks = Bookmark.public.filter(owner=user)
+        if request.user.is_authenticated and (request.user == user or
+                                              request.user.is_superuser):
+            bookmarks = Bookmark.objects.filter(owner=user)
+        return activity_response(
+            request, bookmarks, [f'history:owner:{user.pk}']
+        )
+
+    @action(detail=True)
+    def stats(self, request, *args, **kwargs):
+        """
+        Show the counters of the user's bookmarks. Others only see the
+        public ones.
+        """
+        user = generics.get_object_or_404(
+            self.queryset, username=kwargs[self.lookup_field]
+        )
+        if request.user == user or request.user.is_superuser:
+            serializer = UserStatsSerializer(get_stats(user))
+        else:
+            serializer = PublicUserStatsSerializer(get_stats(user))
+        return Response(serializer.data)
+
+
+class WebhookViewSet(NamespacedActionsMixin, viewsets.ModelViewSet):
+    """
+    This **Webhook View Set** automatically provides the following
+    actions on the webhooks of the authenticated user:
+
+     - `list`
+     - `create`
+     - `retrieve`
+     - `update` and `partial_update`
+     - `destroy`
+
+    Created, updated and deleted bookmarks are POSTed to `webhook_url`
+    in batches, signed with `secret`. Webhooks that keep failing are
+    deactivated; activating them again resumes the delivery.
+    """
+    queryset = Webhook.objects.all()
+    serializer_class = WebhookSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def perform_update(self, serializer):
+        activated = serializer.validated_data.get('is_active')
+        if activated and not serializer.instance.is_active:
+            serializer.save(failures=0, next_attempt=timezone.now())
+        else:
+            serializer.save()
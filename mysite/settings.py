@@ -12,20 +12,75 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/1.11/howto/deployment/checklist/
+#
+# The defaults are for development. In production, set DJANGO_DEBUG=0,
+# DJANGO_SECRET_KEY, DJANGO_ALLOWED_HOSTS and DJANGO_CACHE_URL in the
+# environment; only the apps and middleware needed to serve requests are
+# loaded then.
+
+
+def env_flag(name, default):
+    return os.environ.get(name, str(int(default))).lower() in ('1', 'true', 'yes')
+
+
+def env_list(name, default=()):
+    value = os.environ.get(name)
+    return [item for item in value.split(',') if item] if value else list(default)
+
+
+CACHE_BACKENDS = {
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'pylibmc': 'django.core.cache.backends.memcached.PyLibMCCache',
+    'redis': 'django_redis.cache.RedisCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+# caches only seen by the process that wrote to them
+PROCESS_LOCAL_CACHES = {CACHE_BACKENDS['locmem'],
+                        'django.core.cache.backends.dummy.DummyCache'}
+
+
+def env_cache(name, default):
+    """
+    A cache configured by a URL: ``memcached://host:port[,host:port]``,
+    ``pylibmc://...``, ``redis://...`` (with django-redis),
+    ``db://<table>``, ``file:///<directory>`` or ``locmem://``.
+    """
+    url = os.environ.get(name, default)
+    scheme, _, location = url.partition('://')
+    if scheme not in CACHE_BACKENDS:
+        raise ImproperlyConfigured(f'{name}: unknown cache {url!r}.')
+    if scheme in ('memcached', 'pylibmc'):
+        location = location.split(',')
+    elif scheme == 'redis':
+        location = url
+    config = {'BACKEND': CACHE_BACKENDS[scheme], 'LOCATION': location}
+    if scheme in ('db', 'file', 'locmem'):
+        # these cull a third of the entries beyond MAX_ENTRIES (300)
+        config['OPTIONS'] = {'MAX_ENTRIES': 100000}
+    return config
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = '(-p6m!tmz3*gu038(_!z5=h@%$78!ppi5r1xp0**u0j6s-rnlg'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_flag('DJANGO_DEBUG', True)
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured('Set DJANGO_SECRET_KEY when DEBUG is off.')
+    SECRET_KEY = '(-p6m!tmz3*gu038(_!z5=h@%$78!ppi5r1xp0**u0j6s-rnlg'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS')
 
 INTERNAL_IPS = [
     '127.0.0.1',
@@ -42,27 +97,37 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     # third-party apps
-    'debug_toolbar',
     'crispy_forms',
     'django_filters',
     'rest_framework',
-    'coverage',
-    'django_extensions',
     # own apps
     'marcador',
     'marcador_api',
 ]
 
+# development tools, installed from the dev-packages of the Pipfile
+DEVELOPMENT_APPS = [
+    'debug_toolbar',
+    'coverage',
+    'django_extensions',
+]
+if DEBUG:
+    INSTALLED_APPS += DEVELOPMENT_APPS
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'marcador.nplusone.NPlusOneMiddleware',
+    'marcador.slowqueries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'marcador.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
+if DEBUG:
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
 
 ROOT_URLCONF = 'mysite.urls'
 
@@ -92,9 +157,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # keep connections open between requests outside of development
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 0 if DEBUG else 60)),
     }
 }
 
+# Throttling, invalidation and the caches of every process depend on a
+# cache shared by all processes, like memcached or Redis. The database
+# cache works too, after `manage.py createcachetable`.
+CACHES = {
+    'default': env_cache('DJANGO_CACHE_URL', 'locmem://' if DEBUG else 'db://marcador_cache'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -140,8 +214,101 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': [
+        'marcador_api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'marcador_api.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'marcador_api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'marcador_api.parsers.MessagePackParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['marcador_api.throttling.TokenBucketThrottle'],
+    # token buckets per user, or per address for anonymous clients
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '600/min',
+        'write': '120/min',
+        'bulk': '10/min',
+    },
+}
+# The cache of the token buckets; limits only hold across processes if
+# they share it
+MARCADOR_THROTTLE_CACHE = 'default'
+if not DEBUG and CACHES[MARCADOR_THROTTLE_CACHE]['BACKEND'] in PROCESS_LOCAL_CACHES:
+    raise ImproperlyConfigured(
+        'Throttling needs a cache shared by all processes, set DJANGO_CACHE_URL.'
+    )
+
+# Marcador
+# Number of latest public bookmarks kept in memory by every process
+MARCADOR_RECENT_BOOKMARKS = 100
+# Seconds an anonymous list page is cached at most; changes invalidate it
+MARCADOR_RESPONSE_CACHE_TIMEOUT = 600
+# Number of tag names and ids every process keeps resolved
+MARCADOR_TAG_CACHE_SIZE = 10000
+# Seconds they are kept with a shared cache, which carries invalidations
+MARCADOR_TAG_CACHE_TIMEOUT = 300
+# Open event streams per process, and per client address. Every stream
+# holds a worker thread unless the server uses green threads (gunicorn
+# with gevent workers), so keep the limit below the threads otherwise
+MARCADOR_STREAM_MAX_SUBSCRIBERS = int(
+    os.environ.get('MARCADOR_STREAM_MAX_SUBSCRIBERS', 100)
+)
+MARCADOR_STREAM_MAX_PER_CLIENT = 5
+# Seconds a transaction writing bookmarks may take: changes this recent
+# are repeated by the sync API, and held back by the stream and webhooks
+MARCADOR_CHANGES_SETTLE = 10
+# Seconds a job may run before it is taken for the job of a dead worker
+# and queued again; keep it above the time the longest job takes
+MARCADOR_JOB_LEASE = 30 * 60
+# Search bookmarks in the admin for the term anywhere in their URL or
+# title, scanning the table, instead of for a prefix using the indexes
+MARCADOR_ADMIN_SUBSTRING_SEARCH = False
+# Fail ('raise') or warn about ('log') requests repeating a query
+MARCADOR_NPLUSONE = os.environ.get('MARCADOR_NPLUSONE', 'raise' if DEBUG else '')
+# Patterns of the origins or fingerprints of queries that may repeat
+MARCADOR_NPLUSONE_ALLOWLIST = []
+# The file slow queries are logged to with their plan, none by default;
+# milliseconds from which queries are logged (None: off)
+MARCADOR_SLOW_QUERY_LOG = os.environ.get('MARCADOR_SLOW_QUERY_LOG', '')
+MARCADOR_SLOW_QUERY_THRESHOLD = 100 if MARCADOR_SLOW_QUERY_LOG else None
+# Fraction of the requests of superusers asking for a profile that get one
+MARCADOR_PROFILE_SAMPLE_RATE = float(
+    os.environ.get('MARCADOR_PROFILE_SAMPLE_RATE', 1 if DEBUG else 0.1)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slowqueries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': MARCADOR_SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'message',
+        } if MARCADOR_SLOW_QUERY_LOG else {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'loggers': {
+        'marcador.slowqueries': {
+            'handlers': ['slowqueries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }